@@ -1,11 +1,14 @@
+from functools import wraps
+
 from django.conf import settings
 
 
 def debug_only(func):
-    def raise_404():
-        from django.http import Http404
-        raise Http404()
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not settings.DEBUG:
+            from django.http import Http404
+            raise Http404()
+        return func(*args, **kwargs)
 
-    if settings.DEBUG:
-        return func
-    return raise_404
+    return wrapper
@@ -125,6 +125,20 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Shared by every web and worker process, so that the card cache (see cards/cache.py) is invalidated everywhere when
+# the catalog changes. The table is created by `python manage.py createcachetable`.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {
+            # Room for the whole card catalog, since every write past the limit culls a third of the table
+            'MAX_ENTRIES': 200000,
+        },
+    }
+}
+
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
@@ -198,6 +212,21 @@ STATICFILES_DIRS = (
     os.path.join(BASE_DIR, 'static'),
 )
 
+# Card images are served from a local copy instead of hot-linking Scryfall (see cards/images.py)
+CARD_IMAGE_PROXY = os.environ.get('CARD_IMAGE_PROXY', '1') == '1'
+CARD_IMAGE_CACHE_DIR = os.environ.get('CARD_IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'imagecache'))
+
+# Where the Scryfall API and CubeCobra are reached, which can be a local stand-in (see scryfall/standin.py)
+SCRYFALL_API_URL = os.environ.get('SCRYFALL_API_URL', 'https://api.scryfall.com')
+CUBECOBRA_URL = os.environ.get('CUBECOBRA_URL', 'https://cubecobra.com')
+
+# GET responses from Scryfall and CubeCobra can be kept on disk for a while (see scryfall/cache.py). Off unless
+# HTTP_CACHE=1, which the Procfile sets for the web and worker processes, so that tests and local runs always see
+# live (or mocked) responses.
+HTTP_CACHE = os.environ.get('HTTP_CACHE', '0') == '1'
+HTTP_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR', os.path.join(BASE_DIR, 'httpcache'))
+HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
 # Simplified static file serving.
 # https://warehouse.python.org/project/whitenoise/
 
@@ -0,0 +1,233 @@
+"""
+A read-through cache of cards and printings, which only change when the catalog is refreshed.
+
+Lookups go through two tiers: a per-process LRU and Django's cache framework (the database cache table, see CACHES),
+which every worker shares. Every key includes the catalog version, a counter in the shared cache that writers bump
+(see bump_catalog_version), so a refresh makes everything cached before it unreachable in every process. Processes
+re-read the version at most VERSION_CHECK_INTERVAL seconds apart, which bounds how long the local tier can be stale.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterable, List
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'cards:catalog-version'
+LOCAL_CACHE_SIZE = 4096
+SHARED_TIMEOUT = 24 * 60 * 60
+VERSION_CHECK_INTERVAL = 5
+# Name lookups that found nothing are remembered too, as this marker
+MISSING = 'missing'
+
+
+class LocalCache(object):
+    """
+    A thread-safe LRU of at most [max_size] entries, all belonging to one catalog version
+    """
+
+    def __init__(self, max_size: int = LOCAL_CACHE_SIZE):
+        self.max_size = max_size
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, version: int, keys: Iterable[Hashable]) -> dict:
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+                return {}
+            found = {}
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+            return found
+
+    def set_many(self, version: int, values: dict):
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries.update(values)
+            for key in values:
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.version = None
+
+
+class SharedVersion(object):
+    """
+    A counter in the shared cache that every process keys its own caches by. Reads are remembered for
+    VERSION_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        # The last version read from the shared cache, and when
+        self._checked = (None, 0.0)
+
+    def current(self) -> int:
+        version, checked_at = self._checked
+        now = time.monotonic()
+        if version is not None and now - checked_at < VERSION_CHECK_INTERVAL:
+            return version
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, self._fresh(), timeout=None)
+            version = cache.get(self.key)
+        self._checked = (version, now)
+        return version
+
+    def bump(self):
+        # Not cache.incr, which most backends implement as a get and a set with the default timeout, so that the version
+        # would expire and start over, bringing back entries cached under it
+        version = cache.get(self.key)
+        cache.set(self.key, version + 1 if version is not None else self._fresh(), timeout=None)
+        self._checked = (None, 0.0)
+
+    @staticmethod
+    def _fresh() -> int:
+        """
+        A version for when the shared cache has lost the current one (culled or flushed), which can't repeat an older
+        one
+        """
+        return time.time_ns()
+
+
+def on_commit_once(func: Callable[[], None]):
+    """
+    Calls [func] once the current transaction commits (right away outside of one), unless it is already waiting to
+    """
+    connection = transaction.get_connection()
+    if not any(pending == func for _, pending in connection.run_on_commit):
+        transaction.on_commit(func)
+
+
+local_cache = LocalCache()
+catalog = SharedVersion(VERSION_KEY)
+_deferred = threading.local()
+
+
+def catalog_version() -> int:
+    return catalog.current()
+
+
+def bump_catalog_version():
+    """
+    Invalidates every cached card and printing, in every process
+    """
+    catalog.bump()
+    local_cache.clear()
+
+
+def invalidate_catalog():
+    """
+    Called whenever a card or printing is written: bumps the catalog version once the transaction commits (right
+    away outside of one), or once at the end of the enclosing batched_invalidation block. However many rows a
+    transaction writes, it bumps the version once.
+    """
+    if getattr(_deferred, 'depth', 0) > 0:
+        _deferred.pending = True
+    else:
+        on_commit_once(bump_catalog_version)
+
+
+@contextmanager
+def batched_invalidation():
+    """
+    Writes inside this block (on this thread) invalidate the cache once, when the outermost block exits
+    """
+    depth = getattr(_deferred, 'depth', 0)
+    _deferred.depth = depth + 1
+    try:
+        yield
+    finally:
+        _deferred.depth = depth
+        if depth == 0 and getattr(_deferred, 'pending', False):
+            _deferred.pending = False
+            invalidate_catalog()
+
+
+def read_through(kind: str, keys: Iterable[Hashable], load: Callable[[List], dict]) -> dict:
+    """
+    The cached values for [keys], loading the ones neither tier has with [load], which maps a list of keys to a dict
+    of the values found
+    """
+    keys = list(dict.fromkeys(keys))
+    version = catalog_version()
+    local_keys = [(kind, key) for key in keys]
+    found = {key: value for (_, key), value in local_cache.get_many(version, local_keys).items()}
+    missing = [key for key in keys if key not in found]
+    if len(missing) > 0:
+        shared_keys = {f'cards:{version}:{kind}:{key}': key for key in missing}
+        shared = {shared_keys[shared_key]: value for shared_key, value in cache.get_many(shared_keys.keys()).items()}
+        missing = [key for key in missing if key not in shared]
+        loaded = load(missing) if len(missing) > 0 else {}
+        if len(loaded) > 0:
+            cache.set_many({f'cards:{version}:{kind}:{key}': value for key, value in loaded.items()},
+                           timeout=SHARED_TIMEOUT)
+        local_cache.set_many(version, {(kind, key): value for key, value in {**shared, **loaded}.items()})
+        found.update(shared)
+        found.update(loaded)
+    return found
+
+
+def get_cards(card_ids: Iterable) -> Dict:
+    from .models import Card
+    return read_through('card', card_ids, lambda ids: Card.objects.in_bulk(ids))
+
+
+def get_printings(printing_ids: Iterable[int]) -> Dict:
+    """
+    Printings by id, with their card and set already loaded
+    """
+    from .models import Printing
+    return read_through('printing', printing_ids,
+                        lambda ids: Printing.objects.select_related('card', 'magic_set').in_bulk(ids))
+
+
+def get_card_by_name(name: str):
+    """
+    The card Card.objects.get_by_name would find for [name], or None
+    """
+    from .models import Card
+    from .names import normalize_name
+    # Hashed, as names may contain characters that some cache backends don't allow in keys
+    key = hashlib.sha1(normalize_name(name).encode('utf-8')).hexdigest()
+
+    def load(keys: List[str]) -> dict:
+        try:
+            return {key: Card.objects.get_by_name(name).id}
+        except Card.DoesNotExist:
+            return {key: MISSING}
+
+    card_id = read_through('name', [key], load)[key]
+    if card_id == MISSING:
+        return None
+    return get_cards([card_id]).get(card_id)
+
+
+def attach_printings(objects: Iterable):
+    """
+    Fills in the printing of each of [objects] (anything with a printing foreign key) from the cache
+    """
+    objects = list(objects)
+    printings = get_printings(item.printing_id for item in objects)
+    for item in objects:
+        item.printing = printings[item.printing_id]
+
+
+def attach_cards(objects: Iterable):
+    objects = list(objects)
+    cards = get_cards(item.card_id for item in objects)
+    for item in objects:
+        item.card = cards[item.card_id]
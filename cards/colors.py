@@ -0,0 +1,46 @@
+import re
+from typing import Iterable, Set
+
+# One bit per color in WUBRG order, so a set of colors fits an indexed integer column
+COLOR_BITS = {'W': 1, 'U': 2, 'B': 4, 'R': 8, 'G': 16}
+
+_SYMBOL = re.compile(r'{([^}]+)}')
+
+
+def color_mask(colors: Iterable[str]) -> int:
+    mask = 0
+    for color in colors:
+        mask |= COLOR_BITS.get(color, 0)
+    return mask
+
+
+def colors_from_mask(mask: int) -> Set[str]:
+    return {color for color, bit in COLOR_BITS.items() if mask & bit}
+
+
+def colors_from_mana_cost(mana_cost: str) -> Set[str]:
+    """
+    The colors of every symbol in [mana_cost], including hybrid and Phyrexian ones: "{2}{W/U}{B/P}" -> {W, U, B}
+    """
+    colors = set()
+    for symbol in _SYMBOL.findall(mana_cost):
+        colors.update(part for part in symbol.split('/') if part in COLOR_BITS)
+    return colors
+
+
+def mana_value_from_cost(mana_cost: str) -> float:
+    """
+    The mana value of a single mana cost. X costs nothing, {2/W} counts as two and half-mana symbols as a half.
+    """
+    total = 0.0
+    for symbol in _SYMBOL.findall(mana_cost):
+        first = symbol.split('/')[0]
+        if first.isdigit():
+            total += int(first)
+        elif first in ('X', 'Y', 'Z'):
+            continue
+        elif first.startswith('H') or first == '½':
+            total += 0.5
+        else:
+            total += 1
+    return total
@@ -0,0 +1,181 @@
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .cache import SharedVersion, on_commit_once
+from .names import normalize_name
+
+# Below this score a match is more likely to be a different card than a misspelling
+MATCH_THRESHOLD = 0.85
+# How many names sharing the most trigrams are scored by trigram similarity, and how many of those by edit distance
+CANDIDATES = 10
+FINALISTS = 2
+MIN_TRIGRAMS = 6
+NAMES_VERSION_KEY = 'cards:names-version'
+
+
+@dataclass
+class FuzzyMatch:
+    card_id: object
+    name: str
+    score: float
+
+
+def trigrams(normalized: str) -> Set[str]:
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(left: Set[str], right: Set[str]) -> float:
+    if len(left) == 0 or len(right) == 0:
+        return 0.0
+    return 2 * len(left & right) / (len(left) + len(right))
+
+
+def edit_distance(left: str, right: str, limit: int) -> int:
+    """
+    The optimal string alignment distance (Levenshtein plus adjacent transpositions) between two strings, or
+    [limit] + 1 if it is larger than [limit]. Only a band of [limit] cells either side of the diagonal is computed.
+    """
+    if abs(len(left) - len(right)) > limit:
+        return limit + 1
+    beyond = limit + 1
+    previous2 = None
+    previous = [j if j <= limit else beyond for j in range(len(right) + 1)]
+    for i in range(1, len(left) + 1):
+        current = [beyond] * (len(right) + 1)
+        if i <= limit:
+            current[0] = i
+        lowest = current[0]
+        for j in range(max(1, i - limit), min(len(right), i + limit) + 1):
+            distance = previous[j - 1] + (left[i - 1] != right[j - 1])
+            if previous[j] < distance:
+                distance = previous[j] + 1
+            if current[j - 1] < distance:
+                distance = current[j - 1] + 1
+            if i > 1 and j > 1 and left[i - 1] == right[j - 2] and left[i - 2] == right[j - 1] \
+                    and previous2[j - 2] < distance:
+                distance = previous2[j - 2] + 1
+            current[j] = distance
+            if distance < lowest:
+                lowest = distance
+        if lowest > limit:
+            return beyond
+        previous2, previous = previous, current
+    return min(previous[-1], beyond)
+
+
+class FuzzyNameIndex(object):
+    """
+    An in-memory trigram index over normalized card names.
+
+    Exact (normalized) names are answered from a dict. Anything else counts shared trigrams across the posting
+    lists of the query's trigrams, ranks the best few candidates by trigram similarity (Dice coefficient) and
+    scores the finalists by edit distance, so a query only touches the names that share trigrams with it.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.card_ids: List[object] = []
+        self.exact: Dict[str, int] = {}
+        self.postings: Dict[str, List[int]] = {}
+        # The names version (see invalidate_name_index) the index was built at
+        self.version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, card_id, name: str):
+        normalized = normalize_name(name)
+        if normalized == '':
+            return
+        with self._lock:
+            existing = self.exact.get(normalized)
+            if existing is not None:
+                self.card_ids[existing] = card_id
+                return
+            entry = len(self.names)
+            self.names.append(normalized)
+            self.card_ids.append(card_id)
+            self.exact[normalized] = entry
+            for trigram in trigrams(normalized):
+                self.postings.setdefault(trigram, []).append(entry)
+
+    def add_all(self, entries: Iterable[Tuple[object, str]]):
+        for card_id, name in entries:
+            self.add(card_id, name)
+
+    def match(self, name: str, threshold: float = MATCH_THRESHOLD) -> Optional[FuzzyMatch]:
+        normalized = normalize_name(name)
+        entry = self.exact.get(normalized)
+        if entry is not None:
+            return FuzzyMatch(card_id=self.card_ids[entry], name=normalized, score=1.0)
+
+        # A single typo changes at most three trigrams, so the rarest half of them still find the right name
+        query = sorted(trigrams(normalized), key=lambda trigram: len(self.postings.get(trigram, ())))
+        counts = Counter()
+        for trigram in query[:max(MIN_TRIGRAMS, len(query) // 2)]:
+            postings = self.postings.get(trigram)
+            if postings is not None:
+                counts.update(postings)
+        query = set(query)
+        candidates = [entry for entry, _ in counts.most_common(CANDIDATES)]
+        candidates.sort(key=lambda entry: similarity(query, trigrams(self.names[entry])), reverse=True)
+        best = None
+        for entry in candidates[:FINALISTS]:
+            candidate = self.names[entry]
+            length = max(len(normalized), len(candidate))
+            distance = edit_distance(normalized, candidate, int((1 - threshold) * length))
+            score = 1 - distance / length
+            if score >= threshold and (best is None or score > best.score):
+                best = FuzzyMatch(card_id=self.card_ids[entry], name=candidate, score=score)
+        return best
+
+
+_index: Optional[FuzzyNameIndex] = None
+_index_lock = threading.Lock()
+# Moves on whenever a name is removed, so that every process rebuilds its index. Added names don't need a rebuild.
+names_version = SharedVersion(NAMES_VERSION_KEY)
+
+
+def get_name_index() -> FuzzyNameIndex:
+    """
+    Returns the process-wide index, building it from the database on first use and rebuilding it whenever a card
+    was deleted or renamed since (see invalidate_name_index)
+    """
+    global _index
+    version = names_version.current()
+    if _index is None or _index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                from .models import Card, CardAlias
+                index = FuzzyNameIndex()
+                index.add_all(Card.objects.values_list('id', 'normalized_name').iterator())
+                index.add_all(CardAlias.objects.values_list('card_id', 'normalized_name').iterator())
+                index.version = version
+                _index = index
+    return _index
+
+
+def index_card_names(entries: Iterable[Tuple[object, str]]):
+    """
+    Adds newly written names to the process-wide index, if it has been built. Other processes learn about them when
+    they next rebuild theirs; until then a lookup that misses goes to Scryfall, which leads back to the stored card.
+    """
+    if _index is not None:
+        _index.add_all(entries)
+
+
+def invalidate_name_index():
+    """
+    Called when cards are deleted or renamed: rebuilds the index of every process once the transaction commits
+    """
+    on_commit_once(names_version.bump)
+
+
+def reset_name_index():
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,92 @@
+"""
+A local disk cache of printing images, so pages link to this site instead of hot-linking Scryfall.
+
+Scryfall already publishes every image at several sizes, so the variants served here are Scryfall's own "small" and
+"normal" renditions rather than resizes made on our side. Each one is downloaded once and stored under
+settings.CARD_IMAGE_CACHE_DIR as <variant>/<printing id>-<url key>.jpg; the url key changes whenever Scryfall
+publishes a new image, which also makes it a stable ETag.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
+
+import requests
+from django.conf import settings
+
+from scryfall.client import DEFAULT_TIMEOUT, create_session
+
+VARIANTS = ['small', 'normal']
+DEFAULT_VARIANT = 'normal'
+DEFAULT_WORKERS = 4
+# Scryfall image URLs carry the size as a path segment: .../file/scryfall-cards/normal/front/c/e/<id>.jpg?1608908685
+_SIZE_SEGMENT = re.compile(r'/(small|normal|large|png|art_crop|border_crop)/')
+
+_session: Optional[requests.Session] = None
+
+
+def session() -> requests.Session:
+    global _session
+    if _session is None:
+        _session = create_session()
+    return _session
+
+
+def variant_url(image_url: str, variant: str) -> str:
+    """
+    The Scryfall URL of [image_url] at the [variant] size. URLs that don't follow Scryfall's layout are returned as is.
+    """
+    return _SIZE_SEGMENT.sub(f'/{variant}/', image_url, count=1)
+
+
+def url_key(image_url: str) -> str:
+    return hashlib.sha1(image_url.encode('utf-8')).hexdigest()[:16]
+
+
+def image_path(printing, variant: str) -> Path:
+    return Path(settings.CARD_IMAGE_CACHE_DIR) / variant / f'{printing.id}-{url_key(printing.image_url)}.jpg'
+
+
+def image_etag(printing, variant: str) -> str:
+    return f'"{url_key(printing.image_url)}-{variant}"'
+
+
+def fetch_image(printing, variant: str = DEFAULT_VARIANT) -> Path:
+    """
+    The path of the cached [variant] image of [printing], downloading it first if needed.
+    Raises requests.RequestException if Scryfall can't be reached or doesn't have the image.
+    """
+    path = image_path(printing, variant)
+    if path.exists():
+        return path
+    response = session().get(variant_url(printing.image_url, variant), timeout=DEFAULT_TIMEOUT,
+                             headers={'Accept': 'image/*'})
+    response.raise_for_status()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written to a temporary file first so that a concurrent request never serves half an image
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(response.content)
+    os.replace(temp_path, path)
+    return path
+
+
+def warm_images(printings: Iterable, variants: Iterable[str] = tuple(VARIANTS), workers: int = DEFAULT_WORKERS) -> int:
+    """
+    Downloads every missing variant of [printings]. Returns the number of images that could not be fetched.
+    """
+    jobs = [(printing, variant) for printing in printings for variant in variants
+            if not image_path(printing, variant).exists()]
+
+    def fetch(job) -> bool:
+        try:
+            fetch_image(*job)
+            return True
+        except requests.RequestException:
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return sum(1 for fetched in executor.map(fetch, jobs) if not fetched)
@@ -0,0 +1,233 @@
+import uuid
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from django.db import transaction
+
+from scryfall.models import ScryfallCard
+from .cache import invalidate_catalog
+from .fuzzy import index_card_names, invalidate_name_index
+from .names import face_names, name_aliases
+from .search import index_cards
+from .models import Card, CardAlias, CardFace, MagicSet, Printing, content_hash_from_scryfall_card, is_multifaced, \
+    merge_cards, set_id_from_scryfall_card
+
+DEFAULT_BATCH_SIZE = 1000
+
+CARD_FIELDS = [
+    'oracle_id',
+    'layout',
+    'name',
+    'normalized_name',
+    'face_text',
+    'mana_cost',
+    'type_line',
+    'color_indicator',
+    'loyalty',
+    'oracle_text',
+    'power',
+    'toughness',
+    'colors',
+    'color_identity',
+    'mana_value',
+    'category',
+]
+
+PRINTING_FIELDS = [
+    'card',
+    'scryfall_id',
+    'magic_set',
+    'image_url',
+    'collector_number',
+    'rarity',
+    'released_at',
+    'content_hash',
+]
+
+
+class StoredPrinting(NamedTuple):
+    id: Optional[int]
+    card_id: uuid.UUID
+    oracle_id: Optional[uuid.UUID]
+    content_hash: str
+
+
+class CatalogIngester(object):
+    """
+    Upserts Scryfall cards (and their faces, sets and printings) in batches.
+
+    Cards are buffered until [batch_size] have been added, then written with a handful of bulk queries inside a
+    single transaction, so memory use is bounded by the batch size rather than by the size of the input. Each
+    Scryfall card becomes a Printing of the Card sharing its oracle id. Printings whose content hash matches the
+    stored one are skipped, and with [update_existing] off so is every printing that is already stored with its card's
+    oracle id. Cards from before oracle ids were recorded are always repaired.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, progress: Optional[Callable[[int], None]] = None,
+                 update_existing: bool = True):
+        self.batch_size = batch_size
+        self.update_existing = update_existing
+        self.progress = progress
+        self.cards_written = 0
+        self.cards_unchanged = 0
+        self._pending: List[ScryfallCard] = []
+        self._set_ids: Dict[str, uuid.UUID] = {}
+
+    def add(self, scryfall_card: ScryfallCard):
+        self._pending.append(scryfall_card)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def add_all(self, scryfall_cards: Iterable[ScryfallCard]):
+        for scryfall_card in scryfall_cards:
+            self.add(scryfall_card)
+        self.flush()
+
+    def flush(self):
+        if len(self._pending) == 0:
+            return
+        batch = {uuid.UUID(scryfall_card.id): scryfall_card for scryfall_card in self._pending}
+        self._pending = []
+        with transaction.atomic():
+            existing = {
+                row[0]: StoredPrinting(*row[1:]) for row in Printing.objects
+                .filter(scryfall_id__in=batch.keys())
+                .values_list('scryfall_id', 'id', 'card_id', 'card__oracle_id', 'content_hash')
+            }
+            existing.update(self._legacy_printings(batch.keys() - existing.keys()))
+            # Printings of cards without an oracle id are always rewritten, so that their card gets one
+            unchanged = {scryfall_id for scryfall_id, scryfall_card in batch.items()
+                         if scryfall_id in existing and existing[scryfall_id].oracle_id is not None
+                         and (not self.update_existing
+                              or existing[scryfall_id].content_hash == content_hash_from_scryfall_card(scryfall_card))}
+            batch = {scryfall_id: card for scryfall_id, card in batch.items() if scryfall_id not in unchanged}
+            self.cards_unchanged += len(existing.keys() & unchanged)
+            if len(batch) > 0:
+                self._write_batch(batch, existing)
+        self.cards_written += len(batch)
+        if self.progress is not None:
+            self.progress(self.cards_written)
+
+    def _write_batch(self, batch: Dict[uuid.UUID, ScryfallCard], existing: Dict[uuid.UUID, 'StoredPrinting']):
+        self._write_sets(batch.values())
+        card_ids, existing_ids = self._resolve_cards(batch, existing)
+        oracles = {card_ids[uuid.UUID(card.oracle_id)]: card for card in batch.values()}
+        self._write_cards(oracles, existing_ids)
+        self._write_aliases(oracles, existing_ids)
+        self._write_faces(oracles, existing_ids)
+        self._write_printings(batch, existing, card_ids)
+        # Only batches that wrote something invalidate the card cache, once they commit
+        invalidate_catalog()
+        index_card_names((card_id, name) for card_id, scryfall_card in oracles.items()
+                         for name in [scryfall_card.name] + face_names(scryfall_card.name))
+
+    @staticmethod
+    def _legacy_printings(scryfall_ids) -> Dict[uuid.UUID, 'StoredPrinting']:
+        """
+        Older versions of refreshset stored cards under the id of the Scryfall card, without an oracle id, and their
+        printings without a Scryfall id. Such cards are returned keyed by that id, with their printing if they have one
+        (or else as a printing to create), so that they are adopted rather than duplicated.
+        """
+        cards = list(Card.objects.filter(id__in=scryfall_ids, oracle_id=None).values_list('id', flat=True))
+        if len(cards) == 0:
+            return {}
+        printings = dict(Printing.objects
+                         .filter(card_id__in=cards, scryfall_id=None)
+                         .order_by('-id')
+                         .values_list('card_id', 'id'))
+        return {card_id: StoredPrinting(printings.get(card_id), card_id, None, '') for card_id in cards}
+
+    def _resolve_cards(self, batch: Dict[uuid.UUID, ScryfallCard], existing: Dict[uuid.UUID, 'StoredPrinting']):
+        """
+        Maps each oracle id in [batch] to the id of its Card, and returns the ids of the cards that already exist.
+        Cards stored before oracle ids were recorded are adopted (and duplicates among them merged) on the way.
+        """
+        oracle_ids = {uuid.UUID(scryfall_card.oracle_id) for scryfall_card in batch.values()}
+        card_ids = dict(Card.objects.filter(oracle_id__in=oracle_ids).values_list('oracle_id', 'id'))
+        legacy: Dict[uuid.UUID, List[uuid.UUID]] = {}
+        for scryfall_id, scryfall_card in batch.items():
+            stored = existing.get(scryfall_id)
+            if stored is not None and stored.oracle_id is None:
+                legacy.setdefault(uuid.UUID(scryfall_card.oracle_id), []).append(stored.card_id)
+        existing_ids = set(card_ids.values())
+        for oracle_id, legacy_ids in legacy.items():
+            if oracle_id not in card_ids:
+                card_ids[oracle_id] = legacy_ids[0]
+                existing_ids.add(legacy_ids[0])
+            merge_cards(card_ids[oracle_id], legacy_ids)
+        for oracle_id in oracle_ids:
+            card_ids.setdefault(oracle_id, oracle_id)
+        return card_ids, existing_ids
+
+    def _write_sets(self, scryfall_cards: Iterable[ScryfallCard]):
+        missing: Dict[str, MagicSet] = {}
+        for scryfall_card in scryfall_cards:
+            if scryfall_card.set not in self._set_ids and scryfall_card.set not in missing:
+                missing[scryfall_card.set] = MagicSet(
+                    id=uuid.UUID(set_id_from_scryfall_card(scryfall_card)),
+                    code=scryfall_card.set,
+                    name=scryfall_card.set_name,
+                )
+        if len(missing) == 0:
+            return
+        existing = dict(MagicSet.objects.filter(code__in=missing.keys()).values_list('code', 'id'))
+        self._set_ids.update(existing)
+        new_sets = [magic_set for code, magic_set in missing.items() if code not in existing]
+        MagicSet.objects.bulk_create(new_sets)
+        for magic_set in new_sets:
+            self._set_ids[magic_set.code] = magic_set.id
+
+    def _write_cards(self, batch: Dict[uuid.UUID, ScryfallCard], existing_ids):
+        to_create = []
+        to_update = []
+        stored_names = dict(Card.objects.filter(id__in=existing_ids).values_list('id', 'normalized_name'))
+        renamed = False
+        for card_id, scryfall_card in batch.items():
+            card = Card.objects.populate_from_scryfall_card(scryfall_card, Card(id=card_id))
+            if card_id in existing_ids:
+                to_update.append(card)
+                renamed = renamed or stored_names.get(card_id) != card.normalized_name
+            else:
+                to_create.append(card)
+        if renamed:
+            # The old names have to leave every process's name index
+            invalidate_name_index()
+        Card.objects.bulk_create(to_create)
+        Card.objects.bulk_update(to_update, CARD_FIELDS)
+        index_cards(to_create + to_update)
+
+    def _write_aliases(self, batch: Dict[uuid.UUID, ScryfallCard], existing_ids):
+        if len(existing_ids) > 0:
+            CardAlias.objects.filter(card_id__in=existing_ids).delete()
+        aliases = []
+        for card_id, scryfall_card in batch.items():
+            for alias in name_aliases(scryfall_card.name):
+                aliases.append(CardAlias(card_id=card_id, normalized_name=alias))
+        CardAlias.objects.bulk_create(aliases)
+
+    def _write_faces(self, batch: Dict[uuid.UUID, ScryfallCard], existing_ids):
+        if len(existing_ids) > 0:
+            CardFace.objects.filter(card_id__in=existing_ids).delete()
+        faces = []
+        for card_id, scryfall_card in batch.items():
+            if not is_multifaced(scryfall_card):
+                continue
+            for index, face in enumerate(scryfall_card.card_faces):
+                faces.append(Card.objects.from_scryfall_cardface(Card(id=card_id), index, face))
+        CardFace.objects.bulk_create(faces)
+
+    def _write_printings(self, batch: Dict[uuid.UUID, ScryfallCard], existing: Dict[uuid.UUID, 'StoredPrinting'],
+                         card_ids: Dict[uuid.UUID, uuid.UUID]):
+        to_create = []
+        to_update = []
+        for scryfall_id, scryfall_card in batch.items():
+            printing = Card.objects.populate_printing_from_scryfall_card(scryfall_card)
+            printing.card_id = card_ids[uuid.UUID(scryfall_card.oracle_id)]
+            printing.magic_set_id = self._set_ids[scryfall_card.set]
+            stored = existing.get(scryfall_id)
+            if stored is None or stored.id is None:
+                to_create.append(printing)
+            else:
+                printing.id = stored.id
+                to_update.append(printing)
+        Printing.objects.bulk_create(to_create)
+        Printing.objects.bulk_update(to_update, PRINTING_FIELDS)
@@ -0,0 +1,39 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from cards.models import DERIVED_FIELDS, Card
+
+
+class Command(BaseCommand):
+    help = 'Fills in the color, color identity, mana value and category columns of cards already in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of cards to update per query'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['id', 'layout', 'mana_cost', 'type_line', 'color_indicator', 'oracle_text'] + DERIVED_FIELDS
+        updated = 0
+        batch = []
+        # Cards are refreshed from their stored text; the next refresh from Scryfall replaces them with its values
+        for card in Card.objects.only(*fields).order_by('id').iterator(chunk_size=batch_size):
+            before = tuple(getattr(card, field) for field in DERIVED_FIELDS)
+            card.derive_attributes()
+            if tuple(getattr(card, field) for field in DERIVED_FIELDS) != before:
+                batch.append(card)
+            if len(batch) >= batch_size:
+                updated += self.write(batch)
+                batch = []
+        updated += self.write(batch)
+        self.stdout.write(f'{updated} cards updated')
+
+    @staticmethod
+    def write(batch) -> int:
+        with transaction.atomic():
+            Card.objects.bulk_update(batch, DERIVED_FIELDS)
+        return len(batch)
@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from cards.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Writes the card catalog, Commander Jumpstart decks and dungeons to a compressed snapshot file, ' \
+           'which loadcatalog can load into another database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='Path of the snapshot file to write'
+        )
+
+    def handle(self, *args, **options):
+        with open(options['path'], 'wb') as f:
+            counts = write_snapshot(f)
+        for label, count in counts.items():
+            self.stdout.write(f'{label}: {count} rows')
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management import BaseCommand
+
+from cards.ingest import CatalogIngester, DEFAULT_BATCH_SIZE
+from scryfall.bulk import iter_bulk_objects, open_bulk_file
+from scryfall.models import ScryfallCard
+
+
+class Command(BaseCommand):
+    help = 'Loads cards from a Scryfall bulk data file (e.g. default_cards.json) into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='Path to a Scryfall bulk data JSON file, optionally gzipped'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of cards to write per transaction'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def report(cards_written):
+            elapsed = time.monotonic() - started
+            rate = cards_written / elapsed if elapsed > 0 else 0
+            self.stdout.write(f'{cards_written} cards written ({rate:.0f} rows/sec)')
+
+        ingester = CatalogIngester(batch_size=options['batch_size'], progress=report)
+        skipped = 0
+        with open_bulk_file(options['path']) as f:
+            for data in iter_bulk_objects(f):
+                try:
+                    scryfall_card = ScryfallCard.from_dict(data)
+                except (KeyError, TypeError, ValueError):
+                    # Objects such as reversible cards lack the top-level fields we depend on
+                    skipped += 1
+                    continue
+                ingester.add(scryfall_card)
+        ingester.flush()
+
+        elapsed = time.monotonic() - started
+        rate = ingester.cards_written / elapsed if elapsed > 0 else 0
+        self.stdout.write(f'Finished: {ingester.cards_written} cards in {elapsed:.1f}s ({rate:.0f} rows/sec), '
+                          f'{skipped} skipped')
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from cards.snapshot import SnapshotError, load_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Loads a snapshot written by dumpcatalog into a freshly migrated database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='Path of a snapshot file'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as f:
+                counts = load_snapshot(f)
+        except SnapshotError as e:
+            raise CommandError(str(e))
+        for label, count in counts.items():
+            self.stdout.write(f'{label}: {count} rows')
+        self.stdout.write(f'Finished in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from cards.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rewrites the full-text search index from the cards table (only needed on SQLite)'
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write('Search index rebuilt')
@@ -1,46 +1,176 @@
-from typing import List
+import datetime
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
-from cards.models import MagicSet, Card, Printing
+from cards.ingest import CatalogIngester
+from cards.models import MagicSet
 from scryfall.client import ScryfallClient
-from scryfall.models import ScryfallSet, ScryfallCard
+from scryfall.models import ScryfallSet
+
+DEFAULT_WORKERS = 4
+WRITE_BATCH_SIZE = 500
+# Batches downloaded but not written yet, per download thread
+QUEUED_BATCHES = 2
+
+
+class SetDownloads(object):
+    """
+    Downloads sets from Scryfall onto [batches], a queue bounded by the number of [workers], as (code, set, cards)
+    tuples. A set's cards come in batches of WRITE_BATCH_SIZE followed by None, or a download error in place of the set.
+    """
+
+    def __init__(self, scryfall: ScryfallClient, workers: int):
+        self.scryfall = scryfall
+        self.batches = queue.Queue(maxsize=workers * QUEUED_BATCHES)
+        self.cancelled = threading.Event()
+
+    def put(self, item) -> bool:
+        while not self.cancelled.is_set():
+            try:
+                self.batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch(self, code: str):
+        """
+        Streams the cards of set [code] onto the queue. Stops early once the downloads are cancelled.
+        """
+        try:
+            scryfall_set = self.scryfall.get_set(code)
+            batch = []
+            for scryfall_card in self.scryfall.iter_cards_for_set_code(code):
+                batch.append(scryfall_card)
+                if len(batch) >= WRITE_BATCH_SIZE:
+                    if not self.put((code, scryfall_set, batch)):
+                        return
+                    batch = []
+            # The last batch may be empty, which still stores the set itself
+            if self.put((code, scryfall_set, batch)):
+                self.put((code, scryfall_set, None))
+        except Exception as e:
+            self.put((code, e, None))
 
 
 class Command(BaseCommand):
+    help = 'Fetches the given sets from Scryfall and upserts their cards, faces and printings. Cards whose data ' \
+           'has not changed since the last refresh are skipped.'
 
     def add_arguments(self, parser):
         parser.add_argument(
             'expansions',
             metavar='code',
             type=str,
-            nargs='+',
-            help='A list of expansion codes to update'
+            nargs='*',
+            help='A list of expansion codes to update (with --since, limits the sets that are considered)'
         )
         parser.add_argument(
             '--force',
-            action='store_true'
+            action='store_true',
+            help='Update cards that already exist and have changed, instead of only adding new ones'
+        )
+        parser.add_argument(
+            '--since',
+            type=datetime.date.fromisoformat,
+            metavar='YYYY-MM-DD',
+            help='Only refresh sets released on or after this date, or whose card count on Scryfall changed since their '
+                 'last refresh'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help='Number of sets to download at the same time'
         )
 
     def handle(self, *args, **options):
-        expansions = options['expansions']
+        expansions = list(dict.fromkeys(code.lower() for code in options['expansions']))
         forced = options['force']
         scryfall = ScryfallClient()
-        for code in expansions:
-            scryfall_set: ScryfallSet = scryfall.get_set(code)
-            local_set, created = MagicSet.objects.get_or_create(code=code, defaults={
+        if options['since'] is not None:
+            expansions = self.changed_set_codes(scryfall, options['since'], expansions)
+            self.stdout.write(f'{len(expansions)} sets to refresh')
+        elif len(expansions) == 0:
+            raise CommandError('Give at least one set code, or --since')
+
+        workers = max(1, options['workers'])
+        downloads = SetDownloads(scryfall, workers)
+        # Downloads run concurrently, but every batch is written by this thread alone, in its own transaction
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for code in expansions:
+                executor.submit(downloads.fetch, code)
+            try:
+                failed = self.write_sets(downloads.batches, len(expansions), forced)
+            finally:
+                downloads.cancelled.set()
+        if len(failed) > 0:
+            raise CommandError(f'Could not refresh {", ".join(failed)}')
+
+    def write_sets(self, batches: queue.Queue, count: int, forced: bool) -> List[str]:
+        """
+        Writes the batches of [count] sets as they arrive on [batches], returning the codes of the sets that failed
+        """
+        ingesters: Dict[str, CatalogIngester] = {}
+        totals: Dict[str, int] = {}
+        failed = []
+        remaining = count
+        while remaining > 0:
+            code, scryfall_set, scryfall_cards = batches.get()
+            if isinstance(scryfall_set, Exception):
+                self.stderr.write(f'{code}: {scryfall_set}')
+                failed.append(code)
+                remaining -= 1
+            elif scryfall_cards is None:
+                MagicSet.objects.filter(code=code).update(scryfall_card_count=scryfall_set.card_count)
+                self.stdout.write(f'{scryfall_set.name}: {ingesters[code].cards_written} of {totals[code]} '
+                                  f'cards written')
+                remaining -= 1
+            else:
+                if code not in ingesters:
+                    ingesters[code] = self.start_set(scryfall_set, forced)
+                    totals[code] = 0
+                ingesters[code].add_all(scryfall_cards)
+                totals[code] += len(scryfall_cards)
+        return failed
+
+    @staticmethod
+    def changed_set_codes(scryfall: ScryfallClient, since: datetime.date, codes: List[str]) -> List[str]:
+        """
+        Picks the sets worth downloading from Scryfall's set list: recent releases, plus sets we already have whose
+        card count on Scryfall changed since we last downloaded them (spoilers, late additions), or that were never
+        downloaded in full. Everything else would be a no-op.
+        """
+        local_counts = dict(MagicSet.objects.values_list('code', 'scryfall_card_count'))
+        changed = []
+        for scryfall_set in scryfall.iter_sets():
+            if len(codes) > 0 and scryfall_set.code not in codes:
+                continue
+            released = datetime.date.fromisoformat(scryfall_set.released_at) >= since
+            known = scryfall_set.code in local_counts
+            if released or (known and local_counts[scryfall_set.code] != scryfall_set.card_count):
+                changed.append(scryfall_set.code)
+        return changed
+
+    @staticmethod
+    def start_set(scryfall_set: ScryfallSet, forced: bool) -> CatalogIngester:
+        """
+        Stores (or with [forced], updates) the set itself, and returns the ingester its cards are written with
+        """
+        released_at = datetime.date.fromisoformat(scryfall_set.released_at) if scryfall_set.released_at else None
+        with transaction.atomic():
+            local_set, created = MagicSet.objects.get_or_create(code=scryfall_set.code, defaults={
                 'id': scryfall_set.id,
                 'name': scryfall_set.name,
+                'released_at': released_at,
             })
-            if forced and not created:
+            if forced and not created and (local_set.name, local_set.released_at) != (scryfall_set.name, released_at):
                 local_set.name = scryfall_set.name
-            print(f'Working with {local_set.name}')
-            scryfall_cards: List[ScryfallCard] = scryfall.get_cards_for_set_code(code)
-            for scryfall_card in scryfall_cards:
-                local_card, created = Card.objects.get_or_create(id=scryfall_card.id, defaults={
-                    'name': scryfall_card.name,
-                    'mana_cost': scryfall_card.mana_cost,
-                })
-                if created:
-                    print(f'Created: {local_card}')
-                printing, created = Printing.objects.get_or_create(magic_set=local_set, card=local_card)
+                local_set.released_at = released_at
+                local_set.save()
+        return CatalogIngester(batch_size=WRITE_BATCH_SIZE, update_existing=forced)
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.6 on 2026-10-18 15:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from cards.names import name_aliases, normalize_front_face
+
+
+def backfill_normalized_names(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    CardAlias = apps.get_model('cards', 'CardAlias')
+    cards = list(Card.objects.only('id', 'name'))
+    aliases = []
+    for card in cards:
+        card.normalized_name = normalize_front_face(card.name)
+        aliases.extend(CardAlias(card_id=card.id, normalized_name=alias) for alias in name_aliases(card.name))
+    Card.objects.bulk_update(cards, ['normalized_name'], batch_size=500)
+    CardAlias.objects.bulk_create(aliases, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0012_auto_20210523_1544'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='normalized_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.CreateModel(
+            name='CardAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_name', models.CharField(db_index=True, max_length=200)),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases',
+                                           to='cards.card')),
+            ],
+        ),
+        migrations.RunPython(backfill_normalized_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:04
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_scryfall_ids(apps, schema_editor):
+    """
+    Until now every card was keyed by the Scryfall id of its only printing, so that is the printing's Scryfall id.
+    Oracle ids are filled in (and reprints merged) by the next refresh.
+    """
+    Card = apps.get_model('cards', 'Card')
+    Printing = apps.get_model('cards', 'Printing')
+    single = Card.objects.annotate(printing_count=Count('printings')).filter(printing_count=1).values('id')
+    printings = list(Printing.objects.filter(card_id__in=single).only('id', 'card_id'))
+    for printing in printings:
+        printing.scryfall_id = printing.card_id
+    Printing.objects.bulk_update(printings, ['scryfall_id'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0013_card_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='magicset',
+            name='released_at',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='oracle_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='printing',
+            name='collector_number',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='printing',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='printing',
+            name='rarity',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='printing',
+            name='released_at',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='printing',
+            name='scryfall_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_scryfall_ids, migrations.RunPython.noop),
+    ]
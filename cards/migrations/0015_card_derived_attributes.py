@@ -0,0 +1,35 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0014_oracle_printing_split'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='category',
+            field=models.CharField(choices=[('C', 'Creature'), ('P', 'Planeswalker'), ('S', 'Sorcery'), ('I', 'Instant'),
+                                            ('A', 'Artifact'), ('E', 'Enchantment'), ('L', 'Land'), ('U', 'Unknown')],
+                                   db_index=True, default='U', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='color_identity',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='colors',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='mana_value',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+    ]
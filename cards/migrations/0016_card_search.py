@@ -0,0 +1,31 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+from cards.search import create_search_index, drop_search_index, index_cards
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor)
+    Card = apps.get_model('cards', 'Card')
+    index_cards(Card.objects.only('id', 'name', 'type_line', 'oracle_text', 'face_text'))
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0015_card_derived_attributes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='face_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
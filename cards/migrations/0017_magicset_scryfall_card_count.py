@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0016_card_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='magicset',
+            name='scryfall_card_count',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,82 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+DERIVED_FIELDS = ['colors', 'color_identity', 'mana_value', 'category']
+
+# Frozen copies of the helpers in cards.colors and cards.models as they were when this migration was written, so that
+# later changes to them don't change what it does
+COLOR_BITS = {'W': 1, 'U': 2, 'B': 4, 'R': 8, 'G': 16}
+SYMBOL = re.compile(r'{([^}]+)}')
+
+
+def color_mask(colors):
+    mask = 0
+    for color in colors:
+        mask |= COLOR_BITS.get(color, 0)
+    return mask
+
+
+def colors_from_mana_cost(mana_cost):
+    colors = set()
+    for symbol in SYMBOL.findall(mana_cost):
+        colors.update(part for part in symbol.split('/') if part in COLOR_BITS)
+    return colors
+
+
+def mana_value_from_cost(mana_cost):
+    total = 0.0
+    for symbol in SYMBOL.findall(mana_cost):
+        first = symbol.split('/')[0]
+        if first.isdigit():
+            total += int(first)
+        elif first in ('X', 'Y', 'Z'):
+            continue
+        elif first.startswith('H') or first == '½':
+            total += 0.5
+        else:
+            total += 1
+    return total
+
+
+def category_from_type_line(type_line):
+    for word, category in [('Land', 'L'), ('Creature', 'C'), ('Planeswalker', 'P'), ('Sorcery', 'S'),
+                           ('Instant', 'I'), ('Artifact', 'A'), ('Enchantment', 'E')]:
+        if word in type_line:
+            return category
+    return 'U'
+
+
+def derive_attributes(card):
+    """
+    The stored-text half of Card.derive_attributes, which historical models don't have
+    """
+    card.colors = color_mask(colors_from_mana_cost(card.mana_cost or '') | set(card.color_indicator or ''))
+    card.color_identity = card.colors | color_mask(colors_from_mana_cost(card.oracle_text or ''))
+    mana_cost = card.mana_cost or ''
+    card.mana_value = mana_value_from_cost(mana_cost if card.layout == 'split' else mana_cost.split(' // ')[0])
+    card.category = category_from_type_line(card.type_line)
+
+
+def backfill(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    batch = []
+    for card in Card.objects.order_by('id').iterator(chunk_size=BATCH_SIZE):
+        derive_attributes(card)
+        batch.append(card)
+        if len(batch) >= BATCH_SIZE:
+            Card.objects.bulk_update(batch, DERIVED_FIELDS)
+            batch = []
+    Card.objects.bulk_update(batch, DERIVED_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0017_magicset_scryfall_card_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,19 @@
+import hashlib
 import uuid
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List, Tuple
 
-from django.db import models, transaction
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
 from scryfall.client import ScryfallClient
+from .cache import batched_invalidation, get_card_by_name, get_cards, invalidate_catalog
+from .colors import color_mask, colors_from_mana_cost, mana_value_from_cost
+from .fuzzy import MATCH_THRESHOLD, get_name_index, index_card_names, invalidate_name_index
+from .names import face_names, name_aliases, normalize_front_face, normalize_name
+from .search import index_cards, unindex_cards
 from scryfall.models import ScryfallCard, ScryfallCardFace
 
 
@@ -41,12 +50,123 @@ class Type(models.TextChoices):
     UNKNOWN = 'U', _('Unknown')
 
 
+# The Card columns derive_attributes fills in
+DERIVED_FIELDS = ['colors', 'color_identity', 'mana_value', 'category']
+
+
+def category_from_type_line(type_line: str) -> str:
+    """
+    The Type a card is sorted under. Lands win over creatures, and so on down the list.
+    """
+    if 'Land' in type_line:
+        return Type.LAND
+    elif 'Creature' in type_line:
+        return Type.CREATURE
+    elif 'Planeswalker' in type_line:
+        return Type.PLANESWALKER
+    elif 'Sorcery' in type_line:
+        return Type.SORCERY
+    elif 'Instant' in type_line:
+        return Type.INSTANT
+    elif 'Artifact' in type_line:
+        return Type.ARTIFACT
+    elif 'Enchantment' in type_line:
+        return Type.ENCHANTMENT
+    return Type.UNKNOWN
+
+
+def colors_from_scryfall_card(scryfall_card: ScryfallCard) -> Optional[List[str]]:
+    """
+    Scryfall only gives multi-faced cards colors per face
+    """
+    if scryfall_card.colors is not None:
+        return scryfall_card.colors
+    face_colors = [color for face in scryfall_card.card_faces for color in face.colors]
+    if len(face_colors) > 0:
+        return face_colors
+    return None
+
+
+def face_text_from_scryfall_card(scryfall_card: ScryfallCard) -> str:
+    """
+    The searchable text of a multi-faced card's faces, whose rules text Scryfall doesn't give at the top level
+    """
+    if not is_multifaced(scryfall_card):
+        return ''
+    parts = []
+    for face in scryfall_card.card_faces:
+        parts.extend(part for part in (face.name, face.type_line, face.oracle_text) if part)
+    return '\n'.join(parts)
+
+
 def color_string_from_colors(colors: Optional[List[str]]) -> str:
     if colors is None:
         return ''
     return ''.join(colors)[:5]
 
 
+def is_multifaced(scryfall_card: ScryfallCard) -> bool:
+    return scryfall_card.card_faces is not None and len(scryfall_card.card_faces) > 1
+
+
+def collection_name(name: str) -> str:
+    """
+    Formats a user-entered name the way Scryfall names multi-faced cards, e.g. "Fire/Ice" -> "Fire // Ice"
+    """
+    name = name.strip()
+    if '/' not in name:
+        return name
+    return ' // '.join(part.strip() for part in name.split('/') if part.strip() != '')
+
+
+def set_id_from_scryfall_card(scryfall_card: ScryfallCard) -> str:
+    set_uri = scryfall_card.set_uri
+    return set_uri[set_uri.rindex('/') + 1:]
+
+
+def image_url_from_scryfall_card(scryfall_card: ScryfallCard) -> Optional[str]:
+    if scryfall_card.image_uris is not None:
+        return scryfall_card.image_uris.normal
+    if is_multifaced(scryfall_card):
+        face = scryfall_card.card_faces[0]
+        if face.image_uris is not None:
+            return face.image_uris.normal
+    return None
+
+
+CONTENT_HASH_VERSION = 2
+
+
+def content_hash_from_scryfall_card(scryfall_card: ScryfallCard) -> str:
+    """
+    A digest of everything Scryfall told us about a card. The repr covers every field of the model (faces and
+    images included), so the hash also changes when a field is added to ScryfallCard and the new column needs
+    filling in. Bump CONTENT_HASH_VERSION when the way cards are stored changes without the model changing.
+    """
+    return hashlib.sha1(f'{CONTENT_HASH_VERSION}:{scryfall_card!r}'.encode('utf-8')).hexdigest()
+
+
+def merge_cards(target_id, duplicate_ids: Iterable):
+    """
+    Points everything that references the [duplicate_ids] cards (printings, decks, ...) at [target_id] instead and
+    deletes the duplicates. Their faces and aliases are dropped with them; the target keeps its own.
+    """
+    duplicate_ids = [card_id for card_id in duplicate_ids if card_id != target_id]
+    if len(duplicate_ids) == 0:
+        return
+    for relation in Card._meta.related_objects:
+        if relation.many_to_many or relation.related_model in (CardAlias, CardFace):
+            continue
+        field = relation.field
+        relation.related_model.objects \
+            .filter(**{f'{field.attname}__in': duplicate_ids}) \
+            .update(**{field.attname: target_id})
+    Card.objects.filter(id__in=duplicate_ids).delete()
+
+
+FACE_FIELDS = ['name', 'mana_cost', 'type_line']
+
+
 class CardManager(models.Manager):
 
     def __init__(self):
@@ -58,16 +178,23 @@ class CardManager(models.Manager):
             card=parent_card,
             index=index,
             name=scryfall_face.name,
-            mana_cost=scryfall_face.mana_cost
+            mana_cost=scryfall_face.mana_cost,
+            type_line=scryfall_face.type_line,
         )
         return card_face
 
-    def from_scryfall_card(self, scryfall_card: ScryfallCard, card: Optional['Card'] = None) -> 'Card':
-        card = card or Card(id=scryfall_card.id)
-        is_dfc = scryfall_card.card_faces is not None and len(scryfall_card.card_faces) > 1
+    def populate_from_scryfall_card(self, scryfall_card: ScryfallCard, card: Optional['Card'] = None) -> 'Card':
+        """
+        Copies the card-level data from [scryfall_card] onto [card] (or a new, unsaved Card) without touching the database
+        """
+        oracle_id = uuid.UUID(scryfall_card.oracle_id)
+        card = card or Card(id=oracle_id)
+        is_dfc = is_multifaced(scryfall_card)
 
+        card.oracle_id = oracle_id
         card.layout = scryfall_card.layout
         card.name = scryfall_card.name
+        card.normalized_name = normalize_front_face(scryfall_card.name)
         card.type_line = scryfall_card.type_line
         card.color_indicator = color_string_from_colors(scryfall_card.color_indicator)
         card.loyalty = scryfall_card.loyalty
@@ -83,76 +210,272 @@ class CardManager(models.Manager):
                 if face.mana_cost is not None and face.mana_cost != '':
                     mana_costs.append(face.mana_cost)
             card.mana_cost = ' // '.join(mana_costs)
+        card.face_text = face_text_from_scryfall_card(scryfall_card)
+        card.derive_attributes(
+            colors=colors_from_scryfall_card(scryfall_card),
+            color_identity=scryfall_card.color_identity,
+            mana_value=scryfall_card.cmc,
+        )
+        return card
 
-        faces = []
-        if is_dfc:
-            if card.faces.count() > 0:
-                card.faces.all().delete()
-            for index, face in enumerate(scryfall_card.card_faces):
-                faces.append(self.from_scryfall_cardface(card, index, face))
+    @staticmethod
+    def populate_printing_from_scryfall_card(scryfall_card: ScryfallCard,
+                                             printing: Optional['Printing'] = None) -> 'Printing':
+        """
+        Copies the printing-level data from [scryfall_card] onto [printing] (or a new, unsaved Printing). The card and
+        set are left to the caller.
+        """
+        printing = printing or Printing()
+        printing.scryfall_id = scryfall_card.id
+        printing.image_url = image_url_from_scryfall_card(scryfall_card) or ''
+        printing.collector_number = scryfall_card.collector_number or ''
+        printing.rarity = scryfall_card.rarity or ''
+        printing.released_at = scryfall_card.released_at
+        printing.content_hash = content_hash_from_scryfall_card(scryfall_card)
+        return printing
 
-        with transaction.atomic():
+    def find_for_scryfall_card(self, scryfall_card: ScryfallCard, candidate: Optional['Card'] = None) -> Optional['Card']:
+        """
+        Finds the card [scryfall_card] is a printing of: the one with its oracle id, or else a card stored before
+        oracle ids were recorded (by this printing, or [candidate]). Any such older duplicates are merged into the
+        card that is returned.
+        """
+        target = self.get_queryset().filter(oracle_id=scryfall_card.oracle_id).first()
+        legacy_ids = set(Printing.objects
+                         .filter(scryfall_id=scryfall_card.id, card__oracle_id=None)
+                         .values_list('card_id', flat=True))
+        if candidate is not None and candidate.oracle_id is None:
+            legacy_ids.add(candidate.id)
+        if target is None:
+            if len(legacy_ids) == 0:
+                return None
+            if candidate is not None and candidate.id in legacy_ids:
+                target = candidate
+            else:
+                target = self.get_queryset().get(id=next(iter(legacy_ids)))
+        merge_cards(target.id, legacy_ids)
+        return target
+
+    def from_scryfall_card(self, scryfall_card: ScryfallCard, card: Optional['Card'] = None) -> 'Card':
+        """
+        Creates or updates [card] from [scryfall_card]. Faces are diffed by index against the stored ones, so an
+        unchanged DFC costs one query for its faces and a changed one two.
+        """
+        card = self.populate_from_scryfall_card(scryfall_card, card)
+
+        # Without a savepoint of its own, so that an unchanged card costs no more than its update and face query
+        with transaction.atomic(savepoint=False):
             card.save()
-            if is_dfc:
-                for face in faces:
-                    face.save()
+            if is_multifaced(scryfall_card):
+                faces = [self.from_scryfall_cardface(card, index, face)
+                         for index, face in enumerate(scryfall_card.card_faces)]
+                # Even an unsaved [card] can have stored faces, when its id belongs to a card in the database
+                existing = {face.index: face for face in card.faces.all()}
+                self.sync_faces(faces, existing)
+        return card
+
+    @staticmethod
+    def sync_faces(faces: List['CardFace'], existing: Dict[int, 'CardFace']):
+        to_create = []
+        to_update = []
+        for face in faces:
+            stored = existing.pop(face.index, None)
+            if stored is None:
+                to_create.append(face)
+            elif any(getattr(stored, field) != getattr(face, field) for field in FACE_FIELDS):
+                for field in FACE_FIELDS:
+                    setattr(stored, field, getattr(face, field))
+                to_update.append(stored)
+        if len(to_create) > 0:
+            CardFace.objects.bulk_create(to_create)
+        if len(to_update) > 0:
+            CardFace.objects.bulk_update(to_update, FACE_FIELDS)
+        if len(existing) > 0:
+            CardFace.objects.filter(id__in=[face.id for face in existing.values()]).delete()
+
+    def get_by_name(self, name: str) -> 'Card':
+        """
+        Finds a card by (normalized) name through the indexed normalized_name column, falling back to the alias
+        table for full DFC names and back faces. Raises Card.DoesNotExist if neither matches.
+        """
+        normalized = normalize_name(name)
+        card = self.get_queryset().filter(normalized_name=normalized).order_by('name').first()
+        if card is None:
+            card = self.get_queryset().filter(aliases__normalized_name=normalized).order_by('name').first()
+        if card is None:
+            raise Card.DoesNotExist(f'No card named {name}')
         return card
 
+    @staticmethod
+    def get_cached_by_name(name: str) -> 'Card':
+        """
+        get_by_name through the card cache (see cards.cache), for read-only use
+        """
+        card = get_card_by_name(name)
+        if card is None:
+            raise Card.DoesNotExist(f'No card named {name}')
+        return card
+
+    @staticmethod
+    def in_bulk_cached(card_ids: Iterable) -> Dict:
+        return get_cards(card_ids)
+
+    def get_by_names(self, names: Iterable[str]) -> Dict[str, 'Card']:
+        """
+        Batch version of get_by_name, using at most two queries. Names without a match are left out of the result.
+        """
+        wanted = {}
+        for name in names:
+            wanted.setdefault(normalize_name(name), []).append(name)
+        found = {}
+        queryset = self.get_queryset().filter(normalized_name__in=wanted.keys()).order_by('-name')
+        for card in queryset.prefetch_related('printings'):
+            found[card.normalized_name] = card
+        remaining = [normalized for normalized in wanted.keys() if normalized not in found]
+        if len(remaining) > 0:
+            aliases = CardAlias.objects \
+                .filter(normalized_name__in=remaining) \
+                .select_related('card') \
+                .prefetch_related('card__printings') \
+                .order_by('-card__name')
+            for alias in aliases:
+                found[alias.normalized_name] = alias.card
+        result = {}
+        for normalized, card in found.items():
+            for name in wanted[normalized]:
+                result[name] = card
+        return result
+
+    def get_by_name_fuzzy(self, name: str, threshold: float = MATCH_THRESHOLD) -> Tuple['Card', float]:
+        """
+        Finds the card whose name is closest to [name] using the in-memory trigram index, without going to
+        Scryfall. Returns the card and a confidence score between 0 and 1, or raises Card.DoesNotExist if nothing
+        scores at least [threshold].
+        """
+        match = get_name_index().match(name, threshold)
+        card = None
+        if match is not None:
+            card = self.get_queryset().filter(id=match.card_id).first()
+        if card is None:
+            raise Card.DoesNotExist(f'No card named like {name}')
+        return card, match.score
+
     def get_or_fetch_printing_for_name(self, name: str):
+        """
+        The printing for [name]. Names that aren't stored are matched against the stored names first, so that a
+        misspelling of a known card costs no request, and only then looked up with Scryfall's fuzzy search.
+        """
+        card = self.find_stored_card(name)
         scryfall_card = None
-        queryset = self.get_queryset()
-        try:
-            card = queryset.get(name__iexact=name)
+        if card is not None:
             if card.should_update():
-                scryfall_card = scryfall_card or self.scryfall.get_card_by_name_fuzzy(name)
-                card = self.from_scryfall_card(scryfall_card, card)
+                scryfall_card = self.scryfall.get_card_by_name_fuzzy(name)
+                card = self.from_scryfall_card(scryfall_card, self.find_for_scryfall_card(scryfall_card, card) or card)
             printing = card.printings.first()
             if printing is not None:
-                if 'ec8e4142' in printing.image_url and card.name != 'Totally Lost':
-                    # Special case for the Totally Lost art
-                    scryfall_card = scryfall_card or self.scryfall.get_card_by_name_fuzzy(name)
-                    if scryfall_card.image_uris is not None:
-                        printing.image_url = scryfall_card.image_uris.normal
-                        printing.save()
-                    elif scryfall_card.card_faces is not None and len(scryfall_card.card_faces) > 1:
-                        face = scryfall_card.card_faces[0]
-                        if face.image_uris is not None:
-                            printing.image_url = face.image_uris.normal
-                            printing.save()
+                self.fix_printing_art(card, printing, name, scryfall_card)
                 return printing
-        except Card.DoesNotExist:
-            card = None
         #  Card doesn't exist in our database, let's fetch it
         #  Handle DFCs
         if '/' in name:
             name, _ = name.split('/', maxsplit=1)
         scryfall_card = scryfall_card or self.scryfall.get_card_by_name_fuzzy(name)
-        if card is None:
-            card = self.from_scryfall_card(scryfall_card)
-        s = scryfall_card.set_uri
-        set_id = s[s.rindex('/') + 1:]
-        magic_set, created = MagicSet.objects.get_or_create(code=scryfall_card.set, defaults={
-            'name': scryfall_card.set_name,
-            'id': set_id,
-        })
-        if scryfall_card.image_uris is not None:
-            image_url = scryfall_card.image_uris.normal
-        elif scryfall_card.card_faces is not None and len(scryfall_card.card_faces) > 1:
-            face = scryfall_card.card_faces[0]
-            if face.image_uris is not None:
-                image_url = face.image_uris.normal
-            else:
-                raise Exception(f'Could not find a card image for {scryfall_card}')
-        else:
-            raise Exception(f'Could not find a card image for {scryfall_card}')
-
-        printing = Printing.objects.create(
-            magic_set=magic_set,
-            card=card,
-            image_url=image_url
-        )
+        return self.create_printing_from_scryfall_card(scryfall_card, card)
+
+    def find_stored_card(self, name: str) -> Optional['Card']:
+        """
+        The stored card named [name], or else the one whose name is closest to it, or None
+        """
+        try:
+            return self.get_by_name(name)
+        except Card.DoesNotExist:
+            pass
+        try:
+            card, _ = self.get_by_name_fuzzy(name)
+            return card
+        except Card.DoesNotExist:
+            return None
+
+    def fix_printing_art(self, card: 'Card', printing: 'Printing', name: str,
+                         scryfall_card: Optional[ScryfallCard] = None):
+        if 'ec8e4142' in printing.image_url and card.name != 'Totally Lost':
+            # Special case for the Totally Lost art
+            scryfall_card = scryfall_card or self.scryfall.get_card_by_name_fuzzy(name)
+            image_url = image_url_from_scryfall_card(scryfall_card)
+            if image_url is not None:
+                printing.image_url = image_url
+                printing.save()
+
+    def create_printing_from_scryfall_card(self, scryfall_card: ScryfallCard, card: Optional['Card'] = None,
+                                           retry: bool = True):
+        """
+        Returns the printing for [scryfall_card], storing it (and its card, unless [card] is given) if needed. If
+        another thread or process stores the same card or printing at the same time, its rows are used instead.
+        """
+        printing = Printing.objects.filter(scryfall_id=scryfall_card.id).first()
+        if printing is not None:
+            return printing
+        try:
+            with transaction.atomic():
+                card = self.find_for_scryfall_card(scryfall_card, card)
+                if card is None or card.oracle_id is None:
+                    card = self.from_scryfall_card(scryfall_card, card)
+                magic_set, created = MagicSet.objects.get_or_create(code=scryfall_card.set, defaults={
+                    'name': scryfall_card.set_name,
+                    'id': set_id_from_scryfall_card(scryfall_card),
+                })
+                printing = self.populate_printing_from_scryfall_card(scryfall_card)
+                if printing.image_url == '':
+                    raise Exception(f'Could not find a card image for {scryfall_card}')
+                printing.card = card
+                printing.magic_set = magic_set
+                printing.save()
+        except IntegrityError:
+            if not retry:
+                raise
+            return self.create_printing_from_scryfall_card(scryfall_card, retry=False)
         return printing
 
+    @batched_invalidation()
+    def get_or_fetch_printings_for_names(self, names: Iterable[str]) -> Dict[str, 'Printing']:
+        """
+        Batch version of get_or_fetch_printing_for_name, returning a printing for each of [names].
+
+        Names already in the database are resolved with a single query, the rest with one Scryfall collection
+        request per 75 names. Only names Scryfall can't match exactly fall back to individual fuzzy lookups. The card
+        cache is invalidated once for the whole batch.
+        """
+        names = list(dict.fromkeys(names))
+        local_cards = self.get_by_names(names)
+
+        result = {}
+        missing = {}
+        for name in names:
+            card = local_cards.get(name)
+            if card is None:
+                missing.setdefault(collection_name(name), []).append(name)
+                continue
+            printings = list(card.printings.all())
+            needs_art_fix = len(printings) > 0 and 'ec8e4142' in printings[0].image_url and card.name != 'Totally Lost'
+            if card.should_update() or len(printings) == 0 or needs_art_fix:
+                result[name] = self.get_or_fetch_printing_for_name(name)
+            else:
+                result[name] = printings[0]
+
+        if len(missing) == 0:
+            return result
+        collection = self.scryfall.get_cards_by_names(missing.keys())
+        printings_by_id = {}
+        for lookup_name, scryfall_card in collection.found.items():
+            if scryfall_card.id not in printings_by_id:
+                printings_by_id[scryfall_card.id] = self.create_printing_from_scryfall_card(scryfall_card)
+            for name in missing[lookup_name]:
+                result[name] = printings_by_id[scryfall_card.id]
+        for lookup_name in collection.not_found:
+            for name in missing[lookup_name]:
+                result[name] = self.get_or_fetch_printing_for_name(name)
+        return result
+
     def get_or_create_printing_for_name(self, name):
         queryset = self.get_queryset()
         card, created = queryset.get_or_create(name=name, defaults={
@@ -184,6 +507,23 @@ class Card(models.Model):
     power = models.CharField(max_length=5, null=True, blank=True)
     toughness = models.CharField(max_length=5, null=True, blank=True)
 
+    # Shared by every printing of the card. Cards stored before oracle ids were recorded have none until refreshed.
+    oracle_id = models.UUIDField(unique=True, null=True, blank=True)
+    normalized_name = models.CharField(max_length=200, db_index=True, default='', editable=False)
+    # Names, type lines and rules text of every face, for full-text search (see cards.search)
+    face_text = models.TextField(blank=True, default='', editable=False)
+
+    # Derived from the fields above when the card is ingested, so that they can be filtered and sorted on in SQL.
+    # The color fields are bitmasks, see cards.colors.
+    colors = models.PositiveSmallIntegerField(default=0, db_index=True)
+    color_identity = models.PositiveSmallIntegerField(default=0, db_index=True)
+    mana_value = models.FloatField(default=0, db_index=True)
+    category = models.CharField(max_length=1, choices=Type.choices, default=Type.UNKNOWN, db_index=True)
+
+    # The field values as last loaded or saved, to tell whether a save changes anything
+    _saved_values: Optional[Dict[str, object]] = None
+    _unchanged = False
+
     def should_update(self) -> bool:
         if self.type_line == '':
             return True
@@ -194,12 +534,103 @@ class Card(models.Model):
     def __str__(self):
         return self.name
 
+    def derive_attributes(self, colors: Optional[Iterable[str]] = None, color_identity: Iterable[str] = (),
+                          mana_value: Optional[float] = None):
+        """
+        Fills in the derived fields. Values Scryfall gave us are used as they are; anything missing is worked out
+        from the mana cost, color indicator, oracle text and type line.
+        """
+        if colors is None:
+            colors = colors_from_mana_cost(self.mana_cost or '') | set(self.color_indicator or '')
+        self.colors = color_mask(colors)
+        color_identity = list(color_identity)
+        if len(color_identity) == 0:
+            color_identity = colors_from_mana_cost(self.oracle_text or '')
+        self.color_identity = self.colors | color_mask(color_identity)
+        if mana_value is None:
+            mana_cost = self.mana_cost or ''
+            # Both halves of a split card count; other multi-faced cards only count their front
+            mana_value = mana_value_from_cost(mana_cost if self.layout == 'split' else mana_cost.split(' // ')[0])
+        self.mana_value = mana_value
+        self.category = category_from_type_line(self.type_line)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_values = instance.field_values()
+        return instance
+
+    def field_values(self) -> Dict[str, object]:
+        return {field.attname: self.__dict__[field.attname] for field in self._meta.concrete_fields
+                if field.attname in self.__dict__}
+
+    @property
+    def is_unchanged(self) -> bool:
+        """
+        Whether this card was loaded from the database and none of its fields have changed since
+        """
+        return self._saved_values is not None and self._saved_values == self.field_values()
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        self.normalized_name = normalize_front_face(self.name)
+        if update_fields is not None and 'name' in update_fields:
+            update_fields = list(update_fields) + ['normalized_name']
+        saved_name = self._saved_values.get('name') if self._saved_values is not None else None
+        # Read by the post_save signal, which leaves the cache alone for saves that change nothing
+        self._unchanged = self.is_unchanged
+        super().save(force_insert, force_update, using, update_fields)
+        if not self._unchanged:
+            index_cards([self])
+        if self.name != saved_name:
+            self.sync_aliases(saved_name)
+            index_card_names((self.id, name) for name in [self.name] + face_names(self.name))
+            if saved_name is not None:
+                invalidate_name_index()
+        self._saved_values = self.field_values()
+
+    def sync_aliases(self, saved_name: Optional[str] = None):
+        aliases = name_aliases(self.name)
+        if saved_name is not None or len(aliases) > 0:
+            self.aliases.all().delete()
+        CardAlias.objects.bulk_create([CardAlias(card=self, normalized_name=alias) for alias in aliases])
+
+
+@receiver(post_delete, sender=Card)
+def remove_deleted_card_from_search(sender, instance: Card, **kwargs):
+    unindex_cards([instance.id])
+
+
+@receiver(post_save, sender=Card)
+def invalidate_cached_cards(sender, instance: Card, **kwargs):
+    if not instance._unchanged:
+        invalidate_catalog()
+
+
+@receiver(post_delete, sender=Card)
+def invalidate_deleted_cards(sender, **kwargs):
+    invalidate_catalog()
+    invalidate_name_index()
+
+
+class CardAlias(models.Model):
+    """
+    An additional normalized name a card can be found by, such as the full name or back face of a DFC
+    """
+    card = models.ForeignKey(Card, related_name='aliases', on_delete=models.CASCADE)
+    normalized_name = models.CharField(max_length=200, db_index=True)
+
+    def __str__(self):
+        return self.normalized_name
+
 
 class MagicSet(models.Model):
     id = models.UUIDField(primary_key=True)
     code = models.CharField(max_length=5, unique=True)
     name = models.CharField(max_length=100)
+    released_at = models.DateField(null=True, blank=True)
     cards = models.ManyToManyField(Card, through='Printing')
+    # Scryfall's card count for the set when refreshset last downloaded all of it, if it ever did
+    scryfall_card_count = models.IntegerField(null=True, blank=True, editable=False)
 
     def get_absolute_url(self):
         from django.shortcuts import reverse
@@ -224,6 +655,26 @@ class Printing(models.Model):
     magic_set = models.ForeignKey(MagicSet, on_delete=models.CASCADE, related_name='printings')
     card = models.ForeignKey(Card, related_name='printings', on_delete=models.CASCADE)
     image_url = models.URLField()
+    scryfall_id = models.UUIDField(unique=True, null=True, blank=True)
+    collector_number = models.CharField(max_length=10, blank=True, default='')
+    rarity = models.CharField(max_length=10, blank=True, default='')
+    released_at = models.DateField(null=True, blank=True)
+    content_hash = models.CharField(max_length=40, blank=True, default='', editable=False)
 
     def __str__(self):
         return f'{self.card.name} in {self.magic_set.name}'
+
+    def get_image_url(self, variant: str = 'normal') -> str:
+        """
+        The URL to show this printing's image at, which is the local image proxy unless settings.CARD_IMAGE_PROXY is off
+        """
+        if not settings.CARD_IMAGE_PROXY:
+            return self.image_url
+        from django.shortcuts import reverse
+        return reverse('card-image', args=[self.id, variant])
+
+
+@receiver(post_save, sender=Printing)
+@receiver(post_delete, sender=Printing)
+def invalidate_cached_printings(sender, **kwargs):
+    invalidate_catalog()
@@ -0,0 +1,40 @@
+import re
+import unicodedata
+from typing import Set
+
+_APOSTROPHES = re.compile(r"['’‘`]")
+_PUNCTUATION = re.compile(r'[^\w\s]|_')
+_WHITESPACE = re.compile(r'\s+')
+_FACE_SEPARATOR = re.compile(r'\s*/+\s*')
+
+
+def normalize_name(name: str) -> str:
+    """
+    Reduces a card name to the form used for lookups: case-folded, without diacritics or punctuation, and with
+    whitespace collapsed. "Æther Vial" -> "aether vial", "Fire // Ice" and "Fire/Ice" -> "fire ice"
+    """
+    name = unicodedata.normalize('NFKD', name.replace('Æ', 'Ae').replace('æ', 'ae'))
+    name = ''.join(character for character in name if not unicodedata.combining(character))
+    name = _APOSTROPHES.sub('', name.casefold())
+    name = _PUNCTUATION.sub(' ', name)
+    return _WHITESPACE.sub(' ', name).strip()
+
+
+def face_names(name: str) -> list:
+    return [part for part in _FACE_SEPARATOR.split(name.strip()) if part != '']
+
+
+def normalize_front_face(name: str) -> str:
+    faces = face_names(name)
+    return normalize_name(faces[0] if len(faces) > 0 else name)
+
+
+def name_aliases(name: str) -> Set[str]:
+    """
+    The other normalized names a card can be looked up by: its full name and each of its faces
+    """
+    aliases = {normalize_name(name)}
+    aliases.update(normalize_name(face) for face in face_names(name))
+    aliases.discard(normalize_front_face(name))
+    aliases.discard('')
+    return aliases
@@ -0,0 +1,254 @@
+"""
+A subset of Scryfall's search syntax, compiled to a single query over the local card tables.
+
+    t:creature c:r mv<=2 o:"haste"        red creatures with mana value 2 or less and haste
+    (s:cmr or s:khm) -t:land r>=rare      rare and mythic nonland printings from either set
+    id<=wu !"Austere Command"             exact name, within an Azorius color identity
+
+Supported keywords: bare words and name: (name), !"..." (exact name), t/type, o/oracle, m/mana, c/color,
+id/identity/ci, mv/cmc/manavalue, s/set/e/edition, r/rarity and year. Terms are ANDed, "or" and parentheses group
+them and a leading - negates one. Queries compile to a Q over Printing, so set, rarity and year conditions apply to
+the printing while everything else is about its card.
+"""
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.db.models import Q
+
+from .colors import COLOR_BITS
+from .names import normalize_name
+
+QUERY_CACHE_SIZE = 256
+
+COLOR_NAMES = {'white': 'W', 'blue': 'U', 'black': 'B', 'red': 'R', 'green': 'G'}
+RARITIES = ['common', 'uncommon', 'rare', 'mythic']
+NUMERIC_LOOKUPS = {':': 'exact', '=': 'exact', '<': 'lt', '<=': 'lte', '>': 'gt', '>=': 'gte'}
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<open>\() |
+        (?P<close>\)) |
+        (?P<negate>-)(?=\S) |
+        (?P<exact>!)(?P<exact_value>"[^"]*"|[^\s()"]+) |
+        (?:(?P<key>[A-Za-z]+)(?P<operator><=|>=|!=|:|=|<|>))?(?P<value>"[^"]*"|[^\s()"]+)
+    )''', re.VERBOSE)
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if len(value) >= 2 and value[0] == '"' and value[-1] == '"' else value
+
+
+def _tokenize(text: str) -> List[Tuple[str, ...]]:
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise QuerySyntaxError(f'Could not read the query from "{text[position:]}"')
+        position = match.end()
+        if match.group('open'):
+            tokens.append(('(',))
+        elif match.group('close'):
+            tokens.append((')',))
+        elif match.group('negate'):
+            tokens.append(('-',))
+        elif match.group('exact'):
+            tokens.append(('term', '!', '=', _unquote(match.group('exact_value'))))
+        elif match.group('key') is None and match.group('value').lower() in ('or', 'and'):
+            tokens.append((match.group('value').lower(),))
+        else:
+            tokens.append(('term', (match.group('key') or '').lower(), match.group('operator') or ':',
+                           _unquote(match.group('value'))))
+    return tokens
+
+
+def _masks_for(operator: str, mask: int) -> List[int]:
+    """
+    Every 5-bit color mask that satisfies [operator] against [mask], so color conditions are an IN over the indexed
+    column rather than bitwise arithmetic on every row
+    """
+    comparisons: Dict[str, Callable[[int], bool]] = {
+        '=': lambda candidate: candidate == mask,
+        '!=': lambda candidate: candidate != mask,
+        '>=': lambda candidate: candidate & mask == mask,
+        '>': lambda candidate: candidate & mask == mask and candidate != mask,
+        '<=': lambda candidate: candidate & ~mask == 0,
+        '<': lambda candidate: candidate & ~mask == 0 and candidate != mask,
+    }
+    return [candidate for candidate in range(32) if comparisons[operator](candidate)]
+
+
+def _color_term(field: str, operator: str, value: str, default_operator: str) -> Q:
+    value = value.lower()
+    if operator == ':':
+        operator = default_operator
+    if value in ('m', 'multicolor'):
+        return Q(**{f'{field}__in': [mask for mask in range(32) if bin(mask).count('1') >= 2]})
+    if value in ('c', 'colorless'):
+        return Q(**{field: 0})
+    letters = COLOR_NAMES.get(value, value.upper())
+    if any(letter not in COLOR_BITS for letter in letters):
+        raise QuerySyntaxError(f'"{value}" is not a color')
+    mask = 0
+    for letter in letters:
+        mask |= COLOR_BITS[letter]
+    return Q(**{f'{field}__in': _masks_for(operator, mask)})
+
+
+def _numeric_term(field: str, operator: str, value: str, cast: Callable = float) -> Q:
+    try:
+        number = cast(value)
+    except ValueError:
+        raise QuerySyntaxError(f'"{value}" is not a number')
+    if operator == '!=':
+        return ~Q(**{field: number})
+    return Q(**{f'{field}__{NUMERIC_LOOKUPS[operator]}': number})
+
+
+def _rarity_term(operator: str, value: str) -> Q:
+    value = {'c': 'common', 'u': 'uncommon', 'r': 'rare', 'm': 'mythic'}.get(value.lower(), value.lower())
+    if value not in RARITIES:
+        raise QuerySyntaxError(f'"{value}" is not a rarity')
+    rank = RARITIES.index(value)
+    ranks = {
+        ':': [rank], '=': [rank], '!=': [index for index in range(len(RARITIES)) if index != rank],
+        '<': range(rank), '<=': range(rank + 1), '>': range(rank + 1, len(RARITIES)),
+        '>=': range(rank, len(RARITIES)),
+    }[operator]
+    return Q(rarity__in=[RARITIES[index] for index in ranks])
+
+
+def _mana_cost(value: str) -> str:
+    """
+    "2rr" and "{2}{R}{R}" both become "{2}{R}{R}"
+    """
+    if '{' in value:
+        return value.upper()
+    return ''.join('{' + symbol + '}' for symbol in re.findall(r'\d+|[a-zA-Z]', value.upper()))
+
+
+def _text_term(operator: str, value: str, fields: List[str]) -> Q:
+    if operator not in (':', '='):
+        raise QuerySyntaxError(f'"{operator}" can not be used with text')
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': value})
+    return condition
+
+
+def _set_term(operator: str, value: str) -> Q:
+    if operator not in (':', '='):
+        raise QuerySyntaxError(f'"{operator}" can not be used with sets')
+    return Q(magic_set__code=value.lower())
+
+
+def _exact_name_term(operator: str, value: str) -> Q:
+    return Q(card__normalized_name=normalize_name(value)) | Q(card__aliases__normalized_name=normalize_name(value))
+
+
+# Each keyword's spellings, and how a term using it becomes a condition on printings, given its operator and value
+_KEYWORDS: List[Tuple[Tuple[str, ...], Callable[[str, str], Q]]] = [
+    (('', 'name', 'n'), lambda operator, value: _text_term(operator, value, ['card__name'])),
+    (('!',), _exact_name_term),
+    (('t', 'type'), lambda operator, value: _text_term(operator, value, ['card__type_line'])),
+    (('o', 'oracle'), lambda operator, value: _text_term(operator, value, ['card__oracle_text', 'card__face_text'])),
+    (('m', 'mana'), lambda operator, value: _text_term(operator, _mana_cost(value), ['card__mana_cost'])),
+    (('c', 'color'), lambda operator, value: _color_term('card__colors', operator, value, '>=')),
+    (('id', 'identity', 'ci'), lambda operator, value: _color_term('card__color_identity', operator, value, '<=')),
+    (('mv', 'cmc', 'manavalue'), lambda operator, value: _numeric_term('card__mana_value', operator, value)),
+    (('s', 'set', 'e', 'edition'), _set_term),
+    (('r', 'rarity'), _rarity_term),
+    (('year',), lambda operator, value: _numeric_term('released_at__year', operator, value, int)),
+]
+_TERMS = {key: build for keys, build in _KEYWORDS for key in keys}
+
+
+def _term(key: str, operator: str, value: str) -> Q:
+    if key not in _TERMS:
+        raise QuerySyntaxError(f'Unknown keyword "{key}"')
+    return _TERMS[key](operator, value)
+
+
+class _Parser(object):
+    """
+    Recursive descent over the tokens: or binds loosest, then implicit and, then negation and parentheses
+    """
+
+    def __init__(self, tokens: List[Tuple[str, ...]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def parse(self) -> Q:
+        if len(self.tokens) == 0:
+            return Q()
+        condition = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError('Unexpected ")"')
+        return condition
+
+    def parse_or(self) -> Q:
+        condition = self.parse_and()
+        while self.peek() == 'or':
+            self.position += 1
+            condition = condition | self.parse_and()
+        return condition
+
+    def parse_and(self) -> Q:
+        condition = self.parse_unary()
+        while self.peek() not in (None, ')', 'or'):
+            if self.peek() == 'and':
+                self.position += 1
+            condition = condition & self.parse_unary()
+        return condition
+
+    def parse_unary(self) -> Q:
+        token = self.tokens[self.position] if self.position < len(self.tokens) else None
+        if token is None or token[0] in (')', 'or', 'and'):
+            raise QuerySyntaxError('Expected a search term')
+        self.position += 1
+        if token[0] == '-':
+            return ~self.parse_unary()
+        if token[0] == '(':
+            condition = self.parse_or()
+            if self.peek() != ')':
+                raise QuerySyntaxError('Missing ")"')
+            self.position += 1
+            return condition
+        return _term(*token[1:])
+
+
+def _prefixed(condition: Q, prefix: str) -> Q:
+    children = [_prefixed(child, prefix) if isinstance(child, Q) else (prefix + child[0], child[1])
+                for child in condition.children]
+    return Q(*children, _connector=condition.connector, _negated=condition.negated)
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def compile_query(text: str, prefix: str = '') -> Q:
+    """
+    The Q over Printing (or over whatever reaches Printing through [prefix], e.g. 'printing__' for cube entries)
+    that [text] describes. Compiled queries are cached, so Q objects returned from here must not be modified.
+    """
+    return _prefixed(_Parser(_tokenize(text)).parse(), prefix)
+
+
+def search_printings(text: str):
+    from .models import Printing
+    return Printing.objects.filter(compile_query(text)).distinct()
+
+
+def search_cards(text: str):
+    """
+    The cards with at least one printing matching [text], as one query with a subquery over printings
+    """
+    from .models import Card
+    return Card.objects.filter(id__in=search_printings(text).values('card_id'))
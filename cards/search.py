@@ -0,0 +1,180 @@
+"""
+Full-text search over card names, type lines, oracle text and face text.
+
+On SQLite the text lives in an FTS5 table (cards_card_fts) whose rowids are derived from the card ids, so that it
+survives Django remaking cards_card during migrations. Writers keep it current through index_cards and
+unindex_cards, which the ingester, Card.save and card deletion call. On PostgreSQL a GIN index over the same
+columns' tsvector keeps itself current. Other databases fall back to LIKE.
+"""
+import re
+import uuid
+from typing import Iterable, List, Tuple
+
+from django.db import connection
+
+FTS_TABLE = 'cards_card_fts'
+FTS_COLUMNS = ['name', 'type_line', 'oracle_text', 'face_text']
+# bm25 column weights for name, type_line, oracle_text and face_text: a name match outranks a rules-text match
+FTS_WEIGHTS = (10.0, 3.0, 1.0, 1.0)
+INDEX_CHUNK_SIZE = 500
+
+POSTGRES_DOCUMENT = "to_tsvector('english', coalesce(name, '') || ' ' || coalesce(type_line, '') || ' ' || " \
+                    "coalesce(oracle_text, '') || ' ' || coalesce(face_text, ''))"
+
+SQLITE_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(card_id UNINDEXED, {', '.join(FTS_COLUMNS)}, "
+    f"tokenize='unicode61 remove_diacritics 2')",
+]
+SQLITE_DROP = [f'DROP TABLE IF EXISTS {FTS_TABLE}']
+POSTGRES_SCHEMA = [f'CREATE INDEX IF NOT EXISTS cards_card_search ON cards_card USING GIN ({POSTGRES_DOCUMENT})']
+POSTGRES_DROP = ['DROP INDEX IF EXISTS cards_card_search']
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def create_search_index(schema_editor):
+    statements = {'sqlite': SQLITE_SCHEMA, 'postgresql': POSTGRES_SCHEMA}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(schema_editor):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def _fts_rowid(card_id) -> int:
+    """
+    A stable, positive 63-bit rowid for a card id
+    """
+    if not isinstance(card_id, uuid.UUID):
+        card_id = uuid.UUID(str(card_id))
+    return card_id.int >> 65
+
+
+def index_cards(cards: Iterable):
+    """
+    Writes the searchable text of [cards] (Card instances, saved or not) to the FTS5 table, replacing what was there
+    """
+    if connection.vendor != 'sqlite':
+        return
+    rows = [(_fts_rowid(card.id), str(card.id), card.name, card.type_line, card.oracle_text, card.face_text)
+            for card in cards]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), INDEX_CHUNK_SIZE):
+            chunk = rows[start:start + INDEX_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', [row[0] for row in chunk])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE}(rowid, card_id, {", ".join(FTS_COLUMNS)}) VALUES (%s, %s, %s, %s, %s, %s)',
+                chunk)
+
+
+def unindex_cards(card_ids: Iterable):
+    if connection.vendor != 'sqlite':
+        return
+    rowids = [_fts_rowid(card_id) for card_id in card_ids]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rowids), INDEX_CHUNK_SIZE):
+            chunk = rowids[start:start + INDEX_CHUNK_SIZE]
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+
+def rebuild_search_index():
+    """
+    Re-reads every card into the FTS5 table. Only needed on SQLite, e.g. if cards were written with raw SQL.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    from .models import Card
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    batch = []
+    for card in Card.objects.only('id', *FTS_COLUMNS).iterator(chunk_size=INDEX_CHUNK_SIZE):
+        batch.append(card)
+        if len(batch) >= INDEX_CHUNK_SIZE:
+            index_cards(batch)
+            batch = []
+    index_cards(batch)
+
+
+def search_terms(query: str) -> List[str]:
+    return _TERM.findall(query)
+
+
+def fts_query(terms: List[str]) -> str:
+    """
+    Quotes every term so that user input can't inject FTS5 syntax, and lets the last one match as a prefix
+    """
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+class CardSearchResults(object):
+    """
+    The ranked cards matching [query]. Sliced and counted lazily with one query each, so it can be handed to
+    django.core.paginator.Paginator.
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.terms = search_terms(query)
+        self._count = None
+
+    def count(self) -> int:
+        if self._count is None:
+            self._count = 0 if len(self.terms) == 0 else self._fetch_count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        stop = item.stop if item.stop is not None else self.count()
+        if len(self.terms) == 0 or stop <= start:
+            return []
+        from .models import Card
+        ids = self._fetch_ids(start, stop - start)
+        cards = Card.objects.in_bulk(ids)
+        return [cards[card_id] for card_id in ids if card_id in cards]
+
+    def _fetch_count(self) -> int:
+        sql, params = self._match_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM ({sql}) AS matches', params)
+            return cursor.fetchone()[0]
+
+    def _fetch_ids(self, offset: int, limit: int) -> List:
+        sql, params = self._match_sql(ranked=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} LIMIT %s OFFSET %s', params + [limit, offset])
+            return [uuid.UUID(str(row[0])) for row in cursor.fetchall()]
+
+    def _match_sql(self, ranked: bool = False) -> Tuple[str, list]:
+        vendor = connection.vendor
+        if vendor == 'sqlite':
+            weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+            sql = f'SELECT card_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+            if ranked:
+                sql += f' ORDER BY bm25({FTS_TABLE}, 0.0, {weights}), name'
+            return sql, [fts_query(self.terms)]
+        if vendor == 'postgresql':
+            tsquery = ' & '.join(f"{term}:*" if index == len(self.terms) - 1 else term
+                                 for index, term in enumerate(self.terms))
+            sql = f"SELECT id FROM cards_card WHERE {POSTGRES_DOCUMENT} @@ to_tsquery('english', %s)"
+            if ranked:
+                sql += f" ORDER BY ts_rank({POSTGRES_DOCUMENT}, to_tsquery('english', %s)) DESC, name"
+                return sql, [tsquery, tsquery]
+            return sql, [tsquery]
+        conditions = ' AND '.join(
+            '(name LIKE %s OR type_line LIKE %s OR oracle_text LIKE %s OR face_text LIKE %s)' for _ in self.terms)
+        params = [f'%{term}%' for term in self.terms for _ in range(4)]
+        sql = f'SELECT id FROM cards_card WHERE {conditions}'
+        if ranked:
+            sql += ' ORDER BY name'
+        return sql, params
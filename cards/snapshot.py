@@ -0,0 +1,117 @@
+"""
+Compact snapshots of the card catalog, Commander Jumpstart decks and dungeons, for bootstrapping a database without
+hitting Scryfall.
+
+A snapshot is MAGIC, a two byte format version and a zlib-compressed JSON document holding each table column by
+column: {"tables": [{"model": "cards.card", "columns": [...], "data": [[...], [...]]}, ...]}. Storing columns rather
+than rows keeps repeated values next to each other, which roughly halves the compressed size.
+"""
+import json
+import struct
+import zlib
+from typing import BinaryIO, Dict, List
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+MAGIC = b'MWFSNAP'
+FORMAT_VERSION = 1
+COMPRESSION_LEVEL = 6
+EXPORT_CHUNK_SIZE = 2000
+INSERT_BATCH_SIZE = 1000
+
+# In dependency order: every table only references tables before it
+MODELS = [
+    'cards.magicset',
+    'cards.card',
+    'cards.cardalias',
+    'cards.cardface',
+    'cards.printing',
+    'cmdrjump.commanderjumpstartdeck',
+    'cmdrjump.commanderjumpstartentry',
+    'cmdrjump.dualcoloreddeck',
+    'cmdrjump.dualcoloredentry',
+    'dungeons.dungeon',
+    'dungeons.dungeonroom',
+    'dungeons.dungeonpathway',
+]
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _columns(model) -> List:
+    return [field for field in model._meta.concrete_fields]
+
+
+def write_snapshot(fp: BinaryIO) -> Dict[str, int]:
+    """
+    Writes every row of MODELS to [fp]. Returns the number of rows written per model.
+    """
+    tables = []
+    counts = {}
+    for label in MODELS:
+        model = apps.get_model(label)
+        columns = [field.attname for field in _columns(model)]
+        rows = model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        data = [list(column) for column in zip(*rows)] or [[] for _ in columns]
+        tables.append({'model': label, 'columns': columns, 'data': data})
+        counts[label] = len(data[0]) if len(data) > 0 else 0
+    document = json.dumps({'tables': tables}, default=str, separators=(',', ':')).encode('utf-8')
+    fp.write(MAGIC)
+    fp.write(struct.pack('>H', FORMAT_VERSION))
+    fp.write(zlib.compress(document, COMPRESSION_LEVEL))
+    return counts
+
+
+def read_snapshot(fp: BinaryIO) -> List[dict]:
+    if fp.read(len(MAGIC)) != MAGIC:
+        raise SnapshotError('Not a catalog snapshot')
+    version, = struct.unpack('>H', fp.read(2))
+    if version != FORMAT_VERSION:
+        raise SnapshotError(f'Snapshot format {version} is not supported (expected {FORMAT_VERSION})')
+    try:
+        return json.loads(zlib.decompress(fp.read()))['tables']
+    except (zlib.error, ValueError, KeyError):
+        raise SnapshotError('Snapshot is corrupt')
+
+
+def load_snapshot(fp: BinaryIO) -> Dict[str, int]:
+    """
+    Bulk inserts the rows of a snapshot into empty tables, in one transaction. Returns the number of rows loaded per
+    model. Columns the snapshot lacks get their field defaults, so older snapshots load into newer schemas.
+    """
+    from .cache import bump_catalog_version
+    from .fuzzy import invalidate_name_index, reset_name_index
+    from .search import rebuild_search_index
+
+    tables = read_snapshot(fp)
+    counts = {}
+    with transaction.atomic():
+        models = [apps.get_model(table['model']) for table in tables]
+        not_empty = [model._meta.label for model in models if model.objects.exists()]
+        if len(not_empty) > 0:
+            raise SnapshotError(f'Snapshots can only be loaded into empty tables: {", ".join(not_empty)} have rows')
+        for model, table in zip(models, tables):
+            fields = {field.attname: field for field in _columns(model)}
+            unknown = [column for column in table['columns'] if column not in fields]
+            if len(unknown) > 0:
+                raise SnapshotError(f'{table["model"]} has no columns {", ".join(unknown)}')
+            converters = [fields[column].to_python for column in table['columns']]
+            objects = [
+                model(**{column: convert(value) for column, convert, value in zip(table['columns'], converters, row)})
+                for row in zip(*table['data'])
+            ]
+            model.objects.bulk_create(objects, batch_size=INSERT_BATCH_SIZE)
+            counts[table['model']] = len(objects)
+        # Rows were inserted with their ids, so sequences (on databases that have them) must catch up
+        with connection.cursor() as cursor:
+            for statement in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(statement)
+        rebuild_search_index()
+    reset_name_index()
+    invalidate_name_index()
+    bump_catalog_version()
+    return counts
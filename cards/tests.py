@@ -1,9 +1,37 @@
+import datetime
+import importlib
+import json
+import os
+import random
+import tempfile
+import time
 import uuid
+from io import BytesIO, StringIO
+from typing import List
+from unittest.mock import patch
 
 import responses
-from django.test import TestCase
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from parameterized import parameterized
 
-from cards.models import Card, MagicSet, Printing
+from cards import cache as card_cache, fuzzy, images
+from cards.colors import COLOR_BITS, color_mask, colors_from_mana_cost, colors_from_mask, mana_value_from_cost
+from cards.fuzzy import FuzzyNameIndex, reset_name_index
+from cards.models import Card, CardFace, MagicSet, Printing, Type
+from cards.names import name_aliases, normalize_name
+from cards.query import QuerySyntaxError, compile_query, search_cards
+from cards.search import CardSearchResults
+from cards.snapshot import SnapshotError, load_snapshot, write_snapshot
+from cmdrjump.models import CommanderJumpstartDeck, CommanderJumpstartEntry
+from dungeons.models import Dungeon, DungeonRoom
+from scryfall.models import ScryfallCard
+from scryfall.standin import StandinServer
 
 sample_scryfall_api_card_response = r"""{
   "object": "card",
@@ -139,6 +167,23 @@ class CardManagerScryfallTestCase(TestCase):
             card = Card.objects.get_or_fetch_printing_for_name("aust com")
         self.assertIsNotNone(card)
 
+    def test_concurrently_stored_printings_are_reused(self):
+        scryfall_card = ScryfallCard.from_dict(json.loads(sample_scryfall_api_card_response))
+        printing = Card.objects.create_printing_from_scryfall_card(scryfall_card)
+        filter_printings = Printing.objects.filter
+        lookups = []
+
+        def racing_filter(*args, **kwargs):
+            # The first lookup happens before another thread stores the printing
+            lookups.append(kwargs)
+            if len(lookups) == 1:
+                return Printing.objects.none()
+            return filter_printings(*args, **kwargs)
+
+        with patch.object(Printing.objects, 'filter', racing_filter):
+            self.assertEqual(printing, Card.objects.create_printing_from_scryfall_card(scryfall_card))
+        self.assertEqual(1, Printing.objects.count())
+
     def test_fetching_when_card_exists(self):
         url = 'https://api.scryfall.com/cards/named?fuzzy=austere+command'
         card = card_named("Austere Command")
@@ -158,6 +203,163 @@ class CardManagerScryfallTestCase(TestCase):
         self.assertEqual(card.id, printing.card_id)
 
 
+class NameNormalizationTestCase(TestCase):
+
+    def test_normalize_name(self):
+        self.assertEqual('ojutais command', normalize_name("Ojutai's Command"))
+        self.assertEqual('aether vial', normalize_name('Æther Vial'))
+        self.assertEqual('lim dul the necromancer', normalize_name('Lim-Dûl the Necromancer'))
+        self.assertEqual('fire ice', normalize_name('Fire // Ice'))
+        self.assertEqual('fire ice', normalize_name(' fire/ice '))
+
+    def test_aliases(self):
+        self.assertEqual({'fire ice', 'ice'}, name_aliases('Fire // Ice'))
+        self.assertEqual(set(), name_aliases('Austere Command'))
+
+
+class CardNameLookupTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.card = Card.objects.create(id=uuid.uuid4(), name='Fire // Ice', type_line='Instant // Instant')
+        Printing.objects.create(card=self.card, magic_set=set_code('mh2'), image_url='')
+
+    def test_variants_find_the_card(self):
+        for name in ('Fire // Ice', 'Fire/Ice', 'fire', 'ICE', 'fire / ice'):
+            self.assertEqual(self.card, Card.objects.get_by_name(name))
+
+    def test_unknown_name_raises(self):
+        with self.assertRaises(Card.DoesNotExist):
+            Card.objects.get_by_name('Fire and Ice')
+
+    def test_renaming_updates_aliases(self):
+        self.card.name = 'Fire'
+        self.card.save()
+        with self.assertRaises(Card.DoesNotExist):
+            Card.objects.get_by_name('ice')
+        self.assertEqual(0, self.card.aliases.count())
+
+    def test_known_cards_never_hit_scryfall(self):
+        with responses.RequestsMock():
+            printing = Card.objects.get_or_fetch_printing_for_name('Fire/Ice')
+            printings = Card.objects.get_or_fetch_printings_for_names(['fire', 'Ice'])
+        self.assertEqual(self.card, printing.card)
+        self.assertEqual(self.card, printings['Ice'].card)
+
+
+class FuzzyNameIndexTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.index = FuzzyNameIndex()
+        self.index.add_all([(1, 'Austere Command'), (2, 'Lightning Bolt'), (3, 'Lightning Helix'), (4, 'Fire // Ice')])
+
+    def test_exact_names_score_one(self):
+        match = self.index.match("AUSTERE COMMAND")
+        self.assertEqual((1, 1.0), (match.card_id, match.score))
+
+    def test_misspellings_find_the_closest_name(self):
+        self.assertEqual(1, self.index.match('Austere Comand').card_id)
+        self.assertEqual(2, self.index.match('lightening bolt').card_id)
+        self.assertEqual(3, self.index.match('Lightning Helx').card_id)
+        self.assertLess(self.index.match('Austere Comand').score, 1.0)
+
+    def test_unrelated_names_do_not_match(self):
+        self.assertIsNone(self.index.match('Valki, God of Lies'))
+        self.assertIsNone(self.index.match('Lightning Blast'))
+        self.assertIsNone(self.index.match('Lightning'))
+        self.assertEqual(2, self.index.match('Lightning', threshold=0.5).card_id)
+
+    def test_queries_are_fast_over_a_full_catalog(self):
+        rng = random.Random(7)
+        words = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+                 for _ in range(3000)]
+        names = [' '.join(rng.sample(words, rng.randint(1, 4))) for _ in range(30000)]
+        index = FuzzyNameIndex()
+        index.add_all(enumerate(names))
+        queries = [name[:-1] + 'x' for name in rng.sample(names, 200)]
+        started = time.perf_counter()
+        for query in queries:
+            index.match(query)
+        self.assertLess((time.perf_counter() - started) / len(queries), 0.001)
+
+
+class CardFuzzyLookupTestCase(TestCase):
+
+    def setUp(self) -> None:
+        reset_name_index()
+        self.card = card_named('Austere Command')
+        self.card.type_line = 'Sorcery'
+        self.card.save()
+        self.printing = Printing.objects.create(card=self.card, magic_set=set_code('test'), image_url='')
+
+    def tearDown(self) -> None:
+        reset_name_index()
+
+    def test_get_by_name_fuzzy(self):
+        card, score = Card.objects.get_by_name_fuzzy('austere comand')
+        self.assertEqual(self.card, card)
+        self.assertGreater(score, 0.85)
+        with self.assertRaises(Card.DoesNotExist):
+            Card.objects.get_by_name_fuzzy('Lightning Bolt')
+
+    def test_misspelled_known_cards_are_matched_locally(self):
+        with responses.RequestsMock():
+            self.assertEqual(self.printing, Card.objects.get_or_fetch_printing_for_name('Austere Comand'))
+
+    def test_batches_do_not_mistake_real_cards_for_similar_stored_ones(self):
+        commando = json.loads(sample_scryfall_api_card_response)
+        commando.update({'id': str(uuid.uuid4()), 'oracle_id': str(uuid.uuid4()), 'name': 'Austere Commando'})
+        with responses.RequestsMock() as rm:
+            rm.add('POST', 'https://api.scryfall.com/cards/collection',
+                   json.dumps({'object': 'list', 'not_found': [], 'data': [commando]}))
+            printing = Card.objects.get_or_fetch_printings_for_names(['Austere Commando'])['Austere Commando']
+        self.assertEqual('Austere Commando', printing.card.name)
+        self.assertNotEqual(self.card, printing.card)
+
+    def test_index_is_rebuilt_after_renames_elsewhere(self):
+        Card.objects.get_by_name_fuzzy('austere comand')
+        # Renamed by another process, which moved the names version on
+        Card.objects.filter(id=self.card.id).update(normalized_name='wrath of god')
+        fuzzy.names_version.bump()
+        with self.assertRaises(Card.DoesNotExist):
+            Card.objects.get_by_name_fuzzy('austere comand')
+        self.assertEqual(self.card, Card.objects.get_by_name_fuzzy('wrath of gods')[0])
+
+    def test_other_writes_keep_the_index(self):
+        index = fuzzy.get_name_index()
+        self.card.oracle_text = 'Choose two'
+        self.card.save()
+        card_cache.bump_catalog_version()
+        self.assertIs(index, fuzzy.get_name_index())
+
+    def test_cards_are_indexed_when_saved(self):
+        Card.objects.get_by_name_fuzzy('austere comand')
+        card = card_named('Lightning Bolt')
+        self.assertEqual(card, Card.objects.get_by_name_fuzzy('lightning blot')[0])
+
+
+class CardManagerBatchTestCase(TestCase):
+
+    def test_local_names_need_no_network(self):
+        card = card_named('Austere Command')
+        card.type_line = 'Sorcery'
+        card.save()
+        printing = Printing.objects.create(card=card, magic_set=set_code('test'), image_url='')
+        with responses.RequestsMock():
+            result = Card.objects.get_or_fetch_printings_for_names(['austere command'])
+        self.assertEqual({'austere command': printing}, result)
+
+    def test_missing_names_use_collection_then_fuzzy(self):
+        collection = '{"object": "list", "not_found": [{"name": "Valki"}], "data": [%s]}' \
+                     % sample_scryfall_api_card_response
+        with responses.RequestsMock() as rm:
+            rm.add('POST', 'https://api.scryfall.com/cards/collection', collection)
+            rm.add('GET', 'https://api.scryfall.com/cards/named?fuzzy=valki', json.dumps(sample_dfc))
+            result = Card.objects.get_or_fetch_printings_for_names(['Austere Command', 'Valki'])
+        self.assertEqual('Austere Command', result['Austere Command'].card.name)
+        self.assertEqual(sample_dfc['name'], result['Valki'].card.name)
+        self.assertEqual(2, Printing.objects.count())
+
+
 class CardManagerTestCase(TestCase):
 
     def test_getting_by_name_with_existing_printing_returns_that(self):
@@ -178,3 +380,716 @@ class CardManagerTestCase(TestCase):
         result = Card.objects.get_or_create_printing_for_name('Test')
         self.assertIsNotNone(result)
         self.assertEqual('Test', result.card.name)
+
+
+sample_dfc = {
+    'object': 'card',
+    'id': '0b4b2ffc-3d3f-4d06-8d12-7a6ed2a4f3b7',
+    'lang': 'en',
+    'oracle_id': '4f2fb2fb-6f74-4fd7-9f28-c12b2b3bb6d5',
+    'uri': 'https://api.scryfall.com/cards/0b4b2ffc-3d3f-4d06-8d12-7a6ed2a4f3b7',
+    'name': 'Valki, God of Lies // Tibalt, Cosmic Impostor',
+    'scryfall_uri': 'https://scryfall.com/card/khm/114/valki-god-of-lies-tibalt-cosmic-impostor',
+    'layout': 'modal_dfc',
+    'type_line': 'Legendary Creature — God // Legendary Planeswalker — Tibalt',
+    'set': 'khm',
+    'set_name': 'Kaldheim',
+    'set_uri': 'https://api.scryfall.com/sets/43057fad-b1c1-437f-bc48-0045bce6d8c9',
+    'collector_number': '114',
+    'rarity': 'mythic',
+    'card_faces': [
+        {
+            'name': 'Valki, God of Lies',
+            'type_line': 'Legendary Creature — God',
+            'mana_cost': '{1}{B}',
+            'image_uris': {
+                'small': 'https://example.com/small/valki.jpg',
+                'normal': 'https://example.com/normal/valki.jpg',
+                'large': 'https://example.com/large/valki.jpg',
+                'png': 'https://example.com/png/valki.png',
+                'art_crop': 'https://example.com/art_crop/valki.jpg',
+                'border_crop': 'https://example.com/border_crop/valki.jpg',
+            },
+        },
+        {
+            'name': 'Tibalt, Cosmic Impostor',
+            'type_line': 'Legendary Planeswalker — Tibalt',
+            'mana_cost': '{5}{B}{R}',
+        },
+    ],
+}
+
+
+class PrintingTestCase(TestCase):
+
+    def test_reprints_are_printings_of_the_same_card(self):
+        original = Card.objects.create_printing_from_scryfall_card(ScryfallCard.from_dict(sample_dfc))
+        reprint = ScryfallCard.from_dict(dict(sample_dfc, id=str(uuid.uuid4()), collector_number='300'))
+
+        printing = Card.objects.create_printing_from_scryfall_card(reprint)
+
+        self.assertNotEqual(original, printing)
+        self.assertEqual(original.card, printing.card)
+        self.assertEqual(('300', 'mythic'), (printing.collector_number, printing.rarity))
+        self.assertEqual(printing, Card.objects.create_printing_from_scryfall_card(reprint))
+        self.assertEqual(1, Card.objects.count())
+
+
+class DerivedAttributesTestCase(TestCase):
+
+    def test_color_helpers(self):
+        self.assertEqual({'W', 'U', 'B'}, colors_from_mana_cost('{2}{W/U}{B/P}'))
+        self.assertEqual(COLOR_BITS['W'] | COLOR_BITS['G'], color_mask(['G', 'W', 'C']))
+        self.assertEqual({'U', 'R'}, colors_from_mask(color_mask('UR')))
+        self.assertEqual(5, mana_value_from_cost('{X}{2/W}{1}{G}{G}'))
+
+    def test_scryfall_values_are_used(self):
+        data = dict(json.loads(sample_scryfall_api_card_response), colors=['W'], color_identity=['W'], cmc=6.0)
+        card = Card.objects.populate_from_scryfall_card(ScryfallCard.from_dict(data))
+        self.assertEqual((COLOR_BITS['W'], COLOR_BITS['W'], 6.0, Type.SORCERY),
+                         (card.colors, card.color_identity, card.mana_value, card.category))
+
+    def test_missing_values_are_derived_from_text(self):
+        card = Card.objects.populate_from_scryfall_card(ScryfallCard.from_dict(sample_dfc))
+        self.assertEqual({'B', 'R'}, colors_from_mask(card.colors))
+        self.assertEqual(2, card.mana_value)
+        self.assertEqual(Type.CREATURE, card.category)
+
+        split = Card(layout='split', mana_cost='{R} // {2}{U}', type_line='Instant // Instant', color_indicator='',
+                     oracle_text='Add {G}.')
+        split.derive_attributes()
+        self.assertEqual(4, split.mana_value)
+        self.assertEqual({'R', 'U', 'G'}, colors_from_mask(split.color_identity))
+
+    def test_backfill_command(self):
+        card = Card.objects.create(id=uuid.uuid4(), name='Lightning Helix', mana_cost='{R}{W}', type_line='Instant')
+        untouched = Card.objects.create(id=uuid.uuid4(), name='Island', type_line='Basic Land — Island',
+                                        category=Type.LAND)
+        output = StringIO()
+        call_command('derivecardattributes', stdout=output)
+
+        card.refresh_from_db()
+        self.assertEqual((COLOR_BITS['R'] | COLOR_BITS['W'], 2, Type.INSTANT),
+                         (card.colors, card.mana_value, card.category))
+        self.assertEqual(1, Card.objects.filter(colors=color_mask('RW')).count())
+        self.assertIn('1 cards updated', output.getvalue())
+        self.assertEqual(Type.LAND, Card.objects.get(id=untouched.id).category)
+
+    def test_migration_backfills_stored_cards(self):
+        card = Card.objects.create(id=uuid.uuid4(), name='Lightning Helix', mana_cost='{R}{W}', type_line='Instant')
+        Card.objects.filter(id=card.id).update(colors=0, color_identity=0, mana_value=0, category=Type.UNKNOWN)
+
+        migration = importlib.import_module('cards.migrations.0018_backfill_derived_attributes')
+        migration.backfill(apps, None)
+
+        card.refresh_from_db()
+        self.assertEqual((color_mask('RW'), color_mask('RW'), 2, Type.INSTANT),
+                         (card.colors, card.color_identity, card.mana_value, card.category))
+
+
+class CardSearchTestCase(TestCase):
+
+    @staticmethod
+    def create(name, type_line='Instant', oracle_text=''):
+        return Card.objects.create(id=uuid.uuid4(), name=name, type_line=type_line, oracle_text=oracle_text)
+
+    def names(self, query):
+        return [card.name for card in CardSearchResults(query)[:]]
+
+    def test_matches_oracle_text_and_type_line(self):
+        self.create('Shock', oracle_text='Shock deals 2 damage to any target.')
+        self.create('Grizzly Bears', type_line='Creature — Bear')
+        self.assertEqual(['Shock'], self.names('damage any target'))
+        self.assertEqual(['Grizzly Bears'], self.names('bear'))
+        self.assertEqual([], self.names(''))
+
+    def test_last_term_matches_as_prefix(self):
+        self.create('Lightning Bolt', oracle_text='Lightning Bolt deals 3 damage to any target.')
+        self.assertEqual(['Lightning Bolt'], self.names('lightning bo'))
+        self.assertEqual(['Lightning Bolt'], self.names('"bolt" (deals^'))
+
+    def test_name_match_ranks_first(self):
+        self.create('Aaa', oracle_text='Destroy target Wrath creature. Wrath matters.')
+        self.create('Wrath of God', type_line='Sorcery', oracle_text='Destroy all creatures.')
+        self.assertEqual(['Wrath of God', 'Aaa'], self.names('wrath'))
+
+    def test_face_text_is_searched(self):
+        Card.objects.from_scryfall_card(ScryfallCard.from_dict(sample_dfc))
+        self.assertEqual([sample_dfc['name']], self.names('tibalt'))
+
+    def test_index_follows_renames_and_deletes(self):
+        card = self.create('Opt', oracle_text='Scry 1. Draw a card.')
+        card.name = 'Consider'
+        card.save()
+        self.assertEqual([], self.names('opt'))
+        self.assertEqual(['Consider'], self.names('consider'))
+        card.delete()
+        self.assertEqual([], self.names('scry'))
+
+    def test_search_view_paginates(self):
+        for number in range(25):
+            self.create(f'Goblin {number:02}', type_line='Creature — Goblin')
+        response = self.client.get(reverse('card-search'), {'q': 'goblin', 'page': 2})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(25, response.context['cards'].paginator.count)
+        self.assertEqual(5, len(response.context['cards']))
+        self.assertContains(response, 'Goblin 24')
+
+
+class CardQueryTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.sets = [MagicSet.objects.create(id=uuid.uuid4(), code=code, name=code.upper(),
+                                             released_at=datetime.date(year, 1, 1))
+                     for code, year in (('cmr', 2020), ('khm', 2021))]
+        self.add('Goblin Guide', '{R}', 'Creature — Goblin Scout', 'Haste', 'cmr', 'rare')
+        self.add('Raging Goblin', '{R}', 'Creature — Goblin Berserker', 'Haste', 'khm', 'common')
+        self.add('Hellrider', '{2}{R}{R}', 'Creature — Devil', 'Haste', 'cmr', 'rare')
+        self.add('Lightning Helix', '{R}{W}', 'Instant', 'Lightning Helix deals 3 damage to any target.', 'khm',
+                 'uncommon')
+        self.add('Mind Stone', '{2}', 'Artifact', '{T}: Add {C}.', 'cmr', 'common')
+
+    def add(self, name, mana_cost, type_line, oracle_text, set_code, rarity):
+        card = Card(id=uuid.uuid4(), name=name, mana_cost=mana_cost, type_line=type_line, oracle_text=oracle_text,
+                    color_indicator='', layout='normal')
+        card.derive_attributes()
+        card.save()
+        magic_set = next(magic_set for magic_set in self.sets if magic_set.code == set_code)
+        return Printing.objects.create(card=card, magic_set=magic_set, image_url='https://example.com/card.jpg',
+                                       rarity=rarity, released_at=magic_set.released_at)
+
+    def names(self, query):
+        return sorted(search_cards(query).values_list('name', flat=True))
+
+    @parameterized.expand([
+        ('t:creature c:r mv<=2 o:"haste"', ['Goblin Guide', 'Raging Goblin']),
+        ('goblin -s:khm', ['Goblin Guide']),
+        ('c=r', ['Goblin Guide', 'Hellrider', 'Raging Goblin']),
+        ('c:rw', ['Lightning Helix']),
+        ('id<=r', ['Goblin Guide', 'Hellrider', 'Mind Stone', 'Raging Goblin']),
+        ('c:c', ['Mind Stone']),
+        ('c:m or mv>3', ['Hellrider', 'Lightning Helix']),
+        ('(s:cmr or r:uncommon) -t:creature', ['Lightning Helix', 'Mind Stone']),
+        ('r>=rare year<2021', ['Goblin Guide', 'Hellrider']),
+        ('m:rr', ['Hellrider']),
+        ('!"lightning helix"', ['Lightning Helix']),
+        ('mv!=1 t:creature', ['Hellrider']),
+        ('', ['Goblin Guide', 'Hellrider', 'Lightning Helix', 'Mind Stone', 'Raging Goblin']),
+    ])
+    def test_queries(self, query, expected):
+        self.assertEqual(expected, self.names(query))
+
+    @parameterized.expand(['pow>2', 'c:purple', 'mv>two', 't<creature', '(t:creature', 't:creature)', 't:creature or'])
+    def test_invalid_queries(self, query):
+        with self.assertRaises(QuerySyntaxError):
+            compile_query(query)
+
+    def test_compiled_queries_are_cached(self):
+        compile_query.cache_clear()
+        compile_query('t:creature c:r')
+        compile_query('t:creature c:r')
+        self.assertEqual(1, compile_query.cache_info().hits)
+
+    def test_query_is_one_statement(self):
+        with CaptureQueriesContext(connection) as context:
+            list(search_cards('t:creature s:cmr r:rare'))
+        self.assertEqual(1, len(context.captured_queries))
+
+
+class CardImageProxyTestCase(TestCase):
+    image_url = 'https://c1.scryfall.com/file/scryfall-cards/normal/front/c/e/ce4ec853.jpg?1608908685'
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(CARD_IMAGE_CACHE_DIR=self.directory.name, CARD_IMAGE_PROXY=True)
+        self.settings.enable()
+        magic_set = MagicSet.objects.create(id=uuid.uuid4(), code='cmr', name='Commander Legends')
+        card = Card.objects.create(id=uuid.uuid4(), name='Austere Command')
+        self.printing = Printing.objects.create(card=card, magic_set=magic_set, image_url=self.image_url)
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def test_variant_url(self):
+        self.assertEqual(self.image_url.replace('/normal/', '/small/'), images.variant_url(self.image_url, 'small'))
+        self.assertEqual('https://example.com/a.png', images.variant_url('https://example.com/a.png', 'small'))
+
+    def test_image_is_fetched_once_and_revalidated(self):
+        url = self.printing.get_image_url('small')
+        with responses.RequestsMock() as rm:
+            rm.add(responses.GET, images.variant_url(self.image_url, 'small'), body=b'jpeg', content_type='image/jpeg')
+            first = self.client.get(url)
+            self.assertEqual(1, len(rm.calls))
+        self.assertEqual(b'jpeg', b''.join(first.streaming_content))
+        self.assertIn('max-age', first['Cache-Control'])
+
+        with responses.RequestsMock():
+            second = self.client.get(url)
+            self.assertEqual(b'jpeg', b''.join(second.streaming_content))
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(304, not_modified.status_code)
+
+    def test_falls_back_to_scryfall(self):
+        with responses.RequestsMock() as rm:
+            rm.add(responses.GET, self.image_url, status=503)
+            response = self.client.get(self.printing.get_image_url())
+        self.assertRedirects(response, self.image_url, fetch_redirect_response=False)
+        self.assertEqual(404, self.client.get(self.printing.get_image_url('huge')).status_code)
+
+    def test_warm_images(self):
+        with responses.RequestsMock() as rm:
+            rm.add(responses.GET, images.variant_url(self.image_url, 'small'), body=b'small')
+            rm.add(responses.GET, self.image_url, body=b'normal')
+            self.assertEqual(0, images.warm_images([self.printing]))
+            self.assertEqual(0, images.warm_images([self.printing]))
+            self.assertEqual(2, len(rm.calls))
+
+    @override_settings(CARD_IMAGE_PROXY=False)
+    def test_proxy_can_be_turned_off(self):
+        self.assertEqual(self.image_url, self.printing.get_image_url())
+
+
+@override_settings(DEBUG=True)
+class SetViewsTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.magic_set = MagicSet.objects.create(id=uuid.uuid4(), code='tst', name='Test Set')
+        for number in range(120):
+            card = Card.objects.create(id=uuid.uuid4(), name=f'Card {number:03}')
+            Printing.objects.create(card=card, magic_set=self.magic_set, image_url='https://example.com/card.jpg',
+                                    collector_number=str(number))
+
+    def test_detail_is_paginated(self):
+        response = self.client.get(self.magic_set.get_absolute_url(), {'page': 2})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(20, len(response.context['printings']))
+        self.assertContains(response, 'Card 119')
+        self.assertNotContains(response, 'Card 000')
+
+    def test_text_export_streams(self):
+        response = self.client.get(reverse('set-export', args=[self.magic_set.id, 'txt']))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(120, len(lines))
+        self.assertEqual('Card 000', lines[0])
+
+    def test_json_export(self):
+        response = self.client.get(reverse('set-export', args=[self.magic_set.id, 'json']))
+        printings = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(120, len(printings))
+        self.assertEqual({'name': 'Card 005', 'collector_number': '5', 'rarity': '', 'scryfall_id': None,
+                          'image_url': 'https://example.com/card.jpg'}, printings[5])
+        self.assertEqual(404, self.client.get(reverse('set-export', args=[self.magic_set.id, 'xml'])).status_code)
+
+    @override_settings(DEBUG=False)
+    def test_set_pages_are_debug_only(self):
+        self.assertEqual(404, self.client.get(self.magic_set.get_absolute_url()).status_code)
+        self.assertEqual(404, self.client.get(reverse('set-export', args=[self.magic_set.id, 'txt'])).status_code)
+
+
+class CardCacheTestCase(TestCase):
+
+    def setUp(self) -> None:
+        card_cache.bump_catalog_version()
+        magic_set = MagicSet.objects.create(id=uuid.uuid4(), code='cmr', name='Commander Legends')
+        self.card = Card.objects.create(id=uuid.uuid4(), name='Austere Command')
+        self.printing = Printing.objects.create(card=self.card, magic_set=magic_set, image_url='https://example.com/')
+
+    @staticmethod
+    def card_queries(context: CaptureQueriesContext) -> List[str]:
+        # Leaves out the cache table and the savepoints around its writes
+        return [query['sql'] for query in context.captured_queries
+                if 'django_cache' not in query['sql'] and 'SAVEPOINT' not in query['sql']]
+
+    def test_reads_through_both_tiers(self):
+        with CaptureQueriesContext(connection) as context:
+            printing = card_cache.get_printings([self.printing.id])[self.printing.id]
+            self.assertEqual('Austere Command', printing.card.name)
+            self.assertEqual('cmr', printing.magic_set.code)
+        self.assertEqual(1, len(self.card_queries(context)))
+        with self.assertNumQueries(0):
+            card_cache.get_printings([self.printing.id])
+        with CaptureQueriesContext(connection) as context:
+            card_cache.local_cache.clear()
+            self.assertEqual(printing, card_cache.get_printings([self.printing.id])[self.printing.id])
+        self.assertEqual([], self.card_queries(context))
+
+    def test_version_does_not_expire(self):
+        card_cache.bump_catalog_version()
+        version = card_cache.catalog_version()
+        later = timezone.now() + datetime.timedelta(days=2)
+        with patch.object(timezone, 'now', return_value=later), patch.object(card_cache, 'VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(version, card_cache.catalog_version())
+
+    def test_name_lookups(self):
+        self.assertEqual(self.card, Card.objects.get_cached_by_name('austere command'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.card, Card.objects.get_cached_by_name('Austere Command'))
+        with self.assertRaises(Card.DoesNotExist):
+            Card.objects.get_cached_by_name('Wrath of God')
+        with self.assertNumQueries(0):
+            self.assertIsNone(card_cache.get_card_by_name('Wrath of God'))
+
+    def test_version_is_rechecked(self):
+        version = card_cache.catalog_version()
+        # Another process bumping the version
+        card_cache.cache.set(card_cache.VERSION_KEY, version + 1, timeout=None)
+        self.assertEqual(version, card_cache.catalog_version())
+        with patch.object(card_cache, 'VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(version + 1, card_cache.catalog_version())
+
+    def test_local_tier_is_bounded(self):
+        local = card_cache.LocalCache(max_size=2)
+        local.get_many(1, [])
+        local.set_many(1, {'a': 1, 'b': 2})
+        local.get_many(1, ['a'])
+        local.set_many(1, {'c': 3})
+        self.assertEqual({'a': 1, 'c': 3}, local.get_many(1, ['a', 'b', 'c']))
+        self.assertEqual({}, local.get_many(2, ['a']))
+
+
+class CardCacheInvalidationTestCase(TransactionTestCase):
+    """
+    Writes invalidate the cache when their transaction commits, which never happens inside a TestCase
+    """
+
+    def setUp(self) -> None:
+        card_cache.bump_catalog_version()
+        self.card = Card.objects.create(id=uuid.uuid4(), name='Austere Command')
+
+    def test_writes_invalidate(self):
+        self.assertEqual('Austere Command', Card.objects.in_bulk_cached([self.card.id])[self.card.id].name)
+        self.card.name = 'Austere Decree'
+        self.card.save()
+        self.assertEqual('Austere Decree', Card.objects.in_bulk_cached([self.card.id])[self.card.id].name)
+
+    def test_renames_and_deletes_rebuild_the_name_index(self):
+        version = fuzzy.names_version.current()
+        Card.objects.create(id=uuid.uuid4(), name='Lightning Bolt')
+        self.assertEqual(version, fuzzy.names_version.current())
+        self.card.name = 'Austere Decree'
+        self.card.save()
+        self.assertEqual(version + 1, fuzzy.names_version.current())
+        self.card.delete()
+        self.assertEqual(version + 2, fuzzy.names_version.current())
+
+    def test_transactions_invalidate_once_they_commit(self):
+        version = card_cache.catalog_version()
+        with patch.object(card_cache, 'bump_catalog_version', wraps=card_cache.bump_catalog_version) as bump:
+            with transaction.atomic():
+                for number in range(3):
+                    Card.objects.create(id=uuid.uuid4(), name=f'Card {number}')
+                self.assertEqual(0, bump.call_count)
+            self.assertEqual(1, bump.call_count)
+            with transaction.atomic():
+                Card.objects.create(id=uuid.uuid4(), name='Rolled Back')
+                transaction.set_rollback(True)
+            self.assertEqual(1, bump.call_count)
+        self.assertEqual(version + 1, card_cache.catalog_version())
+
+    def test_batched_writes_invalidate_once(self):
+        version = card_cache.catalog_version()
+        with patch.object(card_cache, 'bump_catalog_version', wraps=card_cache.bump_catalog_version) as bump:
+            with card_cache.batched_invalidation():
+                for number in range(3):
+                    Card.objects.create(id=uuid.uuid4(), name=f'Card {number}')
+                self.assertEqual(0, bump.call_count)
+            self.assertEqual(1, bump.call_count)
+        self.assertEqual(version + 1, card_cache.catalog_version())
+
+
+class CatalogSnapshotTestCase(TestCase):
+
+    def setUp(self) -> None:
+        printing = Card.objects.create_printing_from_scryfall_card(ScryfallCard.from_dict(sample_dfc))
+        self.card = printing.card
+        deck = CommanderJumpstartDeck.objects.create(color='B', commander=self.card)
+        CommanderJumpstartEntry.objects.create(deck=deck, card=self.card, category=Type.CREATURE, count=2)
+        dungeon = Dungeon.objects.create(name='Lost Mine', is_official=True)
+        DungeonRoom.objects.create(dungeon=dungeon, name='Cave Entrance', is_entrance=True, room_text='Scry 1.')
+
+    @staticmethod
+    def clear():
+        Dungeon.objects.all().delete()
+        MagicSet.objects.all().delete()
+        Card.objects.all().delete()
+
+    def test_round_trip(self):
+        snapshot = BytesIO()
+        counts = write_snapshot(snapshot)
+        self.assertEqual(1, counts['cards.card'])
+        self.assertEqual(2, counts['cards.cardface'])
+        self.clear()
+
+        snapshot.seek(0)
+        self.assertEqual(counts, load_snapshot(snapshot))
+
+        card = Card.objects.get(id=self.card.id)
+        self.assertEqual((self.card.oracle_id, self.card.colors, self.card.face_text),
+                         (card.oracle_id, card.colors, card.face_text))
+        self.assertEqual(['Valki, God of Lies', 'Tibalt, Cosmic Impostor'],
+                         list(card.faces.order_by('index').values_list('name', flat=True)))
+        printing = card.printings.get()
+        self.assertEqual(('114', 'mythic'), (printing.collector_number, printing.rarity))
+        self.assertEqual(2, CommanderJumpstartEntry.objects.get(card=card).count)
+        self.assertEqual('Scry 1.', Dungeon.objects.get(slug='lost-mine').rooms.get().room_text)
+        self.assertEqual([card], list(CardSearchResults('tibalt')[:]))
+        self.assertEqual(card, Card.objects.get_by_name('tibalt cosmic impostor'))
+
+    def test_command_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.snapshot')
+            call_command('dumpcatalog', path, stdout=StringIO())
+            self.clear()
+            output = StringIO()
+            call_command('loadcatalog', path, stdout=output)
+        self.assertIn('cards.printing: 1 rows', output.getvalue())
+        self.assertEqual(1, Printing.objects.count())
+
+    def test_rejects_bad_input(self):
+        snapshot = BytesIO()
+        write_snapshot(snapshot)
+        snapshot.seek(0)
+        with self.assertRaises(SnapshotError):
+            load_snapshot(snapshot)
+        with self.assertRaises(SnapshotError):
+            load_snapshot(BytesIO(b'{"tables": []}'))
+
+
+class CardFaceSyncTestCase(TestCase):
+
+    def face_queries(self, scryfall_card, card=None):
+        with CaptureQueriesContext(connection) as context:
+            card = Card.objects.from_scryfall_card(scryfall_card, card)
+        return card, [query['sql'] for query in context.captured_queries if 'cards_cardface' in query['sql']]
+
+    def test_unchanged_faces_are_read_once(self):
+        card, queries = self.face_queries(ScryfallCard.from_dict(sample_dfc))
+        self.assertEqual(2, len(queries))
+        face_ids = set(card.faces.values_list('id', flat=True))
+
+        card, queries = self.face_queries(ScryfallCard.from_dict(sample_dfc), Card.objects.get(id=card.id))
+        self.assertEqual(1, len(queries))
+        self.assertEqual(face_ids, set(card.faces.values_list('id', flat=True)))
+
+    def test_unchanged_cards_cost_two_queries(self):
+        card = Card.objects.from_scryfall_card(ScryfallCard.from_dict(sample_dfc))
+        card = Card.objects.get(id=card.id)
+        with patch('cards.models.invalidate_catalog') as invalidate, patch('cards.models.index_cards') as index:
+            # The card's update and the face query, without reindexing or invalidating anything
+            with self.assertNumQueries(2):
+                Card.objects.from_scryfall_card(ScryfallCard.from_dict(sample_dfc), card)
+            invalidate.assert_not_called()
+            index.assert_not_called()
+
+            changed = dict(sample_dfc, oracle_text='Changed')
+            Card.objects.from_scryfall_card(ScryfallCard.from_dict(changed), card)
+            invalidate.assert_called_once()
+            index.assert_called_once()
+
+    def test_changed_faces_are_updated_in_place(self):
+        card = Card.objects.from_scryfall_card(ScryfallCard.from_dict(sample_dfc))
+        back = card.faces.get(index=1)
+        changed = json.loads(json.dumps(sample_dfc))
+        changed['card_faces'][1]['mana_cost'] = '{4}{B}{R}'
+
+        card, queries = self.face_queries(ScryfallCard.from_dict(changed), Card.objects.get(id=card.id))
+
+        self.assertEqual(2, len(queries))
+        back.refresh_from_db()
+        self.assertEqual('{4}{B}{R}', back.mana_cost)
+        self.assertEqual('Legendary Planeswalker — Tibalt', back.type_line)
+
+    def test_unsaved_cards_with_a_stored_id_keep_their_faces(self):
+        card = Card.objects.from_scryfall_card(ScryfallCard.from_dict(sample_dfc))
+        face_ids = set(card.faces.values_list('id', flat=True))
+
+        Card.objects.from_scryfall_card(ScryfallCard.from_dict(sample_dfc), Card(id=card.id))
+
+        self.assertEqual(face_ids, set(card.faces.values_list('id', flat=True)))
+
+    def test_removed_faces_are_deleted(self):
+        card = Card.objects.from_scryfall_card(ScryfallCard.from_dict(sample_dfc))
+        card.faces.create(index=2, name='Extra')
+
+        Card.objects.from_scryfall_card(ScryfallCard.from_dict(sample_dfc), Card.objects.get(id=card.id))
+
+        self.assertEqual([0, 1], list(card.faces.order_by('index').values_list('index', flat=True)))
+
+
+class IngestBulkCommandTestCase(TestCase):
+
+    def ingest(self, objects, batch_size=1):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(objects, f)
+            call_command('ingestbulk', path, batch_size=batch_size, stdout=StringIO())
+        finally:
+            os.remove(path)
+
+    def test_ingest_creates_cards_sets_faces_and_printings(self):
+        reversible = {'object': 'card', 'id': str(uuid.uuid4()), 'layout': 'reversible_card'}
+        self.ingest([json.loads(sample_scryfall_api_card_response), sample_dfc, reversible])
+
+        self.assertEqual(2, Card.objects.count())
+        self.assertEqual({'cmr', 'khm'}, set(MagicSet.objects.values_list('code', flat=True)))
+        valki = Card.objects.get(oracle_id=sample_dfc['oracle_id'])
+        self.assertEqual('{1}{B} // {5}{B}{R}', valki.mana_cost)
+        self.assertEqual(['Valki, God of Lies', 'Tibalt, Cosmic Impostor'],
+                         list(valki.faces.order_by('index').values_list('name', flat=True)))
+        self.assertEqual(valki, Card.objects.get_by_name('Tibalt, Cosmic Impostor'))
+        printing = valki.printings.get()
+        self.assertEqual('khm', printing.magic_set.code)
+        self.assertEqual(uuid.UUID(sample_dfc['id']), printing.scryfall_id)
+        self.assertEqual('https://example.com/normal/valki.jpg', printing.image_url)
+
+    def test_reingesting_updates_in_place(self):
+        self.ingest([sample_dfc])
+        changed = dict(sample_dfc, name='Valki // Tibalt')
+        self.ingest([changed], batch_size=10)
+
+        self.assertEqual(1, Card.objects.count())
+        self.assertEqual('Valki // Tibalt', Card.objects.get().name)
+        self.assertEqual(2, CardFace.objects.count())
+        self.assertEqual(1, Printing.objects.count())
+
+    def test_reprints_share_one_card(self):
+        reprint = dict(sample_dfc, id=str(uuid.uuid4()), set='pkhm', set_name='Kaldheim Promos', collector_number='114p',
+                       set_uri=f'https://api.scryfall.com/sets/{uuid.uuid4()}')
+        self.ingest([sample_dfc, reprint], batch_size=10)
+        self.ingest([dict(reprint, id=str(uuid.uuid4()), collector_number='114s')])
+
+        card = Card.objects.get()
+        self.assertEqual(uuid.UUID(sample_dfc['oracle_id']), card.id)
+        self.assertEqual(['114', '114p', '114s'], sorted(card.printings.values_list('collector_number', flat=True)))
+        self.assertEqual(card, Card.objects.get_by_name('Valki, God of Lies'))
+
+    def test_cards_stored_without_oracle_ids_are_adopted_and_merged(self):
+        reprint_id = str(uuid.uuid4())
+        magic_set = set_code('khm')
+        legacy_cards = []
+        for scryfall_id in (sample_dfc['id'], reprint_id):
+            card = Card.objects.create(id=scryfall_id, name=sample_dfc['name'], type_line='')
+            Printing.objects.create(card=card, magic_set=magic_set, image_url='', scryfall_id=scryfall_id)
+            legacy_cards.append(card)
+        deck = CommanderJumpstartDeck.objects.create(color='B', commander=legacy_cards[1])
+
+        self.ingest([sample_dfc, dict(sample_dfc, id=reprint_id)], batch_size=10)
+
+        card = Card.objects.get()
+        self.assertEqual(uuid.UUID(legacy_cards[0].id), card.id)
+        self.assertEqual(uuid.UUID(sample_dfc['oracle_id']), card.oracle_id)
+        self.assertEqual(2, card.printings.count())
+        deck.refresh_from_db()
+        self.assertEqual(card, deck.commander)
+
+
+class RefreshSetCommandTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.server = StandinServer().start()
+        self.settings = override_settings(SCRYFALL_API_URL=self.server.url)
+        self.settings.enable()
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.server.stop()
+
+    def refresh(self, *codes, **options):
+        output = StringIO()
+        call_command('refreshset', *codes, stdout=output, **options)
+        return output.getvalue()
+
+    def test_refresh_writes_full_card_data_for_many_sets(self):
+        output = self.refresh('cmr', 'KHM')
+
+        self.assertIn('Commander Legends: 1 of 1 cards written', output)
+        self.assertEqual({'cmr', 'khm'}, set(MagicSet.objects.values_list('code', flat=True)))
+        valki = Card.objects.get(normalized_name='valki god of lies')
+        self.assertEqual(2, valki.faces.count())
+        self.assertEqual('khm', valki.printings.get().magic_set.code)
+        self.assertEqual('Sorcery', Card.objects.get(name='Austere Command').type_line)
+        self.assertIn('GET /sets/khm', self.server.requests)
+
+    def test_existing_cards_are_only_updated_when_forced(self):
+        self.refresh('cmr')
+        Card.objects.filter(name='Austere Command').update(oracle_text='Changed')
+        Printing.objects.update(content_hash='')
+
+        self.assertIn('0 of 1 cards written', self.refresh('cmr'))
+        self.assertEqual('Changed', Card.objects.get(name='Austere Command').oracle_text)
+        self.refresh('cmr', force=True)
+        self.assertNotEqual('Changed', Card.objects.get(name='Austere Command').oracle_text)
+        self.assertEqual(1, Printing.objects.count())
+
+    @parameterized.expand([(False,), (True,)])
+    def test_cards_stored_by_older_versions_are_adopted(self, with_printing):
+        card = Card.objects.create(id=uuid.UUID('ce4ec853-411d-40a3-84a7-a62b3cb57cb3'), name='Austere Command')
+        if with_printing:
+            magic_set = MagicSet.objects.create(id=uuid.uuid4(), code='cmr', name='Commander Legends')
+            Printing.objects.create(card=card, magic_set=magic_set)
+
+        self.assertIn('1 of 1 cards written', self.refresh('cmr'))
+
+        card = Card.objects.get(name='Austere Command')
+        self.assertIsNotNone(card.oracle_id)
+        self.assertEqual('Sorcery', card.type_line)
+        printing = Printing.objects.get(card__name='Austere Command')
+        self.assertEqual(card.id, printing.card_id)
+        self.assertEqual(uuid.UUID('ce4ec853-411d-40a3-84a7-a62b3cb57cb3'), printing.scryfall_id)
+
+    def test_sets_are_written_in_batches(self):
+        with patch('cards.management.commands.refreshset.WRITE_BATCH_SIZE', 1):
+            output = self.refresh('cmr', 'khm', workers=2)
+        self.assertIn('Commander Legends: 1 of 1 cards written', output)
+        self.assertIn('Kaldheim: 1 of 1 cards written', output)
+        self.assertEqual(2, Printing.objects.count())
+
+    def test_failed_sets_do_not_stop_the_others(self):
+        with self.assertRaisesMessage(CommandError, 'Could not refresh zzz'):
+            call_command('refreshset', 'zzz', 'cmr', stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(Printing.objects.filter(magic_set__code='cmr').exists())
+
+    def test_unchanged_cards_are_skipped(self):
+        self.refresh('cmr', 'khm')
+        before = dict(Printing.objects.values_list('id', 'content_hash'))
+        Printing.objects.filter(card__name='Austere Command').update(content_hash='')
+
+        output = self.refresh('cmr', 'khm', force=True)
+
+        self.assertIn('Commander Legends: 1 of 1 cards written', output)
+        self.assertIn('Kaldheim: 0 of 1 cards written', output)
+        self.assertEqual(before, dict(Printing.objects.values_list('id', 'content_hash')))
+        valki = Printing.objects.get(card__normalized_name='valki god of lies')
+        self.assertEqual(datetime.date(2021, 2, 5), valki.released_at)
+
+    def test_refreshes_that_change_nothing_keep_the_cache(self):
+        self.refresh('cmr', 'khm')
+        with patch('cards.ingest.invalidate_catalog') as invalidate:
+            self.refresh('cmr', 'khm', force=True)
+            invalidate.assert_not_called()
+            Printing.objects.filter(card__name='Austere Command').update(content_hash='')
+            self.refresh('cmr', 'khm', force=True)
+            invalidate.assert_called_once()
+
+    def test_since_only_pulls_recent_or_changed_sets(self):
+        self.refresh('cmr')
+        MagicSet.objects.create(id=uuid.uuid4(), code='j21', name='Jumpstart: Historic Horizons')
+        self.server.requests.clear()
+
+        output = self.refresh('--since', '2021-04-01')
+
+        self.assertIn('3 sets to refresh', output)
+        self.assertEqual({'sta', 'stx', 'j21'}, self.fetched_sets())
+        self.assertEqual(721, MagicSet.objects.get(code='cmr').scryfall_card_count)
+
+        # Nothing changed on Scryfall since, except for a late addition to Commander Legends
+        MagicSet.objects.filter(code='cmr').update(scryfall_card_count=720)
+        self.server.requests.clear()
+        self.assertIn('3 sets to refresh', self.refresh('--since', '2021-04-01'))
+        self.assertEqual({'sta', 'stx', 'cmr'}, self.fetched_sets())
+
+    def fetched_sets(self):
+        return {request.split('/')[-1] for request in self.server.requests if request.startswith('GET /sets/')}
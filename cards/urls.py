@@ -3,5 +3,8 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
+    path('search/', views.card_search, name='card-search'),
+    path('images/<int:printing_id>/<str:variant>/', views.card_image, name='card-image'),
     path('sets/<uuid:set_id>/', views.set_detail, name='set-detail'),
+    path('sets/<uuid:set_id>/export.<str:export_format>', views.set_export, name='set-export'),
 ]
@@ -1,18 +1,95 @@
-from django.shortcuts import render
+import json
+from typing import Iterator
+
+import requests
+from django.core.paginator import Paginator
+from django.http import FileResponse, Http404, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import patch_cache_control
 
 from app.decorators import debug_only
-from cards.models import MagicSet
+from cards import images
+from cards.models import MagicSet, Printing
+from cards.search import CardSearchResults
+
+SEARCH_PAGE_SIZE = 20
+SET_PAGE_SIZE = 100
+EXPORT_CHUNK_SIZE = 500
+IMAGE_MAX_AGE = 30 * 24 * 60 * 60
+
+
+def set_printings(magic_set: MagicSet):
+    return magic_set.printings.select_related('card').order_by('card__name', 'id')
 
 
 @debug_only
 def set_detail(request, set_id):
-    magic_set = MagicSet.objects \
-        .prefetch_related('printings__card') \
-        .get(id=set_id)
-    message = magic_set.name
-    for printing in magic_set.printings.all():
-        message += f'\n{printing.card.name}'
-
-    return render(request, 'message.html', {
-        'message': message,
+    magic_set = get_object_or_404(MagicSet, id=set_id)
+    paginator = Paginator(set_printings(magic_set), SET_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get('page'))
+
+    return render(request, 'cards/set_detail.html', {
+        'magic_set': magic_set,
+        'printings': page,
+    })
+
+
+@debug_only
+def set_export(request, set_id, export_format):
+    """
+    Streams every printing of a set as plain text (one card name per line) or as a JSON array, reading the printings
+    a chunk at a time so memory use doesn't grow with the size of the set
+    """
+    magic_set = get_object_or_404(MagicSet, id=set_id)
+    printings = set_printings(magic_set).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if export_format == 'json':
+        return StreamingHttpResponse(stream_json(printings), content_type='application/json')
+    if export_format == 'txt':
+        return StreamingHttpResponse((f'{printing.card.name}\n' for printing in printings),
+                                     content_type='text/plain; charset=utf-8')
+    raise Http404()
+
+
+def stream_json(printings: Iterator[Printing]) -> Iterator[str]:
+    yield '['
+    separator = ''
+    for printing in printings:
+        yield separator + json.dumps({
+            'name': printing.card.name,
+            'collector_number': printing.collector_number,
+            'rarity': printing.rarity,
+            'scryfall_id': str(printing.scryfall_id) if printing.scryfall_id else None,
+            'image_url': printing.image_url,
+        })
+        separator = ','
+    yield ']'
+
+
+def card_search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(CardSearchResults(query), SEARCH_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get('page'))
+
+    return render(request, 'cards/search.html', {
+        'query': query,
+        'cards': page,
     })
+
+
+def card_image(request, printing_id, variant):
+    if variant not in images.VARIANTS:
+        raise Http404()
+    printing = get_object_or_404(Printing, id=printing_id)
+    etag = images.image_etag(printing, variant)
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        try:
+            path = images.fetch_image(printing, variant)
+        except requests.RequestException:
+            # Better a hot-linked image than a broken one
+            return HttpResponseRedirect(images.variant_url(printing.image_url, variant))
+        response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=IMAGE_MAX_AGE)
+    return response
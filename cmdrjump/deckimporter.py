@@ -1,46 +1,18 @@
-import re
 from pathlib import Path
 
 from django.db import transaction
 
-from cards.models import Card, Color, Type, ColorPair
+from cards.colors import colors_from_mask
+from cards.models import Card, Type, ColorPair, category_from_type_line
 from .models import CommanderJumpstartDeck, CommanderJumpstartEntry, DualColoredDeck, DualColoredEntry
 
 FILENAME = Path(__file__).resolve().parent / 'decklists.txt'
 
 
-def determine_colors_from_manacost(cost):
-    result = set()
-    for character in re.findall(r'{(W|U|B|R|G)}', cost):
-        if character == 'W':
-            result.add(Color.WHITE)
-        elif character == 'U':
-            result.add(Color.BLUE)
-        elif character == 'B':
-            result.add(Color.BLACK)
-        elif character == 'R':
-            result.add(Color.RED)
-        elif character == 'G':
-            result.add(Color.GREEN)
-    return result
-
-
 def determine_category_from_card(card: Card):
-    if 'Land' in card.type_line:
-        return Type.LAND
-    elif 'Creature' in card.type_line:
-        return Type.CREATURE
-    elif 'Planeswalker' in card.type_line:
-        return Type.PLANESWALKER
-    elif 'Sorcery' in card.type_line:
-        return Type.SORCERY
-    elif 'Instant' in card.type_line:
-        return Type.INSTANT
-    elif 'Artifact' in card.type_line:
-        return Type.ARTIFACT
-    elif 'Enchantment' in card.type_line:
-        return Type.ENCHANTMENT
-    return Type.UNKNOWN
+    if card.category != Type.UNKNOWN:
+        return card.category
+    return category_from_type_line(card.type_line)
 
 
 def colorpair_from_set(colors):
@@ -72,19 +44,16 @@ def colorpair_from_set(colors):
 
 def process_decklist(decklist):
     is_commander_list = any(line.startswith('C') for line in decklist)
+    lines = [line.split(' ', maxsplit=1) for line in decklist]
+    printings = Card.objects.get_or_fetch_printings_for_names(name for _, name in lines)
     if is_commander_list:
         deck = CommanderJumpstartDeck()
         entries = []
-        for line in decklist:
-            count, name = line.split(' ', maxsplit=1)
-            printing = Card.objects.get_or_fetch_printing_for_name(name)
-            card = printing.card
+        for count, name in lines:
+            card = printings[name].card
             if count == 'C':
                 deck.commander = card
-                parsed_colors = determine_colors_from_manacost(card.mana_cost)
-                if len(parsed_colors) == 0 and card.name == 'Rograkh, Son of Rohgahh':
-                    # Handle a very special case
-                    parsed_colors = {'R'}
+                parsed_colors = colors_from_mask(card.colors)
                 assert len(parsed_colors) == 1
                 deck.color = list(parsed_colors)[0]
             else:
@@ -106,15 +75,11 @@ def process_decklist(decklist):
         deck = DualColoredDeck()
         entries = []
         found_colors = set()
-        for line in decklist:
-            count, name = line.split(' ', maxsplit=1)
-            printing = Card.objects.get_or_fetch_printing_for_name(name)
-            card = printing.card
+        for count, name in lines:
+            card = printings[name].card
             count = int(count)  # Should always be 1
             assert count == 1
-            if card.mana_cost is not None and card.mana_cost != '':
-                card_colors = determine_colors_from_manacost(card.mana_cost)
-                found_colors.update(card_colors)
+            found_colors.update(colors_from_mask(card.colors))
             new_entry = DualColoredEntry(
                 deck=deck,
                 card=card,
@@ -1,3 +1,4 @@
+import json
 import uuid
 from unittest.mock import patch
 
@@ -6,8 +7,7 @@ from django.test import Client, TestCase
 from parameterized import parameterized
 
 from cards.models import Card, Color, ColorPair, Type, MagicSet, Printing
-from cmdrjump.deckimporter import determine_colors_from_manacost, determine_category_from_card, colorpair_from_set, \
-    process_decklist
+from cmdrjump.deckimporter import determine_category_from_card, colorpair_from_set, process_decklist
 from cmdrjump.models import CommanderJumpstartDeck, DualColoredDeck, CommanderJumpstartEntry, DualColoredEntry
 
 
@@ -18,7 +18,7 @@ def create_mock_card_response(card_name, mana_cost, type_line):
             "object": "card",
             "id": "%s",
             "lang": "en",
-            "oracle_id": "ed66cd31-958f-4b28-82a3-e04acc819afc",
+            "oracle_id": "%s",
             "uri": "https://api.scryfall.com/cards/%s",
             "name": "%s",
             "mana_cost": "%s",
@@ -38,30 +38,11 @@ def create_mock_card_response(card_name, mana_cost, type_line):
                 "border_crop": "https://c1.scryfall.com/file/scryfall-cards/border_crop/front/6/4/645cfc1b-76f2-4823-9fb0-03cb009f8b32.jpg?1562736801"
             }
         }
-        '''.strip() % (scryfall_id, scryfall_id, card_name, mana_cost, type_line)
+        '''.strip() % (scryfall_id, uuid.uuid4(), scryfall_id, card_name, mana_cost, type_line)
 
 
-class ManaCostTestCase(TestCase):
-
-    def test_mono_color(self):
-        result = determine_colors_from_manacost('{4}{W}')
-        self.assertEqual({Color.WHITE}, result)
-
-    def test_dual_color(self):
-        result = determine_colors_from_manacost('{2}{U}{B}}')
-        self.assertEqual({Color.BLUE, Color.BLACK}, result)
-
-    def test_three_color(self):
-        result = determine_colors_from_manacost('{1}{B}{R}}{G}')
-        self.assertEqual({Color.BLACK, Color.RED, Color.GREEN}, result)
-
-    def test_repeated_colors(self):
-        result = determine_colors_from_manacost('{4}{W}{W}')
-        self.assertEqual({Color.WHITE}, result)
-
-    def test_colorless(self):
-        result = determine_colors_from_manacost('{6}')
-        self.assertEqual(set(), result)
+def create_mock_collection_response(*cards):
+    return '{"object": "list", "not_found": [], "data": [%s]}' % ', '.join(cards)
 
 
 class CardCategorizerTestCase(TestCase):
@@ -117,12 +98,11 @@ class DeckImporterTestCase(TestCase):
 
     def test_importing_commander_deck(self):
         with responses.RequestsMock() as rm:
-            rm.add('GET', 'https://api.scryfall.com/cards/named?fuzzy=norin,+the+wary',
-                   create_mock_card_response('Norin, the Wary', '{R}', 'Legendary Creature - Coward'))
-            rm.add('GET', 'https://api.scryfall.com/cards/named?fuzzy=lightning+bolt',
-                   create_mock_card_response('Lightning Bolt', '{R}', 'Instant'))
-            rm.add('GET', 'https://api.scryfall.com/cards/named?fuzzy=mountain',
-                   create_mock_card_response('Mountain', '', 'Basic Land - Mountain'))
+            rm.add('POST', 'https://api.scryfall.com/cards/collection', create_mock_collection_response(
+                create_mock_card_response('Norin, the Wary', '{R}', 'Legendary Creature - Coward'),
+                create_mock_card_response('Lightning Bolt', '{R}', 'Instant'),
+                create_mock_card_response('Mountain', '', 'Basic Land - Mountain'),
+            ))
             process_decklist(self.sample_commander_deck)
         self.assertEqual(1, CommanderJumpstartDeck.objects.count())
         deck: CommanderJumpstartDeck = CommanderJumpstartDeck.objects.first()
@@ -136,12 +116,14 @@ class DeckImporterTestCase(TestCase):
         '39 Mountain',
     ]
 
-    def test_rograkh_mana_cost_special_case(self):
+    def test_color_indicator_gives_colorless_costs_a_color(self):
+        rograkh = json.loads(create_mock_card_response('Rograkh, Son of Rohgahh', '{0}', 'Legendary Creature - Kobold'))
+        rograkh['color_indicator'] = ['R']
         with responses.RequestsMock() as rm:
-            rm.add('GET', 'https://api.scryfall.com/cards/named?fuzzy=rograkh,+son+of+rohgahh',
-                   create_mock_card_response('Rograkh, Son of Rohgahh', '{0}', 'Legendary Creature - Kobold'))
-            rm.add('GET', 'https://api.scryfall.com/cards/named?fuzzy=mountain',
-                   create_mock_card_response('Mountain', '', 'Basic Land - Mountain'))
+            rm.add('POST', 'https://api.scryfall.com/cards/collection', create_mock_collection_response(
+                json.dumps(rograkh),
+                create_mock_card_response('Mountain', '', 'Basic Land - Mountain'),
+            ))
             process_decklist(self.rograkh_decklist)
         self.assertEqual(1, CommanderJumpstartDeck.objects.count())
         deck: CommanderJumpstartDeck = CommanderJumpstartDeck.objects.first()
@@ -155,12 +137,11 @@ class DeckImporterTestCase(TestCase):
 
     def test_two_color_deck(self):
         with responses.RequestsMock() as rm:
-            rm.add('GET', 'https://api.scryfall.com/cards/named?fuzzy=craterhoof+behemoth',
-                   create_mock_card_response('Craterhoof Behemoth', '{5}{G}{G}{G}', 'Creature - Beast'))
-            rm.add('GET', 'https://api.scryfall.com/cards/named?fuzzy=ancestral+recall',
-                   create_mock_card_response('Ancestral Recall', '{U}', 'Instant'))
-            rm.add('GET', 'https://api.scryfall.com/cards/named?fuzzy=trygon+predator',
-                   create_mock_card_response('Trygon Predator', '{1}{G}{U}', 'Creature - Beast'))
+            rm.add('POST', 'https://api.scryfall.com/cards/collection', create_mock_collection_response(
+                create_mock_card_response('Craterhoof Behemoth', '{5}{G}{G}{G}', 'Creature - Beast'),
+                create_mock_card_response('Ancestral Recall', '{U}', 'Instant'),
+                create_mock_card_response('Trygon Predator', '{1}{G}{U}', 'Creature - Beast'),
+            ))
             process_decklist(self.two_color_list)
         self.assertEqual(1, DualColoredDeck.objects.count())
         deck: DualColoredDeck = DualColoredDeck.objects.first()
@@ -207,19 +188,22 @@ class CommanderJumpstartViewsTestCase(TestCase):
         self.assertEqual('Akroma', options[0]['name'])
         self.assertEqual(Color.WHITE, options[0]['color'])
         self.assertEqual('akroma', options[0]['slug'])
-        self.assertEqual('https://example.com/akroma.png', options[0]['image_url'])
+        self.assertEqual(Printing.objects.get(image_url='https://example.com/akroma.png').get_image_url(),
+                         options[0]['image_url'])
         self.assertEqual('/cmdrjump/akroma?passed=2,3', options[0]['url'])
 
         self.assertEqual('Urza', options[1]['name'])
         self.assertEqual(Color.BLUE, options[1]['color'])
         self.assertEqual('urza', options[1]['slug'])
-        self.assertEqual('https://example.com/urza.png', options[1]['image_url'])
+        self.assertEqual(Printing.objects.get(image_url='https://example.com/urza.png').get_image_url(),
+                         options[1]['image_url'])
         self.assertEqual('/cmdrjump/urza?passed=1,3', options[1]['url'])
 
         self.assertEqual('Geth', options[2]['name'])
         self.assertEqual(Color.BLACK, options[2]['color'])
         self.assertEqual('geth', options[2]['slug'])
-        self.assertEqual('https://example.com/geth.png', options[2]['image_url'])
+        self.assertEqual(Printing.objects.get(image_url='https://example.com/geth.png').get_image_url(),
+                         options[2]['image_url'])
         self.assertEqual('/cmdrjump/geth?passed=1,2', options[2]['url'])
 
     def test_second_selection_with_passed(self):
@@ -4,6 +4,7 @@ from django.http import Http404
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
 
+from cards.cache import attach_cards, get_cards
 from cards.models import Color
 from .deckimporter import colorpair_from_set
 from .models import CommanderJumpstartDeck, DualColoredDeck
@@ -27,7 +28,7 @@ def start(request):
             'name': commander.name,
             'color': selected_deck.color,
             'slug': selected_deck.slug,
-            'image_url': printing.image_url,
+            'image_url': printing.get_image_url(),
         })
 
     for item in selected_decks:
@@ -67,7 +68,7 @@ def make_second_selection(request, cmdr):
             'name': commander.name,
             'color': selected_deck.color,
             'slug': selected_deck.slug,
-            'image_url': printing.image_url,
+            'image_url': printing.get_image_url(),
         })
 
     for item in selected_decks:
@@ -82,14 +83,17 @@ def make_second_selection(request, cmdr):
 
 def result(request, cmdr_1, cmdr_2):
     try:
-        first_selection = CommanderJumpstartDeck.objects.prefetch_related('cards__card').get(slug=cmdr_1)
-        second_selection = CommanderJumpstartDeck.objects.prefetch_related('cards__card').get(slug=cmdr_2)
+        first_selection = CommanderJumpstartDeck.objects.prefetch_related('cards').get(slug=cmdr_1)
+        second_selection = CommanderJumpstartDeck.objects.prefetch_related('cards').get(slug=cmdr_2)
         colors = colorpair_from_set({first_selection.color, second_selection.color})
-        pair_deck = DualColoredDeck.objects.prefetch_related('cards__card').get(colors=colors)
+        pair_deck = DualColoredDeck.objects.prefetch_related('cards').get(colors=colors)
     except (CommanderJumpstartDeck.DoesNotExist, DualColoredDeck.DoesNotExist):
         raise Http404()
 
-    commanders = [first_selection.commander, second_selection.commander]
+    # Cards come from the card cache rather than the database
+    attach_cards([*first_selection.cards.all(), *second_selection.cards.all(), *pair_deck.cards.all()])
+    cached_commanders = get_cards([first_selection.commander_id, second_selection.commander_id])
+    commanders = [cached_commanders[first_selection.commander_id], cached_commanders[second_selection.commander_id]]
 
     deck_sections = {}
 
@@ -132,6 +136,9 @@ def result(request, cmdr_1, cmdr_2):
             'card': item.card,
         })
 
+    for details in deck_sections.values():
+        details['entries'].sort(key=lambda entry: (entry['card'].mana_value, entry['card'].name))
+
     column_count = 0
     column_index = 0
     columns = [{}]
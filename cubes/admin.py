@@ -1,8 +1,14 @@
 from django.contrib import admin
 
-from cubes.models import Cube
+from cubes.models import Cube, CubeImportJob
 
 
 @admin.register(Cube)
 class CubeAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(CubeImportJob)
+class CubeImportJobAdmin(admin.ModelAdmin):
+    list_display = ('cube', 'status', 'resolved', 'total', 'created_at')
+    list_filter = ('status',)
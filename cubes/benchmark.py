@@ -0,0 +1,76 @@
+"""
+Compares pack generation by expanding and shuffling the whole pool with sampling from (printing id, count) pairs,
+and with balanced sampling.
+
+    python -m cubes.benchmark [--drafts N] [--players N]
+
+Each cube shape is given as distinct entries x copies per entry. Times are per draft (packs for every player), and
+memory is the peak allocated while generating them.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from .packs import generate_draft_packs
+
+SHAPES = [(540, 1), (5000, 4), (5000, 100), (20000, 250)]
+PACK_COUNT = 3
+PACK_SIZE = 15
+
+
+def expand_and_shuffle(entries, draft_count, pack_count, pack_size, seed):
+    """
+    The previous implementation of Cube.generate_packs, once per draft
+    """
+    rng = random.Random(seed)
+    drafts = []
+    for _ in range(draft_count):
+        card_pool = []
+        for printing_id, count, *_ in entries:
+            for _ in range(count):
+                card_pool.append(printing_id)
+        rng.shuffle(card_pool)
+        drafts.append([[card_pool.pop() for _ in range(pack_size)] for _ in range(pack_count)])
+    return drafts
+
+
+def balanced(entries, draft_count, pack_count, pack_size, seed):
+    return generate_draft_packs(entries, draft_count, pack_count, pack_size, seed, balanced=True)
+
+
+def measure(generate, entries, draft_count, pack_count) -> float:
+    started = time.perf_counter()
+    generate(entries, draft_count, pack_count, PACK_SIZE, 1)
+    return (time.perf_counter() - started) / draft_count
+
+
+def peak_memory(generate, entries, pack_count) -> int:
+    tracemalloc.start()
+    generate(entries, 1, pack_count, PACK_SIZE, 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drafts', type=int, default=10)
+    parser.add_argument('--players', type=int, default=8)
+    args = parser.parse_args()
+
+    pack_count = PACK_COUNT * args.players
+    generators = [('expand+shuffle', expand_and_shuffle), ('sampled', generate_draft_packs), ('balanced', balanced)]
+    for distinct, copies in SHAPES:
+        # Colors cycle through colorless, the five single colors and a two-color pair
+        entries = [(printing_id, copies, [0, 1, 2, 4, 8, 16, 3][printing_id % 7], 'CL'[printing_id % 2],
+                    ['common', 'uncommon', 'rare'][printing_id % 3]) for printing_id in range(distinct)]
+        for label, generate in generators:
+            per_draft = measure(generate, entries, args.drafts, pack_count)
+            peak = peak_memory(generate, entries, pack_count)
+            print(f'{distinct:>6} x {copies:<5} {label:>15}: {per_draft * 1000:9.2f} ms/draft, '
+                  f'{peak / 1024:9.0f} KiB peak')
+
+
+if __name__ == '__main__':
+    main()
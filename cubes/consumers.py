@@ -0,0 +1,29 @@
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+
+from .models import CubeImportJob
+from .progress import job_group
+
+
+class CubeImportConsumer(JsonWebsocketConsumer):
+    """
+    Streams the progress of one cube import job, starting with its current state
+    """
+
+    def connect(self):
+        job_id = self.scope['url_route']['kwargs']['job_id']
+        job = CubeImportJob.objects.filter(id=job_id).first()
+        if job is None:
+            self.close()
+            return
+        self.group_name = job_group(job.id)
+        async_to_sync(self.channel_layer.group_add)(self.group_name, self.channel_name)
+        self.accept()
+        self.send_json(job.as_message())
+
+    def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            async_to_sync(self.channel_layer.group_discard)(self.group_name, self.channel_name)
+
+    def job_progress(self, event):
+        self.send_json(event['job'])
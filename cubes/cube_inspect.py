@@ -1,12 +1,15 @@
 import csv
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from io import StringIO
-from typing import List
+from typing import List, Set
 
 import requests
 
+from scryfall.cache import cached_get, default_cache
 from scryfall.client import ScryfallClient
+from scryfall.conf import get_setting
 from scryfall.models import ScryfallCard
 
 
@@ -20,13 +23,33 @@ class InspectionResults:
 
 BASICS = {'Plains', 'Island', 'Swamp', 'Mountain', 'Forest'}
 
+DEFAULT_CUBECOBRA_URL = 'https://cubecobra.com'
+
+cubecobra_session = requests.Session()
+# Downloads the sets of every inspection, so that concurrent inspections share a bounded number of threads
+set_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cube-inspect')
+
+
+def fetch_cubecobra(path: str) -> requests.Response:
+    base_url = (get_setting('CUBECOBRA_URL') or DEFAULT_CUBECOBRA_URL).rstrip('/')
+    return cached_get(cubecobra_session.get, base_url + path, default_cache(), timeout=30)
+
 
 def is_basic(card_name: str) -> bool:
     return card_name in BASICS
 
 
+def missing_from_set(client: ScryfallClient, set_id: str, names: Set[str]) -> List[ScryfallCard]:
+    missing = []
+    for card in client.iter_cards_for_set_code(set_id):
+        card_name = card.name.split(' // ')[0]
+        if card_name not in names and not is_basic(card_name):
+            missing.append(card)
+    return missing
+
+
 def inspect_cubecobra_set_cube(cube_id: str, set_ids: List[str]) -> InspectionResults:
-    result = requests.get(f'https://cubecobra.com/cube/download/plaintext/{cube_id}')
+    result = fetch_cubecobra(f'/cube/download/plaintext/{cube_id}')
     if result.status_code != 200:
         raise RuntimeError()
     names = result.text.splitlines()
@@ -38,13 +61,11 @@ def inspect_cubecobra_set_cube(cube_id: str, set_ids: List[str]) -> InspectionRe
         else:
             dedup_names.add(name)
     client = ScryfallClient()
+    # The sets are streamed side by side, and only the cards missing from the cube are kept
+    futures = [set_executor.submit(missing_from_set, client, set_id, dedup_names) for set_id in set_ids]
     missing = []
-    for set_id in set_ids:
-        cards = client.get_cards_for_set_code(set_id)
-        for card in cards:
-            card_name = card.name.split(' // ')[0]
-            if card_name not in dedup_names and not is_basic(card_name):
-                missing.append(card)
+    for future in futures:
+        missing.extend(future.result())
     return InspectionResults(
         cube_id=cube_id,
         set_ids=set_ids,
@@ -75,7 +96,7 @@ def describe_results(results: InspectionResults) -> str:
 
 
 def cubecobra_to_untap(cube_id: str) -> str:
-    result = requests.get(f'https://cubecobra.com/cube/download/csv/{cube_id}')
+    result = fetch_cubecobra(f'/cube/download/csv/{cube_id}')
     if result.status_code != 200:
         raise RuntimeError()
     f = StringIO(result.text)
@@ -1,5 +1,7 @@
 from django import forms
 
+from .models import Cube
+
 
 class CubeBulkUpdateForm(forms.Form):
     bulk_content = forms.CharField(widget=forms.Textarea)
@@ -8,3 +10,12 @@ class CubeBulkUpdateForm(forms.Form):
 class CubeInspectionForm(forms.Form):
     cube_id = forms.CharField(max_length=100)
     set_ids = forms.CharField(required=False)
+
+
+class CubeSettingsForm(forms.ModelForm):
+    class Meta:
+        model = Cube
+        fields = ['name', 'default_pack_count', 'default_pack_size', 'balanced_packs']
+        help_texts = {
+            'balanced_packs': 'Spread colors and card types evenly over the packs of each draft',
+        }
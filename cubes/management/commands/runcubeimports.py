@@ -0,0 +1,42 @@
+import time
+
+from django.core.management import BaseCommand
+
+from cubes.models import CubeImportJob
+
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_WORKERS = 4
+
+
+class Command(BaseCommand):
+    help = 'Runs queued cube imports, waiting for new ones until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for more jobs'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help='Number of Scryfall lookups each job runs at the same time'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=DEFAULT_POLL_INTERVAL,
+            help='Seconds to wait before checking an empty queue again'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = CubeImportJob.claim_next()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+            job.run(workers=options['workers'])
+            self.stdout.write(f'{job}: {job.total} names resolved')
@@ -0,0 +1,39 @@
+from django.core.management import BaseCommand, CommandError
+
+from cards import images
+from cards.models import Printing
+from cubes.models import Cube, CubeEntry
+
+
+class Command(BaseCommand):
+    help = 'Downloads the images of every printing in the given cubes into the local image cache, ahead of a draft'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'cubes',
+            metavar='cube_id',
+            type=str,
+            nargs='+',
+            help='Ids of the cubes to download images for'
+        )
+        parser.add_argument(
+            '--variant',
+            choices=images.VARIANTS,
+            action='append',
+            help='Image size to download (repeatable, default: all sizes)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=images.DEFAULT_WORKERS,
+            help='Number of images to download at the same time'
+        )
+
+    def handle(self, *args, **options):
+        cubes = list(Cube.objects.filter(id__in=options['cubes']))
+        if len(cubes) != len(set(options['cubes'])):
+            raise CommandError('Unknown cube id')
+        printings = list(Printing.objects.filter(id__in=CubeEntry.objects.filter(cube__in=cubes).values('printing_id')))
+        variants = options['variant'] or images.VARIANTS
+        failed = images.warm_images(printings, variants, options['workers'])
+        self.stdout.write(f'{len(printings)} printings cached, {failed} images could not be downloaded')
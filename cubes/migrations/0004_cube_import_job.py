@@ -0,0 +1,35 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cubes', '0003_auto_20210301_1940'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CubeImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('card_names', models.TextField()),
+                ('status', models.CharField(choices=[('Q', 'Queued'), ('R', 'Running'), ('D', 'Done'), ('F', 'Failed')],
+                                            db_index=True, default='Q', max_length=1)),
+                ('resolved', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('cube', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs',
+                                           to='cubes.cube')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                                   to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cubes', '0004_cube_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cube',
+            name='balanced_packs',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cubes', '0005_cube_balanced_packs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cubeimportjob',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cubeimportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,17 +1,62 @@
+import datetime
 import uuid
-from random import shuffle
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
 
+from cards.cache import batched_invalidation
 from cards.models import Printing, Card
+from cards.names import normalize_front_face
+from cards.query import compile_query
+from scryfall.client import COLLECTION_CHUNK_SIZE
+from .packs import generate_draft_packs
+
+RESOLVE_CHUNK_SIZE = COLLECTION_CHUNK_SIZE
+# A running import that hasn't reported progress for this long lost its worker
+STALE_JOB_TIMEOUT = datetime.timedelta(minutes=10)
+MAX_JOB_ATTEMPTS = 3
 
 
 class CubeNotLargeEnoughException(BaseException):
     pass
 
 
+def resolve_printings(names: List[str], workers: int = 1,
+                      progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Printing]:
+    """
+    Card.objects.get_or_fetch_printings_for_names, split into chunks of one Scryfall collection request each so that
+    up to [workers] of them run at the same time
+    """
+    chunks = [names[start:start + RESOLVE_CHUNK_SIZE] for start in range(0, len(names), RESOLVE_CHUNK_SIZE)]
+
+    def resolve(chunk: List[str]) -> Dict[str, Printing]:
+        try:
+            return Card.objects.get_or_fetch_printings_for_names(chunk)
+        finally:
+            if workers > 1:
+                # Worker threads each opened their own connection
+                connection.close()
+
+    printings = {}
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(resolve, chunks)
+            for result in results:
+                printings.update(result)
+                if progress is not None:
+                    progress(len(printings), len(names))
+    else:
+        for chunk in chunks:
+            printings.update(resolve(chunk))
+            if progress is not None:
+                progress(len(printings), len(names))
+    return printings
+
+
 class Cube(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     name = models.CharField(max_length=200)
@@ -19,6 +64,7 @@ class Cube(models.Model):
 
     default_pack_count = models.IntegerField(default=3)
     default_pack_size = models.IntegerField(default=15)
+    balanced_packs = models.BooleanField(default=False)
 
     def __str__(self):
         return self.name
@@ -27,40 +73,105 @@ class Cube(models.Model):
         from django.shortcuts import reverse
         return reverse('cube-detail', args=[self.id])
 
-    def bulk_update(self, card_names, fetch=False):
-        self.entries.all().delete()
+    @batched_invalidation()
+    def bulk_update(self, card_names, fetch=False, workers: int = 1,
+                    progress: Optional[Callable[[int, int], None]] = None):
+        """
+        Makes the cube's entries match [card_names], one name per copy. Only names that aren't in the cube yet are
+        resolved, and only the entries that change are written: duplicate names become the count of one entry.
+
+        With [fetch], unknown names are looked up on Scryfall in chunks, [workers] chunks at a time, and [progress] is
+        called with the number of names resolved so far and the total after each chunk.
+        """
+        wanted: Dict[str, int] = {}
+        spellings: Dict[str, str] = {}
         for card_name in card_names:
-            if fetch:
-                printing = Card.objects.get_or_fetch_printing_for_name(card_name)
+            key = normalize_front_face(card_name)
+            if key == '':
+                continue
+            wanted[key] = wanted.get(key, 0) + 1
+            spellings.setdefault(key, card_name.strip())
+
+        entries: Dict[uuid.UUID, CubeEntry] = {}
+        duplicates = []
+        for entry in self.entries.select_related('printing__card').order_by('id'):
+            if entry.printing.card_id in entries:
+                duplicates.append(entry)
             else:
-                printing = Card.objects.get_or_create_printing_for_name(card_name)
-            self.entries.create(printing=printing, count=1)
+                entries[entry.printing.card_id] = entry
+        known = {entry.printing.card.normalized_name: entry.printing for entry in entries.values()}
+
+        new_names = [spellings[key] for key in wanted if key not in known]
+        if fetch:
+            printings = resolve_printings(new_names, workers, progress)
+        else:
+            printings = {name: Card.objects.get_or_create_printing_for_name(name) for name in new_names}
+
+        counts: Dict[uuid.UUID, int] = {}
+        chosen: Dict[uuid.UUID, Printing] = {}
+        for key, count in wanted.items():
+            printing = known.get(key) or printings[spellings[key]]
+            # Different names (e.g. a back face and a full name) can resolve to the same card
+            counts[printing.card_id] = counts.get(printing.card_id, 0) + count
+            chosen.setdefault(printing.card_id, printing)
+
+        to_create = [CubeEntry(cube=self, printing=chosen[card_id], count=count)
+                     for card_id, count in counts.items() if card_id not in entries]
+        to_update = []
+        for card_id, entry in entries.items():
+            if card_id in counts and entry.count != counts[card_id]:
+                entry.count = counts[card_id]
+                to_update.append(entry)
+        to_delete = [entry.id for card_id, entry in entries.items() if card_id not in counts]
+        to_delete += [entry.id for entry in duplicates]
+
+        with transaction.atomic():
+            CubeEntry.objects.filter(id__in=to_delete).delete()
+            CubeEntry.objects.bulk_update(to_update, ['count'])
+            CubeEntry.objects.bulk_create(to_create)
+
+    def search(self, query: str):
+        """
+        The entries of this cube whose printing matches [query], in Scryfall syntax (see cards.query)
+        """
+        return self.entries.filter(compile_query(query, 'printing__')).distinct()
 
     def calculate_size(self) -> int:
-        return sum(self.entries.values_list('count', flat=True))
+        return self.entries.aggregate(size=Sum('count'))['size'] or 0
 
-    def generate_packs(self, pack_count=None, pack_size=None) -> List[List[int]]:
+    def pack_pool(self, balanced: bool = False) -> List[tuple]:
+        """
+        (printing id, count) of every entry, plus the card's color mask, category and rarity for balanced packs
+        """
+        columns = ['printing_id', 'count']
+        if balanced:
+            columns += ['printing__card__colors', 'printing__card__category', 'printing__rarity']
+        return list(self.entries.filter(count__gt=0).order_by('id').values_list(*columns))
+
+    def generate_packs(self, pack_count=None, pack_size=None, seed=None, balanced=None) -> List[List[int]]:
+        """
+        [pack_count] packs of [pack_size] printing ids, drawn without replacement. The same [seed] gives the same
+        packs for as long as the cube doesn't change.
+        """
+        return self.generate_draft_packs(1, pack_count, pack_size, seed, balanced)[0]
+
+    def generate_draft_packs(self, draft_count: int, pack_count=None, pack_size=None,
+                             seed=None, balanced=None) -> List[List[List[int]]]:
+        """
+        The packs of [draft_count] separate drafts of this cube, each drawn from the whole cube. [balanced] packs
+        split every color (and within it, types and rarities) as evenly as possible over the packs, and defaults to
+        the cube's balanced_packs setting.
+        """
         if pack_count is None:
             pack_count = self.default_pack_count
         if pack_size is None:
             pack_size = self.default_pack_size
-        packs = []
-        total_requested_cards = pack_count * pack_size
-        cube_size = self.calculate_size()
-        if total_requested_cards > cube_size:
+        if balanced is None:
+            balanced = self.balanced_packs
+        pool = self.pack_pool(balanced)
+        if pack_count * pack_size > sum(entry[1] for entry in pool):
             raise CubeNotLargeEnoughException()
-        card_pool = []
-        entry: CubeEntry
-        for entry in self.entries.prefetch_related('printing').all():
-            for _ in range(entry.count):
-                card_pool.append(entry.printing.id)
-        shuffle(card_pool)
-        for _ in range(pack_count):
-            pack = []
-            for _ in range(pack_size):
-                pack.append(card_pool.pop())
-            packs.append(pack)
-        return packs
+        return generate_draft_packs(pool, draft_count, pack_count, pack_size, seed, balanced)
 
 
 class CubeEntry(models.Model):
@@ -74,3 +185,108 @@ class CubeEntry(models.Model):
 
     def get_card_name(self):
         return self.printing.card.name
+
+
+class CubeImportJob(models.Model):
+    """
+    A bulk update of a cube's card list, queued by the bulk update page and run by the runcubeimports worker
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = 'Q', 'Queued'
+        RUNNING = 'R', 'Running'
+        DONE = 'D', 'Done'
+        FAILED = 'F', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    cube = models.ForeignKey(Cube, related_name='import_jobs', on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    card_names = models.TextField()
+    status = models.CharField(max_length=1, choices=Status.choices, default=Status.QUEUED, db_index=True)
+    resolved = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Updated by the worker running the job whenever it makes progress
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Import into {self.cube} ({self.get_status_display()})'
+
+    def get_absolute_url(self):
+        from django.shortcuts import reverse
+        return reverse('cube-import-job', args=[self.cube_id, self.id])
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+    def as_message(self) -> dict:
+        return {
+            'status': self.get_status_display(),
+            'resolved': self.resolved,
+            'total': self.total,
+            'finished': self.is_finished,
+            'error': self.error,
+        }
+
+    @classmethod
+    def requeue_stale(cls) -> int:
+        """
+        Puts running jobs whose worker hasn't reported progress for STALE_JOB_TIMEOUT (because it died) back in the
+        queue, or fails them after MAX_JOB_ATTEMPTS. Returns the number of jobs requeued.
+        """
+        stale = cls.objects \
+            .filter(status=cls.Status.RUNNING) \
+            .filter(Q(heartbeat_at__lt=timezone.now() - STALE_JOB_TIMEOUT) | Q(heartbeat_at=None))
+        stale.filter(attempts__gte=MAX_JOB_ATTEMPTS).update(
+            status=cls.Status.FAILED,
+            error='The worker running this import stopped responding',
+            finished_at=timezone.now(),
+        )
+        return stale.update(status=cls.Status.QUEUED)
+
+    @classmethod
+    def claim_next(cls) -> Optional['CubeImportJob']:
+        """
+        Marks the oldest queued job as running and returns it, or None if the queue is empty. The conditional update
+        makes sure that two workers never claim the same job.
+        """
+        cls.requeue_stale()
+        while True:
+            job = cls.objects.filter(status=cls.Status.QUEUED).order_by('created_at').first()
+            if job is None:
+                return None
+            now = timezone.now()
+            claimed = cls.objects \
+                .filter(id=job.id, status=cls.Status.QUEUED) \
+                .update(status=cls.Status.RUNNING, heartbeat_at=now, attempts=F('attempts') + 1)
+            if claimed == 1:
+                job.status = cls.Status.RUNNING
+                job.heartbeat_at = now
+                job.attempts += 1
+                return job
+
+    def run(self, workers: int = 1):
+        from .progress import publish_progress
+
+        def report(resolved: int, total: int):
+            self.resolved = resolved
+            self.total = total
+            self.heartbeat_at = timezone.now()
+            self.save(update_fields=['resolved', 'total', 'heartbeat_at'])
+            publish_progress(self)
+
+        publish_progress(self)
+        try:
+            self.cube.bulk_update(self.card_names.splitlines(), fetch=True, workers=workers, progress=report)
+        except Exception as e:
+            self.status = self.Status.FAILED
+            self.error = str(e) or e.__class__.__name__
+        else:
+            self.status = self.Status.DONE
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'error', 'finished_at'])
+        publish_progress(self)
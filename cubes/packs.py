@@ -0,0 +1,222 @@
+"""
+Pack generation that samples straight from (printing id, count) pairs.
+
+The pool is never expanded into one element per copy: a Fenwick tree over the counts picks a uniformly random
+remaining copy in O(log n) and takes it out of the pool, so memory grows with the number of distinct entries rather
+than with the number of copies, and a pack of k cards costs O(k log n).
+
+Balanced packs are built in three steps instead of by reshuffling until the packs look right. First the draft's cards
+are drawn color by color, in the same proportions as the cube (largest remainder rounding). Then they are sorted by
+color, type and rarity and dealt round-robin, which gives every pack either the floor or the ceiling of its share of
+each color, and spreads types and rarities within each color the same way. Dealing color by color can still leave a
+type several cards apart between packs, so last, cards of the same color are swapped between packs to even out the
+type counts of whole packs. That last step is an approximation (see _even_out_types).
+"""
+import random
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from cards.colors import COLOR_BITS
+
+RARITY_ORDER = {'mythic': 0, 'rare': 1, 'uncommon': 2, 'common': 3}
+# (printing id, count) or, for balanced packs, (printing id, count, color mask, category, rarity)
+PoolEntry = tuple
+
+
+class CopyPool(object):
+    """
+    A multiset of [items], where items[i] has counts[i] copies, that copies can be drawn from at random
+    """
+
+    def __init__(self, items: Sequence, counts: Sequence[int]):
+        self.items = items
+        self.size = len(counts)
+        self.total = 0
+        # tree[i] holds the sum of counts over (i - lowbit(i), i], 1-indexed
+        self.tree = [0] * (self.size + 1)
+        for index, count in enumerate(counts, start=1):
+            self.total += count
+            self.tree[index] += count
+            parent = index + (index & -index)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[index]
+        self._top = 1 << max(0, self.size.bit_length() - 1) if self.size > 0 else 0
+
+    def copy(self) -> 'CopyPool':
+        pool = CopyPool.__new__(CopyPool)
+        pool.items = self.items
+        pool.size = self.size
+        pool.total = self.total
+        pool.tree = list(self.tree)
+        pool._top = self._top
+        return pool
+
+    def _find(self, target: int) -> int:
+        """
+        The 1-indexed position of the copy with 0-based rank [target]
+        """
+        position = 0
+        step = self._top
+        tree = self.tree
+        while step > 0:
+            following = position + step
+            if following <= self.size and tree[following] <= target:
+                position = following
+                target -= tree[following]
+            step >>= 1
+        return position + 1
+
+    def _remove(self, position: int):
+        tree = self.tree
+        while position <= self.size:
+            tree[position] -= 1
+            position += position & -position
+        self.total -= 1
+
+    def draw(self, rng: random.Random):
+        position = self._find(rng.randrange(self.total))
+        self._remove(position)
+        return self.items[position - 1]
+
+    def draw_many(self, count: int, rng: random.Random) -> list:
+        return [self.draw(rng) for _ in range(count)]
+
+
+def color_group(mask: int) -> str:
+    """
+    The color a card is balanced under: its color, 'M' for multicolored or 'C' for colorless
+    """
+    if mask == 0:
+        return 'C'
+    if mask & (mask - 1):
+        return 'M'
+    return next(color for color, bit in COLOR_BITS.items() if bit == mask)
+
+
+def generate_packs(entries: Sequence[PoolEntry], pack_count: int, pack_size: int,
+                   rng: Optional[random.Random] = None, balanced: bool = False) -> List[List[int]]:
+    """
+    [pack_count] packs of [pack_size] printing ids drawn without replacement from [entries]. The caller checks that
+    the pool is large enough.
+    """
+    rng = rng or random.Random()
+    if balanced:
+        return _balanced_packs(_group_pools(entries), pack_count, pack_size, rng)
+    return _packs_from_pool(_pool(entries), pack_count, pack_size, rng)
+
+
+def generate_draft_packs(entries: Sequence[PoolEntry], draft_count: int, pack_count: int, pack_size: int,
+                         seed=None, balanced: bool = False) -> List[List[List[int]]]:
+    """
+    The packs of [draft_count] independent drafts of the same cube. The same [seed] always gives the same packs.
+    """
+    rng = random.Random(seed)
+    if balanced:
+        groups = _group_pools(entries)
+        return [_balanced_packs({group: (pool.copy(), keys) for group, (pool, keys) in groups.items()},
+                                pack_count, pack_size, rng)
+                for _ in range(draft_count)]
+    pool = _pool(entries)
+    return [_packs_from_pool(pool.copy(), pack_count, pack_size, rng) for _ in range(draft_count)]
+
+
+def _pool(entries: Sequence[PoolEntry]) -> CopyPool:
+    return CopyPool([entry[0] for entry in entries], [entry[1] for entry in entries])
+
+
+def _packs_from_pool(pool: CopyPool, pack_count: int, pack_size: int, rng: random.Random) -> List[List[int]]:
+    return [pool.draw_many(pack_size, rng) for _ in range(pack_count)]
+
+
+def _group_pools(entries: Sequence[PoolEntry]) -> Dict[str, Tuple[CopyPool, Dict[int, tuple]]]:
+    """
+    One pool per color group, plus the (category, rarity) sort key of every printing in it
+    """
+    grouped: Dict[str, List[PoolEntry]] = {}
+    for entry in entries:
+        grouped.setdefault(color_group(entry[2]), []).append(entry)
+    return {
+        group: (_pool(group_entries),
+                {entry[0]: (entry[3], RARITY_ORDER.get(entry[4], len(RARITY_ORDER))) for entry in group_entries})
+        for group, group_entries in sorted(grouped.items())
+    }
+
+
+def _quotas(sizes: Dict[str, int], wanted: int, rng: random.Random) -> Dict[str, int]:
+    """
+    Splits [wanted] cards over the groups in proportion to their [sizes], rounding by largest remainder
+    """
+    total = sum(sizes.values())
+    quotas = {group: wanted * size // total for group, size in sizes.items()}
+    remainders = sorted(sizes, key=lambda group: (-(wanted * sizes[group] % total), rng.random()))
+    for group in remainders[:wanted - sum(quotas.values())]:
+        quotas[group] += 1
+    return quotas
+
+
+def _balanced_packs(groups: Dict[str, Tuple[CopyPool, Dict[int, tuple]]], pack_count: int, pack_size: int,
+                    rng: random.Random) -> List[List[int]]:
+    quotas = _quotas({group: pool.total for group, (pool, _) in groups.items()}, pack_count * pack_size, rng)
+    drawn = []
+    for group, (pool, keys) in groups.items():
+        for printing_id in pool.draw_many(quotas[group], rng):
+            drawn.append(((group, *keys[printing_id], rng.random()), printing_id))
+    drawn.sort()
+    dealt = [[] for _ in range(pack_count)]
+    for index, (key, printing_id) in enumerate(drawn):
+        dealt[index % pack_count].append((key[0], key[1], printing_id))
+    _even_out_types(dealt)
+    packs = [[printing_id for _, _, printing_id in pack] for pack in dealt]
+    # Dealing always starts at the first pack, so hide which pack got the head of every color
+    rng.shuffle(packs)
+    for pack in packs:
+        rng.shuffle(pack)
+    return packs
+
+
+def _even_out_types(packs: List[List[Tuple[str, str, int]]]):
+    """
+    Swaps (color group, category, printing id) cards of the same color group between [packs] wherever one pack has at
+    least two more cards of a type than another, as long as the swap doesn't spread out the other type involved.
+    Color counts are unchanged, and every swap lowers the sum of the squared type counts, so this always ends.
+
+    This approximates per-type quotas rather than enforcing them: it is a local search, not an exact solver. Nearly
+    every draft ends with each pack holding the floor or ceiling of each type's share, but when no swap within one
+    color helps, a type can be left a card over its quota in some pack.
+    """
+    counts = [Counter(category for _, category, _ in pack) for pack in packs]
+    categories = sorted({category for pack_counts in counts for category in pack_counts})
+    improved = True
+    while improved:
+        improved = False
+        for category in categories:
+            order = sorted(range(len(packs)), key=lambda pack: counts[pack][category])
+            for high in reversed(order):
+                for low in order:
+                    if counts[high][category] - counts[low][category] < 2:
+                        break
+                    if _swap_type(packs, counts, high, low, category):
+                        improved = True
+                        break
+                if improved:
+                    break
+
+
+def _swap_type(packs, counts: List[Counter], high: int, low: int, category: str) -> bool:
+    """
+    Moves a card of [category] from pack [high] to pack [low] in exchange for one of the same color and another type
+    that [high] has fewer of, if there is such a pair
+    """
+    for i, (group, card_category, _) in enumerate(packs[high]):
+        if card_category != category:
+            continue
+        for j, (other_group, other_category, _) in enumerate(packs[low]):
+            if other_group == group and other_category != category \
+                    and counts[high][other_category] < counts[low][other_category]:
+                packs[high][i], packs[low][j] = packs[low][j], packs[high][i]
+                counts[high][category] -= 1
+                counts[low][category] += 1
+                counts[high][other_category] += 1
+                counts[low][other_category] -= 1
+                return True
+    return False
@@ -0,0 +1,27 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+def job_group(job_id) -> str:
+    return f'cube-import-{job_id}'
+
+
+def publish_progress(job):
+    """
+    Sends the state of [job] to every browser watching it. The job row stays the source of truth, so a channel layer
+    that can't be reached only costs the live updates.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(job_group(job.id), {
+            'type': 'job.progress',
+            'job': job.as_message(),
+        })
+    except Exception:
+        logger.warning('Could not publish progress of cube import %s', job.id, exc_info=True)
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/cubes/imports/<uuid:job_id>/', consumers.CubeImportConsumer.as_asgi()),
+]
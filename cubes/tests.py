@@ -1,7 +1,28 @@
+import datetime
+import random
+import time
+import uuid
+from collections import Counter
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
-from cubes.models import Cube
+from cubes import cube_inspect
+from cards.models import Card, MagicSet, Printing
+from cubes.models import MAX_JOB_ATTEMPTS, STALE_JOB_TIMEOUT, Cube, CubeImportJob, CubeNotLargeEnoughException
+from cubes.packs import CopyPool, color_group, generate_draft_packs
+from cubes.progress import job_group
+from scryfall.client import ScryfallClient
+from scryfall.standin import StandinServer
 
 sample_data = """Command Beacon
 Ojutai's Command
@@ -88,7 +109,266 @@ class CubeTestCase(TestCase):
         self.cube.bulk_update(sample_data)
         self.assertEqual(len(sample_data), self.cube.calculate_size())
 
+    def test_bulk_update_only_writes_changes(self):
+        self.cube.bulk_update(sample_data)
+        entry_ids = dict(self.cube.entries.values_list('printing__card__name', 'id'))
+
+        with CaptureQueriesContext(connection) as context:
+            self.cube.bulk_update(sample_data[1:] + ['Austere Command', 'Torrent Elemental', 'Shock'])
+        writes = [query['sql'] for query in context.captured_queries
+                  if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')) and 'cubes_cubeentry' in query['sql']]
+        self.assertEqual(3, len(writes))
+
+        counts = dict(self.cube.entries.values_list('printing__card__name', 'count'))
+        self.assertNotIn('Command Beacon', counts)
+        self.assertEqual((2, 2, 1), (counts['Austere Command'], counts['Torrent Elemental'], counts['Shock']))
+        self.assertEqual(entry_ids['Austere Command'], self.cube.entries.get(printing__card__name='Austere Command').id)
+        self.assertEqual(len(sample_data) + 2, self.cube.calculate_size())
+
     def test_pack_generation(self):
         self.cube.bulk_update(sample_data)
         packs = self.cube.generate_packs()
         self.assertIsNotNone(packs)
+
+    def test_seeded_packs_respect_counts(self):
+        self.cube.bulk_update(sample_data[:10] * 5)
+        self.assertEqual(50, self.cube.calculate_size())
+        packs = self.cube.generate_packs(pack_count=2, pack_size=25, seed=7)
+        self.assertEqual(packs, self.cube.generate_packs(pack_count=2, pack_size=25, seed=7))
+        self.assertEqual(dict(self.cube.pack_pool()), Counter(printing for pack in packs for printing in pack))
+
+        drafts = self.cube.generate_draft_packs(3, pack_count=1, pack_size=15, seed=7)
+        self.assertEqual(3, len(drafts))
+        self.assertEqual([15], [len(pack) for pack in drafts[2]])
+        with self.assertRaises(CubeNotLargeEnoughException):
+            self.cube.generate_packs(pack_count=4, pack_size=15)
+
+    def test_balanced_packs_use_card_colors(self):
+        self.cube.bulk_update(sample_data)
+        self.cube.balanced_packs = True
+        colors = {entry[0]: entry[2] for entry in self.cube.pack_pool(balanced=True)}
+        packs = self.cube.generate_packs(pack_count=3, pack_size=10, seed=1)
+        self.assertEqual(packs, self.cube.generate_packs(pack_count=3, pack_size=10, seed=1, balanced=True))
+        multicolored = [sum(1 for printing in pack if color_group(colors[printing]) == 'M') for pack in packs]
+        self.assertLessEqual(max(multicolored) - min(multicolored), 1)
+
+    def test_owners_can_balance_packs(self):
+        url = reverse('cube-edit', args=[self.cube.id])
+        self.client.force_login(self.owner)
+        self.assertContains(self.client.get(self.cube.get_absolute_url()), url)
+        response = self.client.post(url, {
+            'name': 'Test Cube', 'default_pack_count': 3, 'default_pack_size': 15, 'balanced_packs': 'on',
+        })
+        self.assertRedirects(response, self.cube.get_absolute_url())
+        self.cube.refresh_from_db()
+        self.assertTrue(self.cube.balanced_packs)
+
+        self.client.force_login(User.objects.create_user('drafter'))
+        self.assertNotContains(self.client.get(self.cube.get_absolute_url()), url)
+        self.assertEqual(404, self.client.post(url, {'name': 'Stolen Cube'}).status_code)
+        self.assertEqual(404, self.client.get(url).status_code)
+
+    def test_detail_reads_cards_from_cache(self):
+        self.cube.bulk_update(['Austere Command', 'Lightning Bolt'])
+        self.client.get(self.cube.get_absolute_url())
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.cube.get_absolute_url())
+        self.assertContains(response, 'Lightning Bolt')
+        self.assertEqual([], [query for query in context.captured_queries if 'cards_' in query['sql']])
+
+    def test_search_is_scoped_to_the_cube(self):
+        magic_set = MagicSet.objects.create(id=uuid.uuid4(), code='cmr', name='Commander Legends',
+                                            released_at=datetime.date(2020, 11, 20))
+        printings = {}
+        for name, mana_cost in (('Goblin Guide', '{R}'), ('Raging Goblin', '{R}'), ('Hellrider', '{2}{R}{R}')):
+            card = Card(id=uuid.uuid4(), name=name, mana_cost=mana_cost, type_line='Creature', color_indicator='')
+            card.derive_attributes()
+            card.save()
+            printings[name] = Printing.objects.create(card=card, magic_set=magic_set, image_url='https://example.com/')
+        self.cube.entries.create(printing=printings['Goblin Guide'])
+        self.cube.entries.create(printing=printings['Hellrider'])
+
+        entries = self.cube.search('t:creature c:r mv<=2 s:cmr')
+        self.assertEqual(['Goblin Guide'], [entry.get_card_name() for entry in entries])
+
+
+class CubeInspectionTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.server = StandinServer().start()
+        self.settings = override_settings(SCRYFALL_API_URL=self.server.url, CUBECOBRA_URL=self.server.url)
+        self.settings.enable()
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.server.stop()
+
+    def test_inspect_set_cube(self):
+        results = cube_inspect.inspect_cubecobra_set_cube('sample', ['khm', 'cmr'])
+        self.assertEqual(['Lightning Bolt'], results.duplicates)
+        self.assertEqual([], results.not_present)
+
+    def test_set_inspection_view_downloads_every_set(self):
+        response = self.client.get(reverse('inspect-cube-set', args=['sample', 'khm+cmr']))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['Lightning Bolt'], response.context['duplicates'])
+        searches = [request for request in self.server.requests if request.startswith('GET /cards/search')]
+        self.assertEqual(2, len(searches))
+
+    def test_untap_export_skips_maybeboard(self):
+        result = cube_inspect.cubecobra_to_untap('sample')
+        self.assertEqual('1 Austere Command (cmr)\n1 Valki, God of Lies (khm)', result)
+
+
+class PackSamplingTestCase(TestCase):
+
+    def test_pool_draws_every_copy_once(self):
+        counts = [3, 0, 1, 7, 2, 5]
+        pool = CopyPool(list('abcdef'), counts)
+        drawn = pool.draw_many(sum(counts), random.Random(1))
+        self.assertEqual({'a': 3, 'c': 1, 'd': 7, 'e': 2, 'f': 5}, Counter(drawn))
+        self.assertEqual(0, pool.total)
+
+    def test_draws_are_uniform_over_copies(self):
+        rng = random.Random(3)
+        first_draws = Counter(CopyPool(['rare', 'common'], [1, 9]).draw(rng) for _ in range(5000))
+        self.assertAlmostEqual(0.1, first_draws['rare'] / 5000, delta=0.02)
+
+    def test_drafts_are_independent_and_seeded(self):
+        entries = [(printing_id, 4) for printing_id in range(100)]
+        drafts = generate_draft_packs(entries, 2, 3, 15, seed='pod')
+        self.assertEqual(drafts, generate_draft_packs(entries, 2, 3, 15, seed='pod'))
+        self.assertNotEqual(drafts[0], drafts[1])
+        self.assertNotEqual(drafts, generate_draft_packs(entries, 2, 3, 15, seed='other pod'))
+
+    def balanced_cube(self):
+        # A 540 card cube: 80 cards of each color, 90 multicolored and 50 colorless, with a mix of types and rarities
+        entries = []
+        for group, mask, size in [('W', 1, 80), ('U', 2, 80), ('B', 4, 80), ('R', 8, 80), ('G', 16, 80),
+                                  ('M', 3, 90), ('C', 0, 50)]:
+            for index in range(size):
+                entries.append((f'{group}{index}', 1, mask, 'CL'[index % 2], ['common', 'rare'][index % 3 == 0]))
+        return entries
+
+    def test_balanced_packs_split_colors_evenly(self):
+        entries = self.balanced_cube()
+        groups = {entry[0]: color_group(entry[2]) for entry in entries}
+        packs = generate_draft_packs(entries, 1, 24, 15, seed=7, balanced=True)[0]
+
+        self.assertEqual([15] * 24, [len(pack) for pack in packs])
+        drawn = [card for pack in packs for card in pack]
+        self.assertEqual(len(drawn), len(set(drawn)))
+        totals = Counter(groups[card] for card in drawn)
+        for pack in packs:
+            counts = Counter(groups[card] for card in pack)
+            for group, total in totals.items():
+                self.assertIn(counts[group], (total // 24, -(-total // 24)))
+
+    def test_balanced_packs_spread_types(self):
+        # Each color leans towards different types, so dealing colors evenly alone clumps the types together
+        entries = []
+        for group, mask, categories in [('W', 1, 'CCCCL'), ('U', 2, 'IIISC'), ('B', 4, 'SSCCL'), ('R', 8, 'IISSC'),
+                                        ('G', 16, 'CCCCC'), ('M', 3, 'CCLLP'), ('C', 0, 'AAALL')]:
+            for index in range(80):
+                entries.append((f'{group}{index}', 1, mask, categories[index % 5], 'common'))
+        categories = {entry[0]: entry[3] for entry in entries}
+        for packs in generate_draft_packs(entries, 20, 24, 15, seed='types', balanced=True):
+            for category in 'CILSAP':
+                counts = [sum(1 for card in pack if categories[card] == category) for pack in packs]
+                # An approximation of per-type quotas, which may leave a type one card over
+                self.assertLessEqual(max(counts) - min(counts), 2)
+
+    def test_balanced_packs_are_seeded_and_fast(self):
+        entries = self.balanced_cube()
+        started = time.perf_counter()
+        drafts = generate_draft_packs(entries, 10, 24, 15, seed='pod', balanced=True)
+        self.assertLess((time.perf_counter() - started) / 10, 0.05)
+        self.assertEqual(drafts, generate_draft_packs(entries, 10, 24, 15, seed='pod', balanced=True))
+        self.assertNotEqual(drafts[0], drafts[1])
+
+    def test_color_groups(self):
+        self.assertEqual(['C', 'W', 'G', 'M'], [color_group(mask) for mask in (0, 1, 16, 24)])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class CubeImportJobTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.server = StandinServer().start()
+        self.patch = patch.object(Card.objects, 'scryfall', ScryfallClient(base_url=self.server.url))
+        self.patch.start()
+        self.owner = User.objects.create_user('cubeowner')
+        self.cube = Cube.objects.create(name='Test Cube', owner=self.owner)
+
+    def tearDown(self) -> None:
+        self.patch.stop()
+        self.server.stop()
+
+    def run_worker(self):
+        call_command('runcubeimports', '--once', '--workers', '1', stdout=StringIO())
+
+    def test_bulk_update_returns_a_job(self):
+        response = self.client.post(f'/cubes/{self.cube.id}/bulk-update', {'bulk_content': 'Austere Command'})
+        job = CubeImportJob.objects.get()
+        self.assertRedirects(response, job.get_absolute_url())
+        self.assertEqual(CubeImportJob.Status.QUEUED, job.status)
+        self.assertEqual(0, self.cube.entries.count())
+        self.assertContains(self.client.get(job.get_absolute_url()), 'Queued')
+
+    def test_worker_runs_jobs_and_publishes_progress(self):
+        job = CubeImportJob.objects.create(cube=self.cube,
+                                           card_names='Austere Command\nValki, God of Lies\nAustere Command')
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(job_group(job.id), channel)
+
+        self.run_worker()
+
+        job.refresh_from_db()
+        self.assertEqual((CubeImportJob.Status.DONE, 2, 2), (job.status, job.resolved, job.total))
+        self.assertEqual({'Austere Command': 2, 'Valki, God of Lies // Tibalt, Cosmic Impostor': 1},
+                         dict(self.cube.entries.values_list('printing__card__name', 'count')))
+        messages = []
+        while True:
+            message = async_to_sync(channel_layer.receive)(channel)
+            messages.append(message['job'])
+            if message['job']['finished']:
+                break
+        self.assertEqual('Running', messages[0]['status'])
+        self.assertEqual({'status': 'Done', 'resolved': 2, 'total': 2, 'finished': True, 'error': ''}, messages[-1])
+
+    def test_failed_job_does_not_stop_the_queue(self):
+        failing = CubeImportJob.objects.create(cube=self.cube, card_names='Not A Real Card')
+        other_cube = Cube.objects.create(name='Other Cube', owner=self.owner)
+        working = CubeImportJob.objects.create(cube=other_cube, card_names='Austere Command')
+
+        self.run_worker()
+
+        failing.refresh_from_db()
+        working.refresh_from_db()
+        self.assertEqual(CubeImportJob.Status.FAILED, failing.status)
+        self.assertNotEqual('', failing.error)
+        self.assertEqual(CubeImportJob.Status.DONE, working.status)
+        self.assertIsNone(CubeImportJob.claim_next())
+
+    def test_jobs_of_dead_workers_are_requeued(self):
+        job = CubeImportJob.objects.create(cube=self.cube, card_names='Austere Command')
+        self.assertEqual(job, CubeImportJob.claim_next())
+        self.assertIsNone(CubeImportJob.claim_next())
+
+        # The worker died without finishing the job
+        stale = timezone.now() - STALE_JOB_TIMEOUT - datetime.timedelta(seconds=1)
+        CubeImportJob.objects.filter(id=job.id).update(heartbeat_at=stale)
+        self.run_worker()
+
+        job.refresh_from_db()
+        self.assertEqual((CubeImportJob.Status.DONE, 2), (job.status, job.attempts))
+        self.assertEqual(1, self.cube.entries.count())
+
+    def test_jobs_that_keep_killing_workers_fail(self):
+        stale = timezone.now() - STALE_JOB_TIMEOUT - datetime.timedelta(seconds=1)
+        job = CubeImportJob.objects.create(cube=self.cube, card_names='Austere Command', heartbeat_at=stale,
+                                           status=CubeImportJob.Status.RUNNING, attempts=MAX_JOB_ATTEMPTS)
+        self.assertIsNone(CubeImportJob.claim_next())
+        job.refresh_from_db()
+        self.assertEqual(CubeImportJob.Status.FAILED, job.status)
@@ -4,7 +4,9 @@ from . import views
 
 urlpatterns = [
     path('<uuid:cube_id>/', include([
+        path('edit', views.cube_edit, name='cube-edit'),
         path('bulk-update', views.cube_bulk_update, name='cube-bulk-update'),
+        path('imports/<uuid:job_id>/', views.cube_import_job, name='cube-import-job'),
         path('create-draft', views.cube_create_draft, name='cube-create-draft'),
         path('', views.cube_detail, name='cube-detail'),
     ])),
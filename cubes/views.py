@@ -4,9 +4,10 @@ from django.http import HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 
+from cards.cache import attach_printings
 from drafts.models import Draft
-from .forms import CubeBulkUpdateForm, CubeInspectionForm
-from .models import Cube
+from .forms import CubeBulkUpdateForm, CubeInspectionForm, CubeSettingsForm
+from .models import Cube, CubeImportJob
 
 
 def cube_list(request):
@@ -20,14 +21,42 @@ def cube_list(request):
 
 
 def cube_detail(request, cube_id):
-    queryset = Cube.objects.prefetch_related('entries', 'entries__printing', 'entries__printing__card')
-    cube = get_object_or_404(queryset, id=cube_id)
+    cube = get_object_or_404(Cube.objects.prefetch_related('entries'), id=cube_id)
+    attach_printings(cube.entries.all())
     show_draft_button = not request.user.is_anonymous
     draft_url = reverse('cube-create-draft', args=[cube.id])
+    show_edit_button = cube.owner_id == request.user.id
+    edit_url = reverse('cube-edit', args=[cube.id])
     return render(request, 'cubes/detail.html', {
         'cube': cube,
         'show_draft_button': show_draft_button,
         'draft_url': draft_url,
+        'show_edit_button': show_edit_button,
+        'edit_url': edit_url,
+    })
+
+
+def cube_edit(request, cube_id):
+    # Only the owner may change a cube's settings
+    cube = get_object_or_404(Cube, id=cube_id, owner_id=request.user.id)
+    if request.method == 'POST':
+        form = CubeSettingsForm(request.POST, instance=cube)
+        if form.is_valid():
+            form.save()
+            return redirect(cube)
+    else:
+        form = CubeSettingsForm(instance=cube)
+    return render(request, 'cubes/edit.html', {
+        'cube': cube,
+        'form': form,
+    })
+
+
+def cube_import_job(request, cube_id, job_id):
+    job = get_object_or_404(CubeImportJob.objects.select_related('cube'), id=job_id, cube_id=cube_id)
+    return render(request, 'cubes/import_job.html', {
+        'cube': job.cube,
+        'job': job,
     })
 
 
@@ -46,10 +75,12 @@ def cube_bulk_update(request, cube_id):
     if request.method == 'POST':
         form = CubeBulkUpdateForm(request.POST)
         if form.is_valid():
-            content = form.cleaned_data['bulk_content']
-            lines = content.splitlines()
-            cube.bulk_update(lines, fetch=True)
-            return redirect(cube)
+            job = CubeImportJob.objects.create(
+                cube=cube,
+                requested_by=None if request.user.is_anonymous else request.user,
+                card_names=form.cleaned_data['bulk_content'],
+            )
+            return redirect(job)
     else:
         form = CubeBulkUpdateForm()
     return render(request, 'cubes/update.html', {
@@ -204,7 +204,7 @@ class PackEntry(models.Model):
     printing = models.ForeignKey(Printing, on_delete=models.CASCADE)
 
     def get_image_url(self):
-        return self.image_url
+        return self.printing.get_image_url()
 
     def display_name(self):
         return self.name
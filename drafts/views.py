@@ -4,6 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse
 from django.shortcuts import render, get_object_or_404, reverse, redirect
 
+from cards.cache import attach_printings
 from core.http import inspectable_redirect
 from .models import Draft, DraftEntry, DraftSeat
 
@@ -44,12 +45,15 @@ def draft_detail(request, draft_id: uuid):
             })
         seat = draft.get_seat_for_user(request.user)
         current_pack = seat.get_current_pack()
+        pack_entries = list(current_pack.entries.all()) if current_pack else []
+        attach_printings(pack_entries)
         pack_count = seat.get_pack_count()
         is_complete = draft.current_round > 3
         seats = [seat.short_display_name() for seat in draft.seats.order_by('position')]
         return render(request, 'drafts/pick.html', {
             'draft': draft,
             'pack': current_pack,
+            'pack_entries': pack_entries,
             'pack_count': pack_count,
             'picks': seat.picks,
             'total_rounds': 3,
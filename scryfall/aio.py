@@ -0,0 +1,60 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from .client import CardCollection, ScryfallClient
+from .models import ScryfallCard, ScryfallSet
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class AsyncScryfallClient(object):
+    """
+    asyncio counterpart of ScryfallClient with the same lookup methods.
+
+    Requests run on a dedicated thread pool over the wrapped client's pooled session, so awaiting them never
+    blocks the event loop. The pool's [max_concurrency] threads bound how many of this client's requests are in
+    flight, on any number of event loops, and every request still passes through the process-wide rate limiter and
+    the wrapped client's retry handling.
+    """
+
+    def __init__(self, client: Optional[ScryfallClient] = None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.client = client or ScryfallClient()
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='scryfall')
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def get_set(self, code) -> ScryfallSet:
+        return await self._run(self.client.get_set, code)
+
+    async def get_sets(self) -> List[ScryfallSet]:
+        return await self._run(self.client.get_sets)
+
+    async def get_card_by_name_fuzzy(self, name: str) -> ScryfallCard:
+        return await self._run(self.client.get_card_by_name_fuzzy, name)
+
+    async def get_cards_for_set_code(self, code) -> List[ScryfallCard]:
+        return await self._run(self.client.get_cards_for_set_code, code)
+
+    async def get_cards_by_names(self, names: Iterable[str]) -> CardCollection:
+        return await self._run(self.client.get_cards_by_names, list(names))
+
+    async def get_cards_by_name_fuzzy(self, names: Iterable[str]) -> Dict[str, ScryfallCard]:
+        """
+        Runs fuzzy lookups for all of [names] concurrently, returning the results keyed by name
+        """
+        names = list(dict.fromkeys(names))
+        cards = await asyncio.gather(*(self.get_card_by_name_fuzzy(name) for name in names))
+        return dict(zip(names, cards))
+
+    async def get_cards_for_set_codes(self, codes: Iterable[str]) -> Dict[str, List[ScryfallCard]]:
+        codes = list(dict.fromkeys(codes))
+        results = await asyncio.gather(*(self.get_cards_for_set_code(code) for code in codes))
+        return dict(zip(codes, results))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
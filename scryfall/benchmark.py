@@ -0,0 +1,67 @@
+"""
+Measures how quickly Scryfall payloads are turned into ScryfallCard objects.
+
+    python -m scryfall.benchmark [payload.json] [--objects N]
+
+The payload may be a recorded /cards/search page or a bulk data file; by default the recorded search page in
+scryfall/fixtures is used. Its cards are decoded repeatedly until N objects have been produced.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from dataclasses_json.core import _decode_dataclass
+
+from .models import ScryfallCard
+
+DEFAULT_PAYLOAD = Path(__file__).resolve().parent / 'fixtures' / 'cards_search.json'
+
+
+def load_payload(path) -> list:
+    with open(path, encoding='utf-8') as f:
+        payload = json.load(f)
+    if isinstance(payload, dict):
+        return payload['data']
+    return payload
+
+
+def measure(decode, items, count) -> float:
+    repeats = max(1, count // len(items))
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for item in items:
+            decode(item)
+    return repeats * len(items) / (time.perf_counter() - started)
+
+
+def bytes_per_object(decode, items, count) -> float:
+    repeats = max(1, count // len(items))
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    kept = [decode(item) for _ in range(repeats) for item in items]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / len(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('payload', nargs='?', default=DEFAULT_PAYLOAD)
+    parser.add_argument('--objects', type=int, default=20000)
+    args = parser.parse_args()
+
+    items = load_payload(args.payload)
+    decoders = [
+        ('dataclasses_json', lambda item: _decode_dataclass(ScryfallCard, item, False)),
+        ('compiled', ScryfallCard.from_dict),
+    ]
+    for label, decode in decoders:
+        rate = measure(decode, items, args.objects)
+        size = bytes_per_object(decode, items, min(args.objects, 5000))
+        print(f'{label:>16}: {rate:10.0f} objects/sec, {size:6.0f} bytes/object')
+
+
+if __name__ == '__main__':
+    main()
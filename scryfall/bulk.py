@@ -0,0 +1,88 @@
+import gzip
+import json
+from typing import IO, Iterator
+
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = ' \t\n\r'
+
+
+def open_bulk_file(path) -> IO[str]:
+    path = str(path)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+class _BulkReader(object):
+    """
+    A window of [chunk_size] characters onto [fp], read on as values need it
+    """
+
+    def __init__(self, fp: IO[str], chunk_size: int):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self.fp.read(self.chunk_size)
+        if chunk == '':
+            self.eof = True
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+    def next_character(self) -> str:
+        """
+        The next character that isn't whitespace, without consuming it
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in _WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError('Unexpected end of bulk data file')
+            self.fill()
+
+    def decode(self):
+        """
+        Consumes the JSON value starting at the current position
+        """
+        while True:
+            try:
+                item, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            if end == len(self.buffer) and not self.eof:
+                # A value ending exactly at the buffer boundary may have been truncated, so read on before trusting it
+                self.fill()
+                continue
+            self.position = end
+            return item
+
+
+def iter_bulk_objects(fp: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Incrementally parses a Scryfall bulk data file (one large JSON array) and yields each element.
+
+    Only the current chunk and the object being decoded are held in memory, so this is safe to use on the
+    multi-hundred megabyte default_cards / all_cards files.
+    """
+    reader = _BulkReader(fp, chunk_size)
+    if reader.next_character() != '[':
+        raise ValueError('Bulk data file does not contain a JSON array')
+    reader.position += 1
+    while True:
+        character = reader.next_character()
+        if character == ']':
+            return
+        if character == ',':
+            reader.position += 1
+            continue
+        yield reader.decode()
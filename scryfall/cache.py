@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from .conf import get_setting
+
+DAY = 24 * 60 * 60
+
+# Matched in order against the full URL; the first pattern that matches decides how long a response stays fresh
+DEFAULT_TTLS: List[Tuple[str, int]] = [
+    (r'/cube/download/', 60 * 60),
+    (r'/cards/named', 7 * DAY),
+    (r'/cards/search', DAY),
+    (r'/sets', DAY),
+]
+DEFAULT_TTL = DAY
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    stored_at: float
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get('ETag')
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.headers.get('Last-Modified')
+
+    def is_fresh(self, ttl: int) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    def to_response(self, url: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers.update(self.headers)
+        response._content = self.body
+        response.encoding = 'utf-8'
+        return response
+
+    @classmethod
+    def from_response(cls, response: requests.Response) -> 'CacheEntry':
+        headers = {}
+        for header in ('ETag', 'Last-Modified', 'Content-Type'):
+            value = response.headers.get(header)
+            if value is not None:
+                headers[header] = value
+        return cls(body=response.content, stored_at=time.time(), headers=headers)
+
+
+class ResponseCache(object):
+    """
+    Base class for response caches. Subclasses decide where entries are stored.
+    """
+
+    def __init__(self, ttls: Optional[List[Tuple[str, int]]] = None, default_ttl: int = DEFAULT_TTL):
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in (ttls if ttls is not None else DEFAULT_TTLS)]
+        self.default_ttl = default_ttl
+
+    def ttl_for(self, url: str) -> int:
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        raise NotImplementedError()
+
+    def set(self, url: str, entry: CacheEntry):
+        raise NotImplementedError()
+
+
+class DiskCache(ResponseCache):
+    """
+    Stores one file per URL under [directory], evicting the least recently used files once the total size
+    exceeds [max_bytes].
+    """
+
+    def __init__(self, directory, max_bytes: int = DEFAULT_MAX_BYTES, **kwargs):
+        super().__init__(**kwargs)
+        # Created on the first write, so that a cache nobody writes to leaves nothing behind
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._size = None
+
+    def path_for(self, url: str) -> Path:
+        return self.directory / hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        path = self.path_for(url)
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if header.get('url') != url:
+            return None
+        # Touch the file so that eviction sees it as recently used
+        os.utime(path)
+        return CacheEntry(body=body, stored_at=header['stored_at'], headers=header['headers'])
+
+    def set(self, url: str, entry: CacheEntry):
+        path = self.path_for(url)
+        header = json.dumps({'url': url, 'stored_at': entry.stored_at, 'headers': entry.headers})
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header.encode('utf-8'))
+            f.write(b'\n')
+            f.write(entry.body)
+        previous_size = path.stat().st_size if path.exists() else 0
+        os.replace(temp_path, path)
+        if self._size is not None:
+            self._size += path.stat().st_size - previous_size
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def _files(self):
+        if not self.directory.is_dir():
+            return []
+        return [path for path in self.directory.iterdir() if path.is_file() and not path.name.startswith('.')]
+
+    def size(self) -> int:
+        if self._size is None:
+            self._size = sum(path.stat().st_size for path in self._files())
+        return self._size
+
+    def evict(self):
+        files = sorted(((path.stat(), path) for path in self._files()), key=lambda item: item[0].st_mtime)
+        size = sum(stat.st_size for stat, _ in files)
+        for stat, path in files:
+            if size <= self.max_bytes:
+                break
+            path.unlink()
+            size -= stat.st_size
+        self._size = size
+
+
+_default_caches: Dict[Tuple[str, int], DiskCache] = {}
+_default_caches_lock = threading.Lock()
+
+
+def default_cache() -> Optional[ResponseCache]:
+    """
+    Returns the process-wide disk cache at settings.HTTP_CACHE_DIR, or None if settings.HTTP_CACHE is off
+    """
+    enabled = get_setting('HTTP_CACHE', False) in (True, '1')
+    directory = get_setting('HTTP_CACHE_DIR')
+    if not enabled or not directory:
+        return None
+    max_bytes = int(get_setting('HTTP_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+    key = (str(directory), max_bytes)
+    with _default_caches_lock:
+        cache = _default_caches.get(key)
+        if cache is None:
+            cache = _default_caches[key] = DiskCache(directory, max_bytes=max_bytes)
+    return cache
+
+
+def cached_get(send: Callable[..., requests.Response], url: str, cache: Optional[ResponseCache],
+               **kwargs) -> requests.Response:
+    """
+    GETs [url] with [send], serving fresh responses straight from [cache] and revalidating stale ones with
+    If-None-Match / If-Modified-Since
+    """
+    if cache is None:
+        return send(url, **kwargs)
+    entry = cache.get(url)
+    if entry is not None and entry.is_fresh(cache.ttl_for(url)):
+        return entry.to_response(url)
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    if entry is not None:
+        if entry.etag is not None:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified is not None:
+            headers['If-Modified-Since'] = entry.last_modified
+    response = send(url, headers=headers, **kwargs)
+
+    if response.status_code == 304 and entry is not None:
+        entry.stored_at = time.time()
+        cache.set(url, entry)
+        return entry.to_response(url)
+    if response.status_code == 200:
+        cache.set(url, CacheEntry.from_response(response))
+    return response
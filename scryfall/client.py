@@ -1,47 +1,143 @@
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 
+from .cache import ResponseCache, cached_get, default_cache
+from .conf import get_setting
 from .models import ScryfallCard, ScryfallSet
+from .throttle import TokenBucket
+
+DEFAULT_BASE_URL = 'https://api.scryfall.com'
+# Scryfall asks clients to stay below 10 requests per second: https://scryfall.com/docs/api
+REQUESTS_PER_SECOND = 10
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+DEFAULT_TIMEOUT = (3.05, 30)
+# The maximum number of identifiers accepted by a single /cards/collection request
+COLLECTION_CHUNK_SIZE = 75
+
+# Shared by every client in the process so that the limit holds no matter how many clients are created
+shared_rate_limiter = TokenBucket(rate=REQUESTS_PER_SECOND)
+
+
+def create_session(pool_size: int = REQUESTS_PER_SECOND) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Accept': 'application/json',
+        'User-Agent': 'MagicWithFriends',
+    })
+    return session
+
+
+@dataclass
+class CardCollection:
+    found: Dict[str, ScryfallCard] = field(default_factory=dict)
+    not_found: List[str] = field(default_factory=list)
 
 
 class ScryfallClient(object):
-    __BASE_URL = 'https://api.scryfall.com'
 
-    def __init__(self):
-        pass
+    def __init__(self,
+                 session: Optional[requests.Session] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 max_retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 timeout=DEFAULT_TIMEOUT,
+                 cache: Optional[ResponseCache] = None,
+                 base_url: Optional[str] = None):
+        # Without one, settings.SCRYFALL_API_URL is read on every request
+        self._base_url = base_url
+        self.session = session or create_session()
+        # Without one, the default cache is looked up on every request so that it follows the settings
+        self.cache = cache
+        self.rate_limiter = rate_limiter or shared_rate_limiter
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+
+    @property
+    def base_url(self) -> str:
+        return (self._base_url or get_setting('SCRYFALL_API_URL') or DEFAULT_BASE_URL).rstrip('/')
 
     def expand_url(self, url):
-        return self.__BASE_URL + url
+        return self.base_url + url
+
+    def retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after is not None and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff_factor * (2 ** attempt)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Performs a rate limited request over the pooled session, retrying 429s, 5xxs and connection failures
+        with exponential backoff
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+            time.sleep(self.retry_delay(attempt, response))
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        cache = self.cache if self.cache is not None else default_cache()
+        return cached_get(lambda u, **kw: self.request('GET', u, **kw), url, cache, **kwargs)
 
     def fetch_one(self, cls, url):
         if not hasattr(cls, 'from_dict'):
             raise AttributeError(f'{cls} has no attribute "from_dict"')
-        response = requests.get(self.expand_url(url))
+        response = self.get(self.expand_url(url))
         if response.status_code != 200:
             raise RuntimeError(f'Received a non-200 response from Scryfall: {response.content}')
         json = response.json()
         return cls.from_dict(json)
 
-    def fetch_many(self, cls, url):
+    def fetch_page(self, url, allow_empty: bool = False) -> dict:
+        response = self.get(url)
+        if response.status_code == 404 and allow_empty:
+            # Searches that match nothing are answered with a 404 rather than an empty list
+            return {'object': 'list', 'has_more': False, 'data': []}
+        if response.status_code != 200:
+            raise RuntimeError(f'Received a non-200 response from Scryfall: {response.content}')
+        return response.json()
+
+    def iter_many(self, cls, url, allow_empty: bool = False) -> Iterator:
+        """
+        Yields the objects of a paginated list endpoint as each page arrives. The next page is requested in the
+        background while the caller works through the current one. With [allow_empty], a 404 means no results.
+        """
         if not hasattr(cls, 'from_dict'):
             raise AttributeError(f'{cls} has no attribute "from_dict"')
-        result = []
-        should_continue = True
-        request_url = self.expand_url(url)
-        while should_continue:
-            response = requests.get(request_url)
-            if response.status_code != 200:
-                raise RuntimeError(f'Received a non-200 response from Scryfall: {response.content}')
-            json = response.json()
-            data = json['data']
-            for item in data:
-                result_object = cls.from_dict(item)
-                result.append(result_object)
-            should_continue = json['has_more']
-            if should_continue:
-                request_url = json['next_page']
-        return result
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_page = executor.submit(self.fetch_page, self.expand_url(url), allow_empty)
+            while next_page is not None:
+                json = next_page.result()
+                if json['has_more']:
+                    next_page = executor.submit(self.fetch_page, json['next_page'])
+                else:
+                    next_page = None
+                for item in json['data']:
+                    yield cls.from_dict(item)
+
+    def fetch_many(self, cls, url):
+        return list(self.iter_many(cls, url))
 
     def get_set(self, code) -> ScryfallSet:
         return self.fetch_one(ScryfallSet, f'/sets/{code}')
@@ -54,6 +150,34 @@ class ScryfallClient(object):
         name = name.replace(' ', '+').lower()
         return self.fetch_one(ScryfallCard, f'/cards/named?fuzzy={name}')
 
+    def iter_sets(self) -> Iterator[ScryfallSet]:
+        return self.iter_many(ScryfallSet, '/sets')
+
     def get_cards_for_set_code(self, code) -> List[ScryfallCard]:
+        return list(self.iter_cards_for_set_code(code))
+
+    def iter_cards_for_set_code(self, code) -> Iterator[ScryfallCard]:
         url = f'/cards/search?order=spoiled&q=e={code}&unique=card'
-        return self.fetch_many(ScryfallCard, url)
+        return self.iter_many(ScryfallCard, url, allow_empty=True)
+
+    def get_cards_by_names(self, names: Iterable[str]) -> CardCollection:
+        """
+        Looks up cards by exact name, [COLLECTION_CHUNK_SIZE] names per request. Results are keyed by the name
+        that was asked for; names Scryfall couldn't match are listed in not_found.
+        """
+        unique_names = list(dict.fromkeys(names))
+        result = CardCollection()
+        for start in range(0, len(unique_names), COLLECTION_CHUNK_SIZE):
+            chunk = unique_names[start:start + COLLECTION_CHUNK_SIZE]
+            identifiers = [{'name': name} for name in chunk]
+            response = self.request('POST', self.expand_url('/cards/collection'), json={'identifiers': identifiers})
+            if response.status_code != 200:
+                raise RuntimeError(f'Received a non-200 response from Scryfall: {response.content}')
+            json = response.json()
+            missing = {identifier.get('name') for identifier in json.get('not_found', [])}
+            # Scryfall returns matches in the order they were requested, omitting anything it couldn't find
+            found_names = [name for name in chunk if name not in missing]
+            for name, item in zip(found_names, json['data']):
+                result.found[name] = ScryfallCard.from_dict(item)
+            result.not_found.extend(name for name in chunk if name in missing)
+        return result
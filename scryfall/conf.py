@@ -0,0 +1,14 @@
+import os
+
+
+def get_setting(name: str, default=None):
+    """
+    settings.[name] inside Django, or else the environment variable of the same name (for scripts that run without
+    Django settings), or else [default]
+    """
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+    try:
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        return os.environ.get(name, default)
@@ -1,11 +1,87 @@
+import dataclasses
+import typing
 from dataclasses import dataclass, field
 from typing import List, Optional
 
 from dataclasses_json import dataclass_json
 
 
-@dataclass_json
-@dataclass
+def _with_slots(cls):
+    """
+    Rebuilds a dataclass with __slots__ (dataclass(slots=True) needs Python 3.10), which roughly halves the
+    memory used by each instance
+    """
+    cls_dict = dict(cls.__dict__)
+    field_names = tuple(f.name for f in dataclasses.fields(cls))
+    cls_dict['__slots__'] = field_names
+    for name in field_names:
+        cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    slotted = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    slotted.__qualname__ = cls.__qualname__
+    return slotted
+
+
+def _value_expression(hint, namespace, name) -> str:
+    """
+    Returns an expression converting the raw JSON value `v` into [hint]
+    """
+    origin = typing.get_origin(hint)
+    args = typing.get_args(hint)
+    if origin is typing.Union and type(None) in args:
+        inner = [arg for arg in args if arg is not type(None)][0]
+        return f'None if v is None else ({_value_expression(inner, namespace, name)})'
+    if origin in (list, List) and args and hasattr(args[0], '__compiled_from_dict__'):
+        namespace[f'_decode_{name}'] = args[0].from_dict
+        return f'[_decode_{name}(x) for x in v]'
+    if hasattr(hint, '__compiled_from_dict__'):
+        namespace[f'_decode_{name}'] = hint.from_dict
+        return f'_decode_{name}(v)'
+    return 'v'
+
+
+def _compile_from_dict(cls):
+    """
+    Generates a from_dict for [cls] once, up front, instead of dataclasses_json inspecting type hints on every
+    call. Unknown keys are ignored, missing optional keys take their defaults and missing required keys raise
+    KeyError.
+    """
+    hints = typing.get_type_hints(cls)
+    namespace = {'_MISSING': object()}
+    lines = ['def from_dict(cls, d, *, infer_missing=False):', '    get = d.get']
+    arguments = []
+    for f in dataclasses.fields(cls):
+        expression = _value_expression(hints[f.name], namespace, f.name)
+        if f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING:
+            lines.append(f'    v = d[{f.name!r}]')
+            lines.append(f'    {f.name} = {expression}')
+        else:
+            if f.default_factory is not dataclasses.MISSING:
+                namespace[f'_default_{f.name}'] = f.default_factory
+                default = f'_default_{f.name}()'
+            else:
+                namespace[f'_default_{f.name}'] = f.default
+                default = f'_default_{f.name}'
+            lines.append(f'    v = get({f.name!r}, _MISSING)')
+            lines.append(f'    {f.name} = {default} if v is _MISSING else ({expression})')
+        arguments.append(f.name)
+    lines.append(f'    return cls({", ".join(arguments)})')
+    exec('\n'.join(lines), namespace)
+    return classmethod(namespace['from_dict'])
+
+
+def scryfall_model(cls):
+    """
+    Declares a Scryfall API object: a slotted dataclass with dataclasses_json helpers and a precompiled from_dict
+    """
+    cls = dataclass_json(_with_slots(dataclass(cls)))
+    cls.from_dict = _compile_from_dict(cls)
+    cls.__compiled_from_dict__ = True
+    return cls
+
+
+@scryfall_model
 class ScryfallSet:
     id: str
     code: str
@@ -14,10 +90,10 @@ class ScryfallSet:
     scryfall_uri: str
     released_at: str
     icon_svg_uri: str
+    card_count: int = 0
 
 
-@dataclass_json
-@dataclass
+@scryfall_model
 class ScryfallImages:
     small: str
     normal: str
@@ -27,8 +103,7 @@ class ScryfallImages:
     border_crop: str
 
 
-@dataclass_json
-@dataclass
+@scryfall_model
 class ScryfallCardFace:
     name: str
     type_line: str
@@ -42,8 +117,7 @@ class ScryfallCardFace:
     image_uris: Optional[ScryfallImages] = None
 
 
-@dataclass_json
-@dataclass
+@scryfall_model
 class ScryfallCard:
     id: str
     lang: str
@@ -57,6 +131,7 @@ class ScryfallCard:
     set_name: str
     set_uri: str
     card_faces: List[ScryfallCardFace] = field(default_factory=list)
+    colors: Optional[List[str]] = None
     color_identity: List[str] = field(default_factory=list)
     color_indicator: List[str] = field(default_factory=list)
     loyalty: Optional[str] = None
@@ -65,3 +140,7 @@ class ScryfallCard:
     power: Optional[str] = None
     toughness: Optional[str] = None
     image_uris: Optional[ScryfallImages] = None
+    cmc: Optional[float] = None
+    collector_number: Optional[str] = None
+    rarity: Optional[str] = None
+    released_at: Optional[str] = None
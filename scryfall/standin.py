@@ -0,0 +1,245 @@
+"""
+A local stand-in for the Scryfall API and CubeCobra's download endpoints, serving recorded responses from
+fixture files so that benchmarks and load tests don't need the real internet.
+
+    python -m scryfall.standin [--fixtures DIR] [--port 8765] [--latency 0.05] [--throttle 0.1]
+
+Then point the app at it:
+
+    SCRYFALL_API_URL=http://127.0.0.1:8765 CUBECOBRA_URL=http://127.0.0.1:8765 python manage.py ...
+
+The fixtures directory holds sets.json (a /sets list), cards_search.json plus any cards/*.json (card lists or
+arrays of cards) and cubecobra/<cube_id>.txt / .csv for cube downloads.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+DEFAULT_FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+DEFAULT_PAGE_SIZE = 175
+
+SET_QUERY = re.compile(r'(?:^|\s)(?:e|s|set)[:=]([a-z0-9]+)', re.IGNORECASE)
+
+
+def _load_list(path: Path) -> list:
+    with open(path, encoding='utf-8') as f:
+        payload = json.load(f)
+    if isinstance(payload, dict):
+        return payload['data']
+    return payload
+
+
+def _card_names(card: dict) -> List[str]:
+    names = [card['name'].lower()]
+    for face in card.get('card_faces', []):
+        names.append(face['name'].lower())
+    return names
+
+
+class StandinServer(object):
+    """
+    Serves the fixtures in [fixtures] on [host]:[port] (port 0 picks a free one). Every response is delayed by
+    [latency] seconds, and a [throttle] fraction of requests are answered with 429 Too Many Requests.
+    """
+
+    def __init__(self, fixtures=DEFAULT_FIXTURES, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 throttle: float = 0.0, page_size: int = DEFAULT_PAGE_SIZE, seed: Optional[int] = None):
+        self.fixtures = Path(fixtures)
+        self.latency = latency
+        self.throttle = throttle
+        self.page_size = page_size
+        self.requests: List[str] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.sets: List[dict] = _load_list(self.fixtures / 'sets.json')
+        self.cards: List[dict] = []
+        card_files = [self.fixtures / 'cards_search.json'] + sorted((self.fixtures / 'cards').glob('*.json'))
+        for path in card_files:
+            if path.exists():
+                self.cards.extend(_load_list(path))
+
+        self.httpd = ThreadingHTTPServer((host, port), _StandinHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'StandinServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def should_throttle(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.throttle
+
+    def find_cards(self, name: str, fuzzy: bool) -> List[dict]:
+        name = name.strip().lower()
+        exact = [card for card in self.cards if name in _card_names(card)]
+        if exact or not fuzzy:
+            return exact
+        words = name.split()
+        return [card for card in self.cards if all(word in card['name'].lower() for word in words)]
+
+    def handle(self, method: str, path: str, query: Dict[str, List[str]], body: bytes):
+        """
+        Returns (status, content type, body) for a request
+        """
+        if path == '/sets':
+            return self.json_response(200, {'object': 'list', 'has_more': False, 'data': self.sets})
+        if path.startswith('/sets/'):
+            return self.get_set(path[len('/sets/'):].lower())
+        if path == '/cards/search':
+            return self.search(query)
+        if path == '/cards/named':
+            return self.named(query)
+        if path == '/cards/collection' and method == 'POST':
+            return self.collection(json.loads(body or b'{}'))
+
+        match = re.fullmatch(r'/cube/download/(plaintext|csv)/([^/]+)', path)
+        if match is not None:
+            return self.cube_download(match.group(1), match.group(2))
+        return self.not_found(f'Unknown endpoint {path}')
+
+    def get_set(self, code: str):
+        for magic_set in self.sets:
+            if code in (magic_set['code'], magic_set['id']):
+                return self.json_response(200, magic_set)
+        return self.not_found(f'No set found for {code}')
+
+    def named(self, query: Dict[str, List[str]]):
+        fuzzy = 'fuzzy' in query
+        name = (query.get('fuzzy') or query.get('exact') or [''])[0]
+        matches = self.find_cards(name, fuzzy)
+        if len(matches) == 0:
+            return self.not_found(f'No cards found matching “{name}”')
+        return self.json_response(200, matches[0])
+
+    def cube_download(self, export_format: str, cube_id: str):
+        extension = 'txt' if export_format == 'plaintext' else 'csv'
+        cube_file = self.fixtures / 'cubecobra' / f'{cube_id}.{extension}'
+        if not cube_file.is_file():
+            return 404, 'text/plain', b'Cube not found'
+        return 200, 'text/plain; charset=utf-8', cube_file.read_bytes()
+
+    def search(self, query: Dict[str, List[str]]):
+        q = query.get('q', [''])[0]
+        match = SET_QUERY.search(q)
+        cards = self.cards
+        if match is not None:
+            cards = [card for card in cards if card['set'] == match.group(1).lower()]
+        if len(cards) == 0:
+            return self.not_found('Your query didn’t match any cards.')
+        page = int(query.get('page', ['1'])[0])
+        start = (page - 1) * self.page_size
+        data = cards[start:start + self.page_size]
+        payload = {'object': 'list', 'total_cards': len(cards), 'has_more': start + self.page_size < len(cards),
+                   'data': data}
+        if payload['has_more']:
+            next_query = {key: values[0] for key, values in query.items()}
+            next_query['page'] = page + 1
+            payload['next_page'] = f'{self.url}/cards/search?{urlencode(next_query)}'
+        return self.json_response(200, payload)
+
+    def collection(self, payload: dict):
+        identifiers = payload.get('identifiers', [])
+        if len(identifiers) > 75:
+            return self.json_response(422, {'object': 'error', 'code': 'too_many_identifiers', 'status': 422})
+        data = []
+        not_found = []
+        for identifier in identifiers:
+            matches = self.find_cards(identifier.get('name', ''), fuzzy=False)
+            if matches:
+                data.append(matches[0])
+            else:
+                not_found.append(identifier)
+        return self.json_response(200, {'object': 'list', 'not_found': not_found, 'data': data})
+
+    @staticmethod
+    def json_response(status: int, payload):
+        return status, 'application/json; charset=utf-8', json.dumps(payload).encode('utf-8')
+
+    def not_found(self, details: str):
+        return self.json_response(404, {'object': 'error', 'code': 'not_found', 'status': 404, 'details': details})
+
+
+class _StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, method: str):
+        standin: StandinServer = self.server.standin
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length > 0 else b''
+        standin.requests.append(f'{method} {self.path}')
+        if standin.latency > 0:
+            time.sleep(standin.latency)
+        if standin.should_throttle():
+            status, content_type, content = standin.json_response(
+                429, {'object': 'error', 'code': 'rate_limited', 'status': 429})
+        else:
+            status, content_type, content = standin.handle(method, parsed.path, parse_qs(parsed.query), body)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        self._respond('POST')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before every response')
+    parser.add_argument('--throttle', type=float, default=0.0, help='Fraction of requests to answer with a 429')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = StandinServer(args.fixtures, host=args.host, port=args.port, latency=args.latency,
+                           throttle=args.throttle, page_size=args.page_size, seed=args.seed)
+    print(f'Serving {len(server.cards)} cards and {len(server.sets)} sets on {server.url}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,22 @@
+import asyncio
+import json
+import re
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+
 import responses
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+from scryfall.aio import AsyncScryfallClient
+from scryfall.bulk import iter_bulk_objects
+from scryfall.cache import CacheEntry, DiskCache, default_cache
 from scryfall.client import ScryfallClient
+from scryfall.models import ScryfallCard
+from scryfall.standin import StandinServer
+from scryfall.throttle import TokenBucket
 
 sets_response = r"""{
   "object": "list",
@@ -236,3 +251,334 @@ class ScryfallClientTestCase(TestCase):
         first = sets[0]
         self.assertEqual('Strixhaven Mystical Archive', first.name)
         self.assertEqual('sta', first.code)
+
+    def test_reuses_one_session(self):
+        with responses.RequestsMock() as rm:
+            rm.add('GET', 'https://api.scryfall.com/sets', sets_response)
+            rm.add('GET', 'https://api.scryfall.com/sets', sets_response)
+            session = self.client.session
+            self.client.get_sets()
+            self.client.get_sets()
+        self.assertIs(session, self.client.session)
+
+
+class ScryfallPaginationTestCase(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.client = ScryfallClient(rate_limiter=TokenBucket(rate=1000), max_retries=0)
+        data = json.loads(sets_response)['data']
+        self.first_page = json.dumps({
+            'object': 'list',
+            'has_more': True,
+            'next_page': 'https://api.scryfall.com/sets?page=2',
+            'data': data[:5],
+        })
+        self.second_page = json.dumps({'object': 'list', 'has_more': False, 'data': data[5:]})
+
+    def test_iterates_across_pages(self):
+        with responses.RequestsMock() as rm:
+            rm.add('GET', 'https://api.scryfall.com/sets', self.first_page, match_querystring=True)
+            rm.add('GET', 'https://api.scryfall.com/sets?page=2', self.second_page, match_querystring=True)
+            sets = self.client.iter_sets()
+            self.assertEqual('sta', next(sets).code)
+            codes = [s.code for s in sets]
+        self.assertEqual(11, len(codes))
+        self.assertEqual('cc1', codes[-1])
+
+    def test_error_on_later_page_is_raised(self):
+        with responses.RequestsMock() as rm:
+            rm.add('GET', 'https://api.scryfall.com/sets', self.first_page, match_querystring=True)
+            rm.add('GET', 'https://api.scryfall.com/sets?page=2', status=500, match_querystring=True)
+            with self.assertRaises(RuntimeError):
+                list(self.client.iter_sets())
+
+
+class AsyncScryfallClientTestCase(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.client = AsyncScryfallClient(ScryfallClient(rate_limiter=TokenBucket(rate=1000)), max_concurrency=4)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        super().tearDown()
+
+    def test_get_sets(self):
+        with responses.RequestsMock() as rm:
+            rm.add('GET', 'https://api.scryfall.com/sets', sets_response)
+            sets = asyncio.run(self.client.get_sets())
+        self.assertEqual(12, len(sets))
+
+    def test_concurrent_lookups_across_event_loops(self):
+        sets = json.loads(sets_response)['data']
+        with responses.RequestsMock() as rm:
+            for item in sets:
+                rm.add('GET', f'https://api.scryfall.com/sets/{item["code"]}', json.dumps(item))
+
+            async def fetch_all():
+                return await asyncio.gather(*(self.client.get_set(item['code']) for item in sets))
+
+            first = asyncio.run(fetch_all())
+            second = asyncio.run(fetch_all())
+        self.assertEqual([item['name'] for item in sets], [s.name for s in first])
+        self.assertEqual(len(sets), len(second))
+
+    def test_requests_are_bounded_across_event_loops(self):
+        sets = json.loads(sets_response)['data']
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def slow_set(request):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return 200, {}, json.dumps(sets[0])
+
+        async def fetch_all():
+            return await asyncio.gather(*(self.client.get_set(item['code']) for item in sets))
+
+        with responses.RequestsMock() as rm:
+            rm.add_callback('GET', re.compile(r'https://api\.scryfall\.com/sets/\w+'), slow_set)
+            threads = [threading.Thread(target=asyncio.run, args=(fetch_all(),)) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(2 * len(sets), len(rm.calls))
+        self.assertLessEqual(in_flight[1], 4)
+
+
+class ScryfallCollectionTestCase(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.client = ScryfallClient(rate_limiter=TokenBucket(rate=1000))
+
+    @staticmethod
+    def collection_callback(request):
+        identifiers = json.loads(request.body)['identifiers']
+        data = []
+        not_found = []
+        for index, identifier in enumerate(identifiers):
+            name = identifier['name']
+            if name.startswith('Missing'):
+                not_found.append(identifier)
+                continue
+            data.append({
+                'id': f'00000000-0000-0000-0000-{index:012d}',
+                'lang': 'en',
+                'oracle_id': f'00000000-0000-0000-0000-{index:012d}',
+                'uri': '',
+                'name': name,
+                'scryfall_uri': '',
+                'layout': 'normal',
+                'type_line': 'Instant',
+                'set': 'tst',
+                'set_name': 'Test',
+                'set_uri': '',
+            })
+        return 200, {}, json.dumps({'object': 'list', 'not_found': not_found, 'data': data})
+
+    def test_chunks_names_and_keys_results_by_name(self):
+        names = [f'Card {i}' for i in range(100)] + ['Missing One', 'Card 5']
+        with responses.RequestsMock() as rm:
+            rm.add_callback('POST', 'https://api.scryfall.com/cards/collection', callback=self.collection_callback)
+            result = self.client.get_cards_by_names(names)
+            self.assertEqual(2, len(rm.calls))
+            self.assertEqual(75, len(json.loads(rm.calls[0].request.body)['identifiers']))
+        self.assertEqual(100, len(result.found))
+        self.assertEqual('Card 42', result.found['Card 42'].name)
+        self.assertEqual(['Missing One'], result.not_found)
+
+
+class ScryfallClientRetryTestCase(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.client = ScryfallClient(rate_limiter=TokenBucket(rate=1000), max_retries=2, backoff_factor=0)
+
+    def test_retries_rate_limited_and_server_errors(self):
+        with responses.RequestsMock() as rm:
+            rm.add('GET', 'https://api.scryfall.com/sets', status=429)
+            rm.add('GET', 'https://api.scryfall.com/sets', status=503)
+            rm.add('GET', 'https://api.scryfall.com/sets', sets_response)
+            sets = self.client.get_sets()
+            self.assertEqual(3, len(rm.calls))
+        self.assertEqual(12, len(sets))
+
+    def test_gives_up_after_max_retries(self):
+        with responses.RequestsMock() as rm:
+            for _ in range(3):
+                rm.add('GET', 'https://api.scryfall.com/sets', status=500)
+            with self.assertRaises(RuntimeError):
+                self.client.get_sets()
+            self.assertEqual(3, len(rm.calls))
+
+    def test_does_not_retry_client_errors(self):
+        with responses.RequestsMock() as rm:
+            rm.add('GET', 'https://api.scryfall.com/sets/nope', status=404)
+            with self.assertRaises(RuntimeError):
+                self.client.get_set('nope')
+            self.assertEqual(1, len(rm.calls))
+
+
+class TokenBucketTestCase(TestCase):
+
+    def test_allows_burst_then_spaces_requests(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        self.assertEqual(0, bucket.reserve())
+        self.assertEqual(0, bucket.reserve())
+        self.assertAlmostEqual(0.1, bucket.reserve(), places=2)
+        self.assertAlmostEqual(0.2, bucket.reserve(), places=2)
+
+
+class BulkDataParserTestCase(TestCase):
+
+    def test_parses_every_object_across_small_chunks(self):
+        expected = json.loads(sets_response)['data']
+        objects = list(iter_bulk_objects(StringIO(json.dumps(expected, indent=2)), chunk_size=7))
+        self.assertEqual(expected, objects)
+
+    def test_empty_array(self):
+        self.assertEqual([], list(iter_bulk_objects(StringIO(' [ ] '))))
+
+    def test_rejects_non_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_bulk_objects(StringIO('{"object": "list"}')))
+
+    def test_rejects_truncated_file(self):
+        with self.assertRaises(ValueError):
+            list(iter_bulk_objects(StringIO('[{"id": 1}, {"id": 2'), chunk_size=4))
+
+
+class ResponseCacheTestCase(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(self.directory.name, ttls=[(r'/sets', 60)], default_ttl=0)
+        self.client = ScryfallClient(rate_limiter=TokenBucket(rate=1000), cache=self.cache)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_fresh_responses_are_served_from_disk(self):
+        with responses.RequestsMock() as rm:
+            rm.add('GET', 'https://api.scryfall.com/sets', sets_response, headers={'ETag': '"v1"'})
+            self.client.get_sets()
+        with responses.RequestsMock():
+            sets = ScryfallClient(cache=self.cache).get_sets()
+        self.assertEqual(12, len(sets))
+
+    def test_stale_responses_are_revalidated(self):
+        url = 'https://api.scryfall.com/cards/named?fuzzy=opt'
+        self.cache.set(url, CacheEntry(body=b'{"cached": true}', stored_at=time.time(), headers={'ETag': '"v1"'}))
+        with responses.RequestsMock() as rm:
+            rm.add('GET', url, status=304)
+            response = self.client.get(url)
+            self.assertEqual('"v1"', rm.calls[0].request.headers['If-None-Match'])
+        self.assertEqual({'cached': True}, response.json())
+
+    def test_evicts_least_recently_used(self):
+        cache = DiskCache(self.directory.name, max_bytes=900)
+        for name in ('a', 'b', 'c'):
+            cache.set(name, CacheEntry(body=b'x' * 200, stored_at=time.time()))
+            time.sleep(0.01)
+        cache.get('a')
+        cache.set('d', CacheEntry(body=b'x' * 200, stored_at=time.time()))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('d'))
+
+    def test_caching_is_off_unless_configured(self):
+        self.assertIsNone(default_cache())
+
+    @override_settings(SCRYFALL_API_URL='http://127.0.0.1:8765/')
+    def test_base_url_follows_settings(self):
+        self.assertEqual('http://127.0.0.1:8765/sets', ScryfallClient().expand_url('/sets'))
+
+    def test_default_cache_follows_settings_and_creates_its_directory_lazily(self):
+        directory = Path(self.directory.name) / 'http'
+        with override_settings(HTTP_CACHE=True, HTTP_CACHE_DIR=str(directory)):
+            client = ScryfallClient(rate_limiter=TokenBucket(rate=1000))
+            self.assertIsInstance(default_cache(), DiskCache)
+            self.assertFalse(directory.exists())
+            with responses.RequestsMock() as rm:
+                rm.add('GET', 'https://api.scryfall.com/sets', sets_response)
+                client.get_sets()
+            self.assertTrue(directory.is_dir())
+            with responses.RequestsMock():
+                self.assertEqual(12, len(client.get_sets()))
+        with override_settings(HTTP_CACHE=False, HTTP_CACHE_DIR=str(directory)):
+            self.assertIsNone(default_cache())
+
+
+class CompiledDecoderTestCase(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        with open(Path(__file__).resolve().parent / 'fixtures' / 'cards_search.json', encoding='utf-8') as f:
+            self.cards = json.load(f)['data']
+
+    def test_matches_dataclasses_json(self):
+        from dataclasses_json.core import _decode_dataclass
+        for item in self.cards:
+            self.assertEqual(_decode_dataclass(ScryfallCard, item, False), ScryfallCard.from_dict(item))
+
+    def test_decodes_nested_objects_and_defaults(self):
+        austere, valki = [ScryfallCard.from_dict(item) for item in self.cards]
+        self.assertEqual([], austere.card_faces)
+        self.assertTrue(austere.image_uris.normal.startswith('https://'))
+        self.assertIsNone(valki.image_uris)
+        self.assertEqual('{5}{B}{R}', valki.card_faces[1].mana_cost)
+        self.assertEqual('5', valki.card_faces[1].loyalty)
+
+    def test_missing_required_field_raises(self):
+        with self.assertRaises(KeyError):
+            ScryfallCard.from_dict({'id': 'abc'})
+
+    def test_instances_are_slotted(self):
+        card = ScryfallCard.from_dict(self.cards[0])
+        self.assertFalse(hasattr(card, '__dict__'))
+
+
+class StandinServerTestCase(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = StandinServer(page_size=1, seed=1).start()
+        self.client = ScryfallClient(base_url=self.server.url, rate_limiter=TokenBucket(rate=1000), backoff_factor=0)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        super().tearDown()
+
+    def test_sets(self):
+        self.assertEqual(13, len(self.client.get_sets()))
+        self.assertEqual('Kaldheim', self.client.get_set('khm').name)
+
+    def test_paginated_search(self):
+        cards = self.client.get_cards_for_set_code('khm')
+        self.assertEqual(['Valki, God of Lies // Tibalt, Cosmic Impostor'], [card.name for card in cards])
+        names = [card.name for card in self.client.iter_many(ScryfallCard, '/cards/search?q=game:paper')]
+        self.assertEqual(2, len(names))
+        self.assertIn('GET /cards/search?q=game%3Apaper&page=2', self.server.requests)
+
+    def test_named_and_collection(self):
+        self.assertEqual('Austere Command', self.client.get_card_by_name_fuzzy('austere com').name)
+        result = self.client.get_cards_by_names(['Valki, God of Lies', 'Nope'])
+        self.assertEqual(['Valki, God of Lies'], list(result.found.keys()))
+        self.assertEqual(['Nope'], result.not_found)
+
+    def test_injected_rate_limits_are_retried(self):
+        self.server.throttle = 0.5
+        client = ScryfallClient(base_url=self.server.url, rate_limiter=TokenBucket(rate=1000), backoff_factor=0,
+                                max_retries=20)
+        for _ in range(5):
+            self.assertEqual('Kaldheim', client.get_set('khm').name)
+        self.assertGreater(len(self.server.requests), 5)